@@ -0,0 +1,141 @@
+"""
+Per-provider circuit breakers for LLM calls.
+
+Breakers live in a module-level registry, so every ToolActivities invocation in a
+worker process shares the same view of provider health.
+
+A breaker trips (opens) when, over the last LLM_CIRCUIT_WINDOW calls, the share of
+failed or slow calls reaches LLM_CIRCUIT_FAILURE_RATE. While open, calls to that
+provider are skipped. After LLM_CIRCUIT_OPEN_SECONDS a single trial call is let
+through (half-open); success closes the breaker, failure re-opens it. A trial call
+that is cancelled (activity timeout, losing hedge, discarded plan) says nothing about
+the provider, so it just lets the next call be the trial.
+"""
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window_size: int = 20,
+        min_calls: int = 4,
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 15.0,
+        open_seconds: float = 60.0,
+    ):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        # True for a healthy call, False for a failed or slow call
+        self.outcomes: Deque[bool] = deque(maxlen=window_size)
+
+    def allow_request(self) -> bool:
+        """Returns True if a call to this provider should be attempted now."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self.trial_in_flight = False
+        if self.state == HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self, latency_seconds: float) -> None:
+        healthy = latency_seconds < self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            if healthy:
+                self.close()
+            else:
+                self.open()
+            return
+        self.outcomes.append(healthy)
+        self.evaluate()
+
+    def record_failure(self) -> None:
+        if self.state == HALF_OPEN:
+            self.open()
+            return
+        self.outcomes.append(False)
+        self.evaluate()
+
+    def record_cancelled(self) -> None:
+        """A call was cancelled before it finished; if it was the half-open trial, allow another."""
+        if self.state == HALF_OPEN:
+            self.trial_in_flight = False
+
+    def failure_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def evaluate(self) -> None:
+        if (
+            self.state == CLOSED
+            and len(self.outcomes) >= self.min_calls
+            and self.failure_rate() >= self.failure_rate_threshold
+        ):
+            self.open()
+
+    def open(self) -> None:
+        if self.state != OPEN:
+            print(f"Circuit breaker for LLM provider '{self.name}' opened")
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def close(self) -> None:
+        print(f"Circuit breaker for LLM provider '{self.name}' closed")
+        self.state = CLOSED
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.outcomes.clear()
+
+    def status(self) -> dict:
+        return {
+            "provider": self.name,
+            "state": self.state,
+            "failure_rate": round(self.failure_rate(), 3),
+            "calls_in_window": len(self.outcomes),
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Returns the process-wide circuit breaker for a provider, creating it from .env settings."""
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(
+            name,
+            window_size=int(os.environ.get("LLM_CIRCUIT_WINDOW", "20")),
+            min_calls=int(os.environ.get("LLM_CIRCUIT_MIN_CALLS", "4")),
+            failure_rate_threshold=float(
+                os.environ.get("LLM_CIRCUIT_FAILURE_RATE", "0.5")
+            ),
+            slow_call_seconds=float(
+                os.environ.get("LLM_CIRCUIT_SLOW_CALL_SECONDS", "15")
+            ),
+            open_seconds=float(os.environ.get("LLM_CIRCUIT_OPEN_SECONDS", "60")),
+        )
+    return _breakers[name]
+
+
+def reset_circuit_breakers() -> None:
+    """Forgets all breaker state (mainly for tests)."""
+    _breakers.clear()
@@ -0,0 +1,128 @@
+"""
+Hedged (raced) LLM requests.
+
+When hedging is enabled (LLM_HEDGE_ENABLED=true) and a provider call hasn't returned
+within the LLM_HEDGE_PERCENTILE latency observed for that provider, a second request
+is fired (to LLM_HEDGE_PROVIDER if set, otherwise the same provider). Whichever call
+returns valid JSON first wins and the other is cancelled.
+
+Latency history is per provider and shared across all activity invocations in the
+worker process. Counters: llm_hedges_fired, llm_hedges_won (the hedge answered first).
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from activities import llm_metrics
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one provider."""
+
+    def __init__(self, window_size: int = 200):
+        self.latencies: Deque[float] = deque(maxlen=window_size)
+
+    def record(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, math.ceil(percentile / 100 * len(ordered)) - 1)
+        return ordered[max(index, 0)]
+
+
+class HedgePolicy:
+    """Decides how long to wait before firing a hedge request."""
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        min_samples: int = 20,
+        initial_delay_seconds: float = 5.0,
+        min_delay_seconds: float = 1.0,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay_seconds = initial_delay_seconds
+        self.min_delay_seconds = min_delay_seconds
+        self.trackers: Dict[str, LatencyTracker] = {}
+
+    @classmethod
+    def from_env(cls) -> Optional["HedgePolicy"]:
+        """Returns the policy configured in .env, or None if hedging is disabled."""
+        if os.environ.get("LLM_HEDGE_ENABLED", "false").lower() != "true":
+            return None
+        return cls(
+            percentile=float(os.environ.get("LLM_HEDGE_PERCENTILE", "95")),
+            min_samples=int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20")),
+            initial_delay_seconds=float(
+                os.environ.get("LLM_HEDGE_INITIAL_DELAY_SECONDS", "5")
+            ),
+            min_delay_seconds=float(os.environ.get("LLM_HEDGE_MIN_DELAY_SECONDS", "1")),
+        )
+
+    def tracker(self, provider_name: str) -> LatencyTracker:
+        if provider_name not in self.trackers:
+            self.trackers[provider_name] = LatencyTracker()
+        return self.trackers[provider_name]
+
+    def hedge_delay(self, provider_name: str) -> float:
+        """Seconds to wait for the primary call before hedging."""
+        tracker = self.tracker(provider_name)
+        if len(tracker.latencies) < self.min_samples:
+            return self.initial_delay_seconds
+        return max(self.min_delay_seconds, tracker.percentile(self.percentile))
+
+    async def run(
+        self,
+        primary_name: str,
+        primary: Callable[[], Awaitable[T]],
+        hedge_name: str,
+        hedge: Callable[[], Awaitable[T]],
+    ) -> Tuple[T, str]:
+        """
+        Runs primary, and hedge as well if primary is still running after hedge_delay().
+        A call that raises (including invalid JSON) doesn't win; the other call is awaited instead.
+        Returns the winning result and the name of the provider that produced it.
+        """
+        delay = self.hedge_delay(primary_name)
+        primary_task = asyncio.ensure_future(primary())
+        # task -> (provider name, start time)
+        tasks = {primary_task: (primary_name, time.monotonic())}
+
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=delay)
+            if not done:
+                llm_metrics.increment(
+                    "llm_hedges_fired", description="Hedge LLM requests fired"
+                )
+                tasks[asyncio.ensure_future(hedge())] = (hedge_name, time.monotonic())
+
+            pending = set(tasks)
+            first_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        first_error = first_error or task.exception()
+                        continue
+                    name, started = tasks[task]
+                    self.tracker(name).record(time.monotonic() - started)
+                    if task is not primary_task:
+                        llm_metrics.increment(
+                            "llm_hedges_won",
+                            description="Hedge LLM requests that answered before the original request",
+                        )
+                    return task.result(), name
+            raise first_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
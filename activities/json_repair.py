@@ -0,0 +1,160 @@
+"""
+Extraction of the JSON object from an LLM reply, with repair of common defects.
+
+extract_json_object() decodes the first JSON object in the reply in a single pass
+(json.JSONDecoder.raw_decode from the first "{"), so code fences and prose before or
+after the object cost nothing extra. Only if that fails is the object run through
+repair_json(), which fixes what LLMs typically get wrong:
+
+- trailing commas before a closing brace or bracket
+- single-quoted strings, and Python literals True / False / None
+- raw newlines inside strings
+- a reply that was cut off: missing closing braces and brackets, a dangling key or
+  comma, and a half-written string value (the values before it are kept)
+
+If the repaired text still doesn't parse, ValueError is raised as before.
+Counter: llm_json_repairs.
+"""
+import json
+from typing import Any, Dict, List, Tuple
+
+from activities import llm_metrics
+
+_DECODER = json.JSONDecoder()
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def extract_json_object(response_content: str) -> Dict[str, Any]:
+    """
+    Returns the first JSON object in the response, repairing it if needed.
+
+    Raises:
+        ValueError: If the response contains no object that can be parsed, even after repair
+    """
+    start = response_content.find("{")
+    if start == -1:
+        raise ValueError("Response does not contain valid JSON.")
+    try:
+        result, _ = _DECODER.raw_decode(response_content, start)
+    except json.JSONDecodeError as e:
+        repaired, cut_points = repair_json(response_content[start:])
+        result = parse_repaired(repaired, cut_points)
+        if result is None:
+            print(f"Invalid JSON detected in response: {response_content}")
+            raise ValueError("Response does not contain valid JSON.") from e
+        llm_metrics.increment(
+            "llm_json_repairs", description="LLM responses that needed JSON repair"
+        )
+    if not isinstance(result, dict):
+        raise ValueError("Response does not contain valid JSON.")
+    return result
+
+
+def parse_repaired(repaired: str, cut_points: List[Tuple[int, str]]):
+    """Parses repaired text; if it doesn't parse, retries cut back to each earlier comma (truncated replies)."""
+    candidates = [repaired] + [
+        strip_trailing(repaired[:position], ",") + closers for position, closers in reversed(cut_points)
+    ]
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def repair_json(text: str) -> Tuple[str, List[Tuple[int, str]]]:
+    """
+    Rewrites a JSON-like object into valid JSON where possible, in one scan.
+
+    Args:
+        text: Text starting at the object's opening brace
+
+    Returns:
+        tuple: The repaired text, and for each comma between values (outside strings) its position
+        in the output with the closers needed at that point, so a truncated reply can be cut back
+        to its last complete value.
+    """
+    out: List[str] = []
+    closers: List[str] = []
+    cut_points: List[Tuple[int, str]] = []
+    quote = None  # quote character of the string being copied, if any
+    index = 0
+    length = len(text)
+
+    while index < length:
+        char = text[index]
+        if quote is not None:
+            if char == "\\" and index + 1 < length:
+                following = text[index + 1]
+                # \' isn't a JSON escape; inside a single-quoted string it's just a quote
+                out.append("'" if following == "'" else char + following)
+                index += 2
+                continue
+            if char == quote:
+                out.append('"')
+                quote = None
+            elif char == '"':
+                out.append('\\"')
+            elif char == "\n":
+                out.append("\\n")
+            else:
+                out.append(char)
+            index += 1
+            continue
+
+        if char in "\"'":
+            quote = char
+            out.append('"')
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+            out.append(char)
+        elif char in "}]":
+            remove_trailing(out, ",")
+            if closers:
+                closers.pop()
+            out.append(char)
+            if not closers:
+                # the object is complete; anything after it is ignored
+                return "".join(out), cut_points
+        elif char == ",":
+            cut_points.append((len(out), "".join(reversed(closers))))
+            out.append(char)
+        elif char.isalpha():
+            end = index
+            while end < length and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[index:end]
+            out.append(_LITERALS.get(word, word))
+            index = end
+            continue
+        else:
+            out.append(char)
+        index += 1
+
+    # the reply was cut off: close what's open
+    if quote is not None:
+        if cut_points:
+            # don't pass off half a string as a value; keep only the complete ones
+            position, closing = cut_points.pop()
+            return "".join(out[:position]) + closing, cut_points
+        out.append('"')
+    remove_trailing(out, ",")
+    if out and out[-1].rstrip().endswith(":"):
+        out.append("null")
+    out.extend(reversed(closers))
+    return "".join(out), cut_points
+
+
+def remove_trailing(out: List[str], char: str) -> None:
+    """Removes a trailing char (and whitespace around it) from the output being built."""
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == char:
+        out.pop()
+
+
+def strip_trailing(text: str, char: str) -> str:
+    text = text.rstrip()
+    return text[:-1] if text.endswith(char) else text
@@ -0,0 +1,130 @@
+"""
+Incremental extraction of a string field from a JSON object that is still streaming in.
+
+LLM replies are streamed as arbitrary text chunks. IncrementalJSONFieldParser scans
+each chunk once, tracking just enough JSON structure (nesting depth, strings, escapes,
+and whether a top-level string is a key or a value) to decode the value of one
+top-level field, e.g. "response", as soon as its characters arrive. Any text before
+the first "{" (prose, a ```json fence) is ignored; anything after the object's closing
+brace is collected in trailing_text.
+"""
+from typing import List, Optional
+
+_SIMPLE_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+class IncrementalJSONFieldParser:
+    def __init__(self, field: str = "response"):
+        self.field = field
+        self.value = ""  # decoded text of the field so far
+        self.field_complete = False  # the field's closing quote has been seen
+        self.object_complete = False  # the top-level object's closing brace has been seen
+        self.trailing_text = ""  # text received after the object's closing brace
+
+        self.started = False
+        self.depth = 0
+        self.in_string = False
+        self.escape: Optional[str] = None  # None, "\\" or the hex digits of a \u escape
+        self.high_surrogate: Optional[int] = None
+        self.expect_key = False
+        self.string_is_key = False
+        self.capturing = False
+        self.current_key: List[str] = []
+        self.last_key: Optional[str] = None
+
+    def feed(self, chunk: str) -> str:
+        """Consumes the next chunk and returns any newly decoded characters of the field."""
+        emitted: List[str] = []
+        for index, char in enumerate(chunk):
+            if self.object_complete:
+                self.trailing_text += chunk[index:]
+                break
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self.depth = 1
+                    self.expect_key = True
+                continue
+            if self.in_string:
+                self.consume_string_char(char, emitted)
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_is_key = self.depth == 1 and self.expect_key
+                self.capturing = (
+                    self.depth == 1
+                    and not self.string_is_key
+                    and self.last_key == self.field
+                    and not self.field_complete
+                )
+                self.current_key = []
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.object_complete = True
+            elif char == ":" and self.depth == 1:
+                self.expect_key = False
+            elif char == "," and self.depth == 1:
+                self.expect_key = True
+
+        text = "".join(emitted)
+        self.value += text
+        return text
+
+    def consume_string_char(self, char: str, emitted: List[str]) -> None:
+        if self.escape is not None:
+            decoded = self.consume_escape_char(char)
+            if decoded:
+                self.emit(decoded, emitted)
+            return
+        if char == "\\":
+            self.escape = "\\"
+        elif char == '"':
+            self.in_string = False
+            if self.string_is_key:
+                self.last_key = "".join(self.current_key)
+            elif self.capturing:
+                self.field_complete = True
+                self.capturing = False
+        else:
+            self.emit(char, emitted)
+
+    def consume_escape_char(self, char: str) -> str:
+        """Handles a character following a backslash; returns decoded text once an escape is complete."""
+        if self.escape == "\\":
+            if char == "u":
+                self.escape = ""
+                return ""
+            self.escape = None
+            return _SIMPLE_ESCAPES.get(char, char)
+
+        self.escape += char
+        if len(self.escape) < 4:
+            return ""
+        code = int(self.escape, 16)
+        self.escape = None
+        if 0xD800 <= code <= 0xDBFF:
+            self.high_surrogate = code
+            return ""
+        if 0xDC00 <= code <= 0xDFFF and self.high_surrogate is not None:
+            code = 0x10000 + ((self.high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self.high_surrogate = None
+        return chr(code)
+
+    def emit(self, text: str, emitted: List[str]) -> None:
+        if self.string_is_key:
+            self.current_key.append(text)
+        elif self.capturing:
+            emitted.append(text)
@@ -0,0 +1,51 @@
+"""
+Counters and histograms for the LLM call path.
+
+Values are kept in-process (see get_llm_stats) so they can be logged or inspected
+from scripts, and are also sent to the Temporal SDK metric meter when recorded from
+inside an activity, so they show up alongside the SDK's own metrics once the worker
+runtime is configured with a metrics exporter (e.g. Prometheus).
+"""
+from collections import defaultdict
+from typing import Dict
+
+from temporalio import activity
+
+_counters: Dict[str, int] = defaultdict(int)
+_histograms: Dict[str, Dict[str, float]] = defaultdict(
+    lambda: {"count": 0, "sum": 0.0, "max": 0.0}
+)
+
+
+def increment(name: str, value: int = 1, description: str = None) -> None:
+    """Adds to a counter."""
+    _counters[name] += value
+    if activity.in_activity():
+        activity.metric_meter().create_counter(name, description).add(value)
+
+
+def record(name: str, value: float, unit: str = None, description: str = None) -> None:
+    """Records a value in a histogram (e.g. a latency in seconds or a token count)."""
+    histogram = _histograms[name]
+    histogram["count"] += 1
+    histogram["sum"] += value
+    histogram["max"] = max(histogram["max"], value)
+    if activity.in_activity():
+        activity.metric_meter().create_histogram_float(name, description, unit).record(value)
+
+
+def get_llm_stats() -> Dict[str, Dict]:
+    """Returns a snapshot of all counters and histogram summaries recorded in this process."""
+    return {
+        "counters": dict(_counters),
+        "histograms": {
+            name: dict(values, avg=values["sum"] / values["count"] if values["count"] else 0.0)
+            for name, values in _histograms.items()
+        },
+    }
+
+
+def reset_llm_stats() -> None:
+    """Clears all recorded values (mainly for tests and benchmarks)."""
+    _counters.clear()
+    _histograms.clear()
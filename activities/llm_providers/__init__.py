@@ -0,0 +1,64 @@
+"""
+LLM provider adapters.
+
+Each provider lives in its own module and is only imported when it is selected,
+so a worker configured for one provider never pays the import cost (or memory)
+of the other providers' SDKs.
+
+To add a provider, write an LLMProvider subclass in a module and either add it to
+PROVIDER_REGISTRY below or call register_provider() before ToolActivities is
+created. LLM_PROVIDER may also be set to a "package.module:ClassName" path.
+"""
+import importlib
+from typing import Dict, Optional
+
+from activities.llm_providers.base import LLMProvider
+
+DEFAULT_PROVIDER = "openai"
+
+# provider name -> "module.path:ClassName", resolved lazily by get_provider()
+PROVIDER_REGISTRY: Dict[str, str] = {
+    "openai": "activities.llm_providers.openai_provider:OpenAIProvider",
+    "grok": "activities.llm_providers.grok_provider:GrokProvider",
+    "anthropic": "activities.llm_providers.anthropic_provider:AnthropicProvider",
+    "google": "activities.llm_providers.google_provider:GoogleProvider",
+    "deepseek": "activities.llm_providers.deepseek_provider:DeepSeekProvider",
+    "ollama": "activities.llm_providers.ollama_provider:OllamaProvider",
+}
+
+
+def register_provider(name: str, target: str) -> None:
+    """
+    Registers (or replaces) a provider adapter.
+
+    Args:
+        name: The value of LLM_PROVIDER that selects this provider
+        target: Import path of the adapter class in the form "package.module:ClassName"
+    """
+    PROVIDER_REGISTRY[name.lower()] = target
+
+
+def load_provider_class(name: str) -> type:
+    """Imports and returns the adapter class registered for the provider name."""
+    target = PROVIDER_REGISTRY.get(name.lower())
+    if target is None:
+        if ":" not in name:
+            raise ValueError(f"Unknown LLM provider: {name}")
+        target = name
+    module_path, class_name = target.split(":", 1)
+    module = importlib.import_module(module_path)
+    return getattr(module, class_name)
+
+
+def get_provider(name: str, model: Optional[str] = None) -> LLMProvider:
+    """
+    Creates the adapter for the named provider, importing only that provider's SDK.
+    Unknown providers fall back to OpenAI, matching the historical behavior.
+    If model is not given the adapter's default model is used.
+    """
+    try:
+        provider_class = load_provider_class(name)
+    except ValueError:
+        print(f"Warning: Unknown LLM_PROVIDER '{name}', defaulting to OpenAI")
+        provider_class = load_provider_class(DEFAULT_PROVIDER)
+    return provider_class(model)
@@ -0,0 +1,98 @@
+import os
+from typing import AsyncIterator, Optional
+
+import anthropic
+
+from activities.llm_providers.base import LLMProvider, ModelPrice
+from activities.llm_providers.http_pool import pool_options
+from models.data_types import LLMUsage, ToolPromptInput
+from prompts.agent_prompt_generators import split_static_context
+
+
+class AnthropicProvider(LLMProvider):
+    name = "anthropic"
+    display_name = "Anthropic"
+    default_model = "claude-3-5-sonnet-20241022"
+    # default_model = "claude-3-7-sonnet-20250219"  # doesn't do as well
+    model_prices = {
+        "claude-3-5-sonnet": ModelPrice(input=3.00, output=15.00, cached_input=0.30, cache_write=3.75),
+        "claude-3-7-sonnet": ModelPrice(input=3.00, output=15.00, cached_input=0.30, cache_write=3.75),
+        "claude-3-5-haiku": ModelPrice(input=0.80, output=4.00, cached_input=0.08, cache_write=1.00),
+    }
+
+    def __init__(self, model: Optional[str] = None):
+        super().__init__(model)
+        self.client: Optional[anthropic.AsyncAnthropic] = None
+        if os.environ.get("ANTHROPIC_API_KEY"):
+            self.client = self.create_client(os.environ.get("ANTHROPIC_API_KEY"))
+            print("Initialized Anthropic client")
+        else:
+            print("Warning: ANTHROPIC_API_KEY not set but LLM_PROVIDER is 'anthropic'")
+
+    def get_client(self) -> anthropic.AsyncAnthropic:
+        if not self.client:
+            api_key = os.environ.get("ANTHROPIC_API_KEY")
+            if not api_key:
+                raise ValueError(
+                    "ANTHROPIC_API_KEY is not set in the environment variables but LLM_PROVIDER is 'anthropic'"
+                )
+            self.client = self.create_client(api_key)
+            print("Initialized Anthropic client on demand")
+        return self.client
+
+    @staticmethod
+    def create_client(api_key: str) -> anthropic.AsyncAnthropic:
+        # one pooled HTTP client per provider, reused by every call (see http_pool)
+        return anthropic.AsyncAnthropic(
+            api_key=api_key, http_client=anthropic.DefaultAsyncHttpxClient(**pool_options())
+        )
+
+    def system_blocks(self, input: ToolPromptInput) -> list:
+        """
+        Splits the system prompt into the static goal/tool prefix, marked with cache_control so
+        Anthropic caches it across turns, and the dynamic history (plus date) after it.
+        """
+        system_prompt = self.system_prompt(input, human_readable_date=True)
+        static_prefix, dynamic_part = split_static_context(system_prompt)
+        if not static_prefix:
+            return [{"type": "text", "text": system_prompt}]
+        return [
+            {"type": "text", "text": static_prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": dynamic_part},
+        ]
+
+    def request_args(self, input: ToolPromptInput) -> dict:
+        return dict(
+            model=self.model,
+            max_tokens=self.max_output_tokens(input),
+            system=self.system_blocks(input),
+            messages=[
+                {
+                    "role": "user",
+                    "content": input.prompt,
+                }
+            ],
+        )
+
+    async def complete(self, input: ToolPromptInput, usage: Optional[LLMUsage] = None) -> str:
+        response = await self.get_client().messages.create(**self.request_args(input))
+        self.record_usage(response.usage, usage)
+        return response.content[0].text
+
+    async def stream(self, input: ToolPromptInput, usage: Optional[LLMUsage] = None) -> AsyncIterator[str]:
+        async with self.get_client().messages.stream(**self.request_args(input)) as stream:
+            async for text in stream.text_stream:
+                yield text
+            self.record_usage((await stream.get_final_message()).usage, usage)
+
+    @staticmethod
+    def record_usage(message_usage, usage: Optional[LLMUsage]) -> None:
+        if usage is None or message_usage is None:
+            return
+        # Anthropic's input_tokens excludes tokens read from or written to the cache
+        usage.cached_input_tokens = message_usage.cache_read_input_tokens or 0
+        usage.cache_write_tokens = message_usage.cache_creation_input_tokens or 0
+        usage.input_tokens = (
+            message_usage.input_tokens + usage.cached_input_tokens + usage.cache_write_tokens
+        )
+        usage.output_tokens = message_usage.output_tokens
@@ -0,0 +1,159 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Optional
+
+from models.data_types import LLMUsage, ToolPromptInput
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """List prices in USD per million tokens."""
+    input: float
+    output: float
+    cached_input: Optional[float] = None  # prompt cache reads; defaults to the input price
+    cache_write: Optional[float] = None  # prompt cache writes; defaults to the input price
+
+    @classmethod
+    def parse(cls, value: str) -> "ModelPrice":
+        """Parses "input,output[,cached_input[,cache_write]]"."""
+        return cls(*(float(part) for part in value.split(",")))
+
+
+class LLMProvider:
+    """
+    Base class for LLM provider adapters.
+
+    Subclasses set name/display_name/default_model and implement complete(), which
+    sends a ToolPromptInput to the provider and returns the raw text of the reply.
+    Providers that support streaming also override stream(). Both fill in the optional
+    LLMUsage passed by the caller with the token counts the provider reports.
+    JSON extraction and parsing stay in ToolActivities so every provider behaves
+    the same way.
+    """
+
+    name: str = ""
+    display_name: str = ""
+    default_model: str = ""
+    # Default token budget for context instructions (LLM_CONTEXT_TOKEN_BUDGET overrides it).
+    # Well below model limits: it bounds latency and cost, not just what the model accepts.
+    context_token_budget: int = 24000
+    # Default cap on calls in flight for the provider's rate limiter (0 = none; LLM_*_MAX_CONCURRENT_REQUESTS overrides)
+    max_concurrent_requests: int = 0
+    # Prices by model name prefix (the longest matching prefix wins), for cost estimates.
+    # LLM_<PROVIDER>_PRICE_PER_MTOK overrides them.
+    model_prices: Dict[str, ModelPrice] = {}
+    # Output token cap for calls that don't set ToolPromptInput.max_output_tokens
+    default_max_output_tokens: int = 1024
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or self.default_model
+
+    async def complete(self, input: ToolPromptInput, usage: Optional[LLMUsage] = None) -> str:
+        raise NotImplementedError
+
+    async def stream(self, input: ToolPromptInput, usage: Optional[LLMUsage] = None) -> AsyncIterator[str]:
+        """
+        Yields the reply as text chunks as they are generated.
+        Providers without streaming support yield the whole reply as one chunk.
+        """
+        yield await self.complete(input, usage)
+
+    async def warm_up(self) -> bool:
+        """
+        Optionally pre-loads the model so the first request doesn't pay cold start latency.
+        Returns True if a warm-up was performed successfully.
+        """
+        return False
+
+    async def keep_warm(self) -> None:
+        """Optionally keeps the model loaded while the worker runs (run as a background task)."""
+        return
+
+    def max_output_tokens(self, input: ToolPromptInput) -> int:
+        return input.max_output_tokens or self.default_max_output_tokens
+
+    def price(self) -> Optional[ModelPrice]:
+        """The price of the configured model, or None if it isn't known."""
+        override = os.environ.get(f"LLM_{self.name.upper()}_PRICE_PER_MTOK")
+        if override:
+            return ModelPrice.parse(override)
+        prefixes = [prefix for prefix in self.model_prices if self.model.startswith(prefix)]
+        return self.model_prices[max(prefixes, key=len)] if prefixes else None
+
+    def estimate_cost(self, usage: LLMUsage) -> Optional[float]:
+        """Estimated cost of a call in USD, or None if the model's price isn't known."""
+        price = self.price()
+        if price is None:
+            return None
+        cached_price = price.input if price.cached_input is None else price.cached_input
+        write_price = price.input if price.cache_write is None else price.cache_write
+        uncached_tokens = usage.input_tokens - usage.cached_input_tokens - usage.cache_write_tokens
+        return (
+            uncached_tokens * price.input
+            + usage.cached_input_tokens * cached_price
+            + usage.cache_write_tokens * write_price
+            + usage.output_tokens * price.output
+        ) / 1_000_000
+
+    def rate_limit_retry_after(self, error: Exception) -> Optional[float]:
+        """
+        Returns None if error isn't a rate limit (HTTP 429) response. Otherwise returns the
+        seconds the provider asked us to wait (Retry-After), or 0 if it didn't say.
+        Works for SDKs whose errors carry an httpx-style response or a status code.
+        """
+        response = getattr(error, "response", None)
+        status = (
+            getattr(error, "status_code", None)
+            or getattr(response, "status_code", None)
+            or getattr(error, "code", None)
+        )
+        if status != 429:
+            return None
+        headers = getattr(response, "headers", None) or {}
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            retry_after = headers.get("retry-after")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    # an HTTP date
+                    when = parsedate_to_datetime(retry_after)
+                    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            pass
+        return 0.0
+
+    def system_prompt(self, input: ToolPromptInput, human_readable_date: bool = False) -> str:
+        """Builds the system prompt from the context instructions plus the current date."""
+        current_date = (
+            get_current_date_human_readable()
+            if human_readable_date
+            else datetime.now().strftime("%B %d, %Y")
+        )
+        return input.context_instructions + ". The current date is " + current_date
+
+    def chat_messages(self, input: ToolPromptInput, human_readable_date: bool = False) -> list:
+        """Builds an OpenAI-style system + user message list."""
+        return [
+            {
+                "role": "system",
+                "content": self.system_prompt(input, human_readable_date),
+            },
+            {
+                "role": "user",
+                "content": input.prompt,
+            },
+        ]
+
+
+def get_current_date_human_readable():
+    """
+    Returns the current date in a human-readable format.
+
+    Example: Wednesday, January 1, 2025
+    """
+    return datetime.now().strftime("%A, %B %d, %Y")
@@ -0,0 +1,28 @@
+from typing import Optional
+
+from activities.llm_providers.base import ModelPrice
+from activities.llm_providers.openai_provider import OpenAIProvider
+from models.data_types import LLMUsage
+
+
+class DeepSeekProvider(OpenAIProvider):
+    """
+    DeepSeek exposes an OpenAI-compatible API, so this reuses the OpenAI adapter and its pooled
+    async client (the deepseek SDK opens a new connection for every blocking request).
+    """
+
+    name = "deepseek"
+    display_name = "DeepSeek"
+    default_model = "deepseek-chat"
+    model_prices = {"deepseek-chat": ModelPrice(input=0.27, output=1.10, cached_input=0.07)}
+    api_key_env_var = "DEEPSEEK_API_KEY"
+    base_url = "https://api.deepseek.com"
+
+    @staticmethod
+    def record_usage(completion_usage, usage: Optional[LLMUsage]) -> None:
+        OpenAIProvider.record_usage(completion_usage, usage)
+        if usage is not None and completion_usage is not None:
+            # DeepSeek caches prompt prefixes automatically and reports hits in its own field
+            cache_hit_tokens = getattr(completion_usage, "prompt_cache_hit_tokens", None)
+            if cache_hit_tokens:
+                usage.cached_input_tokens = cache_hit_tokens
@@ -0,0 +1,83 @@
+import os
+from typing import AsyncIterator, Optional
+
+import google.generativeai as genai
+
+from activities.llm_providers.base import LLMProvider, ModelPrice
+from models.data_types import LLMUsage, ToolPromptInput
+
+
+class GoogleProvider(LLMProvider):
+    name = "google"
+    display_name = "Google Gemini"
+    default_model = "models/gemini-1.5-flash"
+    model_prices = {
+        "models/gemini-1.5-flash": ModelPrice(input=0.075, output=0.30),
+        "models/gemini-2.0-flash": ModelPrice(input=0.10, output=0.40),
+    }
+
+    def __init__(self, model: Optional[str] = None):
+        super().__init__(model)
+        self.genai_configured: bool = False
+        api_key = os.environ.get("GOOGLE_API_KEY")
+        if api_key:
+            genai.configure(api_key=api_key)
+            self.genai_configured = True
+            print("Configured Google Generative AI")
+        else:
+            print("Warning: GOOGLE_API_KEY not set but LLM_PROVIDER is 'google'")
+
+    def ensure_configured(self) -> None:
+        if not self.genai_configured:
+            api_key = os.environ.get("GOOGLE_API_KEY")
+            if not api_key:
+                raise ValueError(
+                    "GOOGLE_API_KEY is not set in the environment variables but LLM_PROVIDER is 'google'"
+                )
+            genai.configure(api_key=api_key)
+            self.genai_configured = True
+            print("Configured Google Generative AI on demand")
+
+    def generative_model(self, input: ToolPromptInput) -> genai.GenerativeModel:
+        # A GenerativeModel only wraps the per-request system instruction: all of them share the
+        # SDK's process-wide gRPC channel, so building one per call doesn't open new connections.
+        self.ensure_configured()
+        return genai.GenerativeModel(
+            self.model,
+            system_instruction=self.system_prompt(input),
+            generation_config={"max_output_tokens": self.max_output_tokens(input)},
+        )
+
+    async def complete(self, input: ToolPromptInput, usage: Optional[LLMUsage] = None) -> str:
+        response = await self.generative_model(input).generate_content_async(input.prompt)
+        self.record_usage(response.usage_metadata, usage)
+        return response.text
+
+    async def stream(self, input: ToolPromptInput, usage: Optional[LLMUsage] = None) -> AsyncIterator[str]:
+        response = await self.generative_model(input).generate_content_async(
+            input.prompt, stream=True
+        )
+        async for chunk in response:
+            text = self.chunk_text(chunk)
+            if text:
+                yield text
+        self.record_usage(response.usage_metadata, usage)
+
+    @staticmethod
+    def chunk_text(chunk) -> str:
+        """Text of a streamed chunk. chunk.text raises ValueError for chunks without text parts
+        (e.g. an empty final chunk, or one blocked by safety filters), so the parts are read directly."""
+        candidates = getattr(chunk, "candidates", None) or []
+        if not candidates:
+            return ""
+        content = getattr(candidates[0], "content", None)
+        return "".join(getattr(part, "text", "") or "" for part in getattr(content, "parts", None) or [])
+
+    @staticmethod
+    def record_usage(usage_metadata, usage: Optional[LLMUsage]) -> None:
+        if usage is None or usage_metadata is None:
+            return
+        usage.input_tokens = usage_metadata.prompt_token_count
+        usage.output_tokens = usage_metadata.candidates_token_count
+        # populated when Gemini serves part of the prompt from its (implicit or explicit) context cache
+        usage.cached_input_tokens = usage_metadata.cached_content_token_count
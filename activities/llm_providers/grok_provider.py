@@ -0,0 +1,13 @@
+from activities.llm_providers.base import ModelPrice
+from activities.llm_providers.openai_provider import OpenAIProvider
+
+
+class GrokProvider(OpenAIProvider):
+    """Grok exposes an OpenAI-compatible API, so this reuses the OpenAI adapter."""
+
+    name = "grok"
+    display_name = "Grok"
+    default_model = "grok-2-1212"
+    model_prices = {"grok-2": ModelPrice(input=2.00, output=10.00)}
+    api_key_env_var = "GROK_API_KEY"
+    base_url = "https://api.x.ai/v1"
@@ -0,0 +1,53 @@
+"""
+Connection pool settings for the provider SDKs' HTTP clients.
+
+Each adapter builds its SDK client once, when ToolActivities is created, on an httpx
+client configured with pool_options(), so every activity invocation reuses the pooled
+keep-alive connections instead of opening a new connection (and TLS handshake) per call:
+
+- LLM_HTTP_MAX_CONNECTIONS: connections per provider (default WORKER_MAX_CONCURRENT_ACTIVITIES,
+  itself 100 by default), so concurrent activities never queue for a connection
+- LLM_HTTP_KEEPALIVE_SECONDS: how long idle connections are kept open (default 120)
+- LLM_HTTP2_ENABLED: negotiate HTTP/2 with servers that support it, multiplexing requests
+  over fewer connections (default true; needs the h2 package: pip install "httpx[http2]")
+"""
+import importlib.util
+import os
+from functools import lru_cache
+from typing import Any, Dict
+
+import httpx
+
+DEFAULT_MAX_CONNECTIONS = 100  # the Temporal worker's default max_concurrent_activities
+
+
+def max_connections() -> int:
+    return int(
+        os.environ.get("LLM_HTTP_MAX_CONNECTIONS")
+        or os.environ.get("WORKER_MAX_CONCURRENT_ACTIVITIES")
+        or DEFAULT_MAX_CONNECTIONS
+    )
+
+
+@lru_cache(maxsize=1)
+def http2_enabled() -> bool:
+    if os.environ.get("LLM_HTTP2_ENABLED", "true").lower() == "false":
+        return False
+    if importlib.util.find_spec("h2") is None:
+        print('HTTP/2 unavailable for LLM provider clients (pip install "httpx[http2]"); using HTTP/1.1')
+        return False
+    return True
+
+
+def pool_limits() -> httpx.Limits:
+    connections = max_connections()
+    return httpx.Limits(
+        max_connections=connections,
+        max_keepalive_connections=connections,
+        keepalive_expiry=float(os.environ.get("LLM_HTTP_KEEPALIVE_SECONDS", "120")),
+    )
+
+
+def pool_options() -> Dict[str, Any]:
+    """Keyword arguments for an httpx.AsyncClient (or an SDK's subclass of it)."""
+    return {"limits": pool_limits(), "http2": http2_enabled()}
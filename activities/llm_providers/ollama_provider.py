@@ -0,0 +1,122 @@
+import asyncio
+import os
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Optional, Union
+
+from ollama import AsyncClient, ChatResponse
+
+from activities.llm_providers.base import LLMProvider, ModelPrice
+from activities.llm_providers.http_pool import pool_limits
+from models.data_types import LLMUsage, ToolPromptInput
+
+# Tokens kept free in the context window for the reply when deriving the context budget from num_ctx
+REPLY_TOKEN_RESERVE = 2048
+
+
+def parse_keep_alive(value: str) -> Union[float, str]:
+    """OLLAMA_KEEP_ALIVE as the API expects it: a number of seconds (-1 = forever) or a duration like "30m"."""
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+class OllamaProvider(LLMProvider):
+    """
+    Local models served by Ollama, via its async client.
+
+    - every request sets keep_alive (OLLAMA_KEEP_ALIVE), so the model stays loaded between
+      quiet periods instead of cold-starting again
+    - keep_warm() re-warms the model in the background whenever no request has been made
+      for OLLAMA_REWARM_INTERVAL_SECONDS
+    - num_ctx is set explicitly (OLLAMA_NUM_CTX); Ollama's small default silently truncates
+      long prompts. The context token budget is derived from it.
+    - calls in flight are capped at OLLAMA_NUM_PARALLEL, the number of requests the server
+      processes in parallel; more would just queue on the server and count against timeouts
+    """
+
+    name = "ollama"
+    display_name = "Ollama"
+    default_model = "qwen2.5:14b"
+    # local models run with much smaller context windows and prompt processing is slow
+    context_token_budget = 6000
+    # runs locally: no per-token cost
+    model_prices = {"": ModelPrice(input=0.0, output=0.0)}
+
+    def __init__(self, model: Optional[str] = None, host: Optional[str] = None):
+        super().__init__(model or os.environ.get("OLLAMA_MODEL_NAME", self.default_model))
+        # host defaults to OLLAMA_HOST, then http://localhost:11434; the local server speaks HTTP/1.1
+        self.client = AsyncClient(host=host, limits=pool_limits())
+        self.keep_alive = parse_keep_alive(os.environ.get("OLLAMA_KEEP_ALIVE", "30m"))
+        self.num_ctx = int(os.environ.get("OLLAMA_NUM_CTX", "8192"))
+        self.context_token_budget = min(
+            self.context_token_budget, max(1024, self.num_ctx - REPLY_TOKEN_RESERVE)
+        )
+        self.max_concurrent_requests = int(os.environ.get("OLLAMA_NUM_PARALLEL", "1"))
+        self.rewarm_interval = float(os.environ.get("OLLAMA_REWARM_INTERVAL_SECONDS", "120"))
+        self.last_request_at = 0.0
+        # actual model loading happens in warm_up, called on worker startup
+        print(f"Using Ollama model: {self.model} (will be loaded on worker startup)")
+
+    async def warm_up(self) -> bool:
+        """Loads the model into memory (a chat request with no messages) so the first request doesn't wait for it"""
+        try:
+            print(f"Pre-loading Ollama model '{self.model}' - this may take 30+ seconds...")
+            start_time = time.monotonic()
+            await self.client.chat(model=self.model, messages=[], keep_alive=self.keep_alive)
+            self.last_request_at = time.monotonic()
+            print(f"✅ Ollama model loaded successfully in {time.monotonic() - start_time:.2f} seconds")
+            return True
+        except Exception as e:
+            print(f"❌ Error pre-loading Ollama model: {str(e)}")
+            print("The worker will continue, but the first actual request may experience a delay.")
+            return False
+
+    async def keep_warm(self) -> None:
+        """Re-warms the model whenever it has been idle for rewarm_interval; runs until cancelled."""
+        if self.rewarm_interval <= 0:
+            return
+        while True:
+            idle = time.monotonic() - self.last_request_at
+            if idle >= self.rewarm_interval:
+                await self.warm_up()
+                idle = 0.0
+            await asyncio.sleep(self.rewarm_interval - idle)
+
+    def request_args(self, input: ToolPromptInput) -> dict:
+        self.last_request_at = time.monotonic()
+        return {
+            "model": self.model,
+            "messages": self.chat_messages(input, human_readable_date=True),
+            "options": {"num_ctx": self.num_ctx, "num_predict": self.max_output_tokens(input)},
+            "keep_alive": self.keep_alive,
+        }
+
+    async def complete(self, input: ToolPromptInput, usage: Optional[LLMUsage] = None) -> str:
+        try:
+            response: ChatResponse = await self.client.chat(**self.request_args(input))
+            self.record_usage(response, usage)
+            return response.message.content
+        except Exception as e:
+            # Log and raise so Temporal retries the activity
+            print(f"Error in Ollama chat: {str(e)}")
+            raise
+
+    async def stream(self, input: ToolPromptInput, usage: Optional[LLMUsage] = None) -> AsyncIterator[str]:
+        parts = await self.client.chat(**self.request_args(input), stream=True)
+        # closing the stream (e.g. when the caller stops reading early) closes the response
+        async with aclosing(parts):
+            async for part in parts:
+                if part.done:
+                    self.record_usage(part, usage)
+                if part.message.content:
+                    yield part.message.content
+
+    @staticmethod
+    def record_usage(response: ChatResponse, usage: Optional[LLMUsage]) -> None:
+        # Ollama reuses the KV cache for a matching prompt prefix but doesn't report cached token counts
+        if usage is None:
+            return
+        usage.input_tokens = response.prompt_eval_count or 0
+        usage.output_tokens = response.eval_count or 0
@@ -0,0 +1,89 @@
+import os
+from typing import AsyncIterator, Optional
+
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from activities.llm_providers.base import LLMProvider, ModelPrice
+from activities.llm_providers.http_pool import pool_options
+from models.data_types import LLMUsage, ToolPromptInput
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+    display_name = "ChatGPT"
+    default_model = "gpt-4o"  # was gpt-4-0613
+    model_prices = {
+        "gpt-4o": ModelPrice(input=2.50, output=10.00, cached_input=1.25),
+        "gpt-4o-mini": ModelPrice(input=0.15, output=0.60, cached_input=0.075),
+        "gpt-4.1": ModelPrice(input=2.00, output=8.00, cached_input=0.50),
+        "gpt-4.1-mini": ModelPrice(input=0.40, output=1.60, cached_input=0.10),
+    }
+    api_key_env_var = "OPENAI_API_KEY"
+    base_url: Optional[str] = None
+
+    def __init__(self, model: Optional[str] = None):
+        super().__init__(model)
+        self.client: Optional[AsyncOpenAI] = None
+        if os.environ.get(self.api_key_env_var):
+            self.client = self.create_client(os.environ.get(self.api_key_env_var))
+            print(f"Initialized {self.name} client")
+        else:
+            print(
+                f"Warning: {self.api_key_env_var} not set but LLM_PROVIDER is '{self.name}'"
+            )
+
+    def create_client(self, api_key: str) -> AsyncOpenAI:
+        # one pooled HTTP client per provider, reused by every call (see http_pool)
+        return AsyncOpenAI(
+            api_key=api_key,
+            base_url=self.base_url,
+            http_client=DefaultAsyncHttpxClient(**pool_options()),
+        )
+
+    def get_client(self) -> AsyncOpenAI:
+        if not self.client:
+            api_key = os.environ.get(self.api_key_env_var)
+            if not api_key:
+                raise ValueError(
+                    f"{self.api_key_env_var} is not set in the environment variables but LLM_PROVIDER is '{self.name}'"
+                )
+            self.client = self.create_client(api_key)
+            print(f"Initialized {self.name} client on demand")
+        return self.client
+
+    # OpenAI caches prompt prefixes automatically; the static context comes first in the
+    # system message (see prompts.agent_prompt_generators.DYNAMIC_CONTEXT_MARKER) so it can be reused.
+
+    async def complete(self, input: ToolPromptInput, usage: Optional[LLMUsage] = None) -> str:
+        chat_completion = await self.get_client().chat.completions.create(
+            model=self.model,
+            messages=self.chat_messages(input),
+            max_tokens=self.max_output_tokens(input),
+        )
+        self.record_usage(chat_completion.usage, usage)
+        return chat_completion.choices[0].message.content
+
+    async def stream(self, input: ToolPromptInput, usage: Optional[LLMUsage] = None) -> AsyncIterator[str]:
+        chunks = await self.get_client().chat.completions.create(
+            model=self.model,
+            messages=self.chat_messages(input),
+            max_tokens=self.max_output_tokens(input),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        # closing the stream (e.g. when the caller stops reading early) closes the response
+        async with chunks:
+            async for chunk in chunks:
+                if chunk.usage:
+                    self.record_usage(chunk.usage, usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    @staticmethod
+    def record_usage(completion_usage, usage: Optional[LLMUsage]) -> None:
+        if usage is None or completion_usage is None:
+            return
+        usage.input_tokens = completion_usage.prompt_tokens or 0
+        usage.output_tokens = completion_usage.completion_tokens or 0
+        details = completion_usage.prompt_tokens_details
+        usage.cached_input_tokens = (details.cached_tokens or 0) if details else 0
@@ -0,0 +1,212 @@
+"""
+Local, deterministic pre-validation of user prompts.
+
+Most validation LLM calls just confirm that an obviously on-topic reply is on topic.
+PromptPrevalidator accepts those prompts locally and escalates everything else to the
+LLM. A prompt is accepted when it is:
+
+- an acknowledgement ("yes", "that's right", "go ahead") replying to an agent message
+- a short answer to an agent question that asked for a value (an email, a date or a
+  number), made up of values of that kind and words from the goal's vocabulary only
+- mostly made of (at least two) words from the goal's vocabulary: the goal description,
+  tool and argument names and descriptions, and the agent's previous message. Prompts
+  carrying emails or numbers the agent didn't ask for (an account, an amount) never
+  pass this way: those are what the goal's tools act on, so the LLM checks them
+
+It never rejects a prompt; anything it isn't sure about goes to the LLM as before.
+Counters: prevalidation_accepts, prevalidation_escalations.
+"""
+import os
+import re
+from typing import Dict, FrozenSet, List, Optional
+
+from activities import llm_metrics
+from models.data_types import ConversationHistory
+from models.tool_definitions import AgentGoal
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_CAMEL_CASE_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[a-z]{2,}", re.IGNORECASE)
+_DIGIT_RE = re.compile(r"\d")
+# Numbers that could be (part of) a date: a day, month or year, or an ordinal ("14th")
+_DATE_NUMBER_RE = re.compile(r"\d{1,4}(?:st|nd|rd|th)?")
+
+# Words that carry no meaning on their own for deciding relevance
+STOPWORDS = frozenset(
+    """a about after all also am an and any are as at be been before between but by can
+    could did do does first for from get had has have he her here him his how i i'd i'll
+    i'm i've if in into is it it's its just let let's like me might more most much my no
+    not now of on one or our out over please she should so some than that that's the
+    their them then there these they this those through to too until up us very want was
+    we what when where which who why will with would you you're your""".split()
+)
+
+# Replies that only make sense as an answer to the agent's previous message
+ACKNOWLEDGEMENT_WORDS = frozenset(
+    """yes yeah yep yup sure ok okay okey correct right exactly absolutely definitely
+    fine good great perfect sounds go ahead proceed confirm confirmed do it that's that
+    please thanks thank you no nope nah not now all done looks lgtm cool alright""".split()
+)
+
+DATE_WORDS = frozenset(
+    """jan january feb february mar march apr april may jun june jul july aug august sep
+    sept september oct october nov november dec december monday tuesday wednesday
+    thursday friday saturday sunday today tomorrow yesterday week weekend month year""".split()
+)
+
+# Words in the agent's message showing which kinds of value it asked for ("may" is too often not the month)
+VALUE_QUESTION_WORDS = {
+    "email": frozenset("email mail".split()),
+    "date": frozenset("date dates when day days start end".split()) | (DATE_WORDS - {"may"}),
+    "number": frozenset(
+        "number numbers id amount much many account accounts zip code digits quantity price budget".split()
+    ),
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words, with CamelCase identifiers (tool names) split into their parts."""
+    return _WORD_RE.findall(_CAMEL_CASE_RE.sub(" ", text).lower())
+
+
+def stem(word: str) -> str:
+    """Crude suffix stripping so "flights"/"flight" and "booking"/"book" match."""
+    for suffix in ("ing", "ies", "es", "ed", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[: -len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def content_stems(text: str) -> List[str]:
+    return [stem(word) for word in tokenize(text) if word not in STOPWORDS]
+
+
+class PromptPrevalidator:
+    def __init__(self, min_score: float = 0.5, max_answer_words: int = 12):
+        self.min_score = min_score
+        self.max_answer_words = max_answer_words
+        # goal id -> stems of the goal's description, tools and arguments
+        self.vocabularies: Dict[str, FrozenSet[str]] = {}
+
+    @classmethod
+    def from_env(cls) -> Optional["PromptPrevalidator"]:
+        """Returns the prevalidator configured in .env, or None if PREVALIDATION_ENABLED is false."""
+        if os.environ.get("PREVALIDATION_ENABLED", "true").lower() == "false":
+            return None
+        return cls(
+            min_score=float(os.environ.get("PREVALIDATION_MIN_SCORE", "0.5")),
+            max_answer_words=int(os.environ.get("PREVALIDATION_MAX_ANSWER_WORDS", "12")),
+        )
+
+    def goal_vocabulary(self, agent_goal: AgentGoal) -> FrozenSet[str]:
+        if agent_goal.id not in self.vocabularies:
+            texts = [agent_goal.description, agent_goal.agent_name, agent_goal.agent_friendly_description]
+            for tool in agent_goal.tools:
+                texts.extend([tool.name, tool.description])
+                for arg in tool.arguments:
+                    texts.extend([arg.name, arg.description])
+            self.vocabularies[agent_goal.id] = frozenset(content_stems(" ".join(texts)))
+        return self.vocabularies[agent_goal.id]
+
+    def accept_reason(
+        self, prompt: str, conversation_history: ConversationHistory, agent_goal: AgentGoal
+    ) -> Optional[str]:
+        """
+        Checks whether the prompt is clearly valid for the goal and conversation.
+
+        Returns:
+            Optional[str]: Why the prompt was accepted, or None if the LLM should decide
+        """
+        reason = self.classify(prompt, conversation_history, agent_goal)
+        if reason:
+            llm_metrics.increment("prevalidation_accepts")
+        else:
+            llm_metrics.increment("prevalidation_escalations")
+        return reason
+
+    def classify(
+        self, prompt: str, conversation_history: ConversationHistory, agent_goal: AgentGoal
+    ) -> Optional[str]:
+        words = tokenize(prompt)
+        if not words:
+            return None
+        agent_message = previous_agent_message(conversation_history, prompt)
+
+        if agent_message is not None and all(word in ACKNOWLEDGEMENT_WORDS for word in words):
+            return "acknowledgement"
+
+        # emails, numbers and dates count as on topic when they are what the agent's question asked for
+        emails = _EMAIL_RE.findall(prompt)
+        words = tokenize(_EMAIL_RE.sub(" ", prompt))
+        stems = [
+            stem(word)
+            for word in words
+            if word not in STOPWORDS and word not in ACKNOWLEDGEMENT_WORDS
+        ]
+        if not stems and not emails:
+            return None
+        asked = (
+            asked_value_kinds(agent_message)
+            if agent_message is not None
+            and "?" in agent_message
+            and len(words) + len(emails) <= self.max_answer_words
+            else frozenset()
+        )
+        value_kinds = [{"email"} for _ in emails] + [value_kinds_of(word, asked) for word in stems]
+        values = [kinds for kinds in value_kinds if kinds]
+
+        vocabulary = self.goal_vocabulary(agent_goal)
+        if agent_message:
+            vocabulary = vocabulary | frozenset(content_stems(agent_message))
+        matched = [word in vocabulary for word in stems]
+        if values:
+            other_words = [
+                in_vocabulary for word, in_vocabulary in zip(stems, matched) if not value_kinds_of(word, asked)
+            ]
+            if all(kinds & asked for kinds in values) and all(other_words):
+                return "answer value"
+            # emails and numbers that don't answer the question are for the LLM to check
+            if emails or any(_DIGIT_RE.search(word) for word in stems):
+                return None
+        # a single shared word ("cost", "book") is too weak a signal on its own
+        if sum(matched) >= 2 and sum(matched) / len(stems) >= self.min_score:
+            return "goal vocabulary"
+        return None
+
+
+def asked_value_kinds(agent_message: str) -> FrozenSet[str]:
+    """The kinds of value ("email", "date", "number") the agent's message asks for."""
+    words = set(tokenize(agent_message))
+    return frozenset(kind for kind, question_words in VALUE_QUESTION_WORDS.items() if words & question_words)
+
+
+def value_kinds_of(word: str, asked: FrozenSet[str]) -> FrozenSet[str]:
+    """
+    The kinds of value a word could be: anything with a digit is a number, short ones ("14",
+    "2025", "14th") may be dates too, and date words ("july", "tomorrow") are dates when a date
+    was asked for (otherwise they're plain words).
+    """
+    if _DATE_NUMBER_RE.fullmatch(word):
+        return frozenset({"number", "date"})
+    if _DIGIT_RE.search(word):
+        return frozenset({"number"})
+    if word in DATE_WORDS and "date" in asked:
+        return frozenset({"date"})
+    return frozenset()
+
+
+def previous_agent_message(conversation_history: ConversationHistory, prompt: str) -> Optional[str]:
+    """Text of the agent's last message before the prompt, or None if the agent hasn't spoken yet."""
+    messages = conversation_history.get("messages", [])
+    # the workflow records the prompt in the history before validating it
+    if messages and messages[-1].get("actor") == "user" and messages[-1].get("response") == prompt:
+        messages = messages[:-1]
+    for message in reversed(messages):
+        if message.get("actor") == "user":
+            return None
+        if message.get("actor") == "agent":
+            response = message.get("response")
+            if isinstance(response, dict):
+                response = response.get("response")
+            return str(response or "")
+    return None
@@ -0,0 +1,350 @@
+"""
+Per-provider client-side rate limiting for LLM calls.
+
+Each provider gets a ProviderRateLimiter, shared by every ToolActivities invocation in
+the worker process, that holds requests back locally instead of letting them burst
+into provider 429s:
+
+- at most LLM_MAX_CONCURRENT_REQUESTS calls in flight
+- LLM_REQUESTS_PER_MINUTE and LLM_TOKENS_PER_MINUTE token buckets; a call waits until
+  both have capacity. Token use is estimated up front and corrected once the provider
+  reports actual usage.
+- when a provider answers 429, the limiter pauses all calls to it for the Retry-After
+  period, and the call is retried locally (up to LLM_RATE_LIMIT_RETRIES times, if the
+  pause is no longer than LLM_RATE_LIMIT_MAX_WAIT_SECONDS) rather than failing the
+  activity.
+- a call never queues longer than LLM_RATE_LIMIT_MAX_WAIT_SECONDS, or than the time the
+  activity has left; past that, RateLimitWaitTooLong is raised so the call can fail over
+  or the activity can be retried, instead of timing out in the queue. The default wait
+  is kept below the LLM activities' start-to-close timeout.
+
+Each setting can be given per provider, e.g. LLM_OPENAI_REQUESTS_PER_MINUTE; 0 means
+no limit. Bucket and pause state is kept in the worker process by default. Setting
+LLM_RATE_LIMIT_DB_PATH moves it to a SQLite file, so several worker processes on the
+host share one set of buckets and stay under the account's limits together (the
+in-flight cap stays per process). Time spent waiting is recorded as llm_rate_limit_wait_seconds, and 429s as
+llm_rate_limited.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple, Union
+
+from activities import llm_metrics
+
+
+class RateLimitWaitTooLong(Exception):
+    """The limiter would have to hold a call back for longer than it's allowed to wait."""
+
+
+class TokenBucket:
+    """Refills at rate_per_minute and holds at most one minute's worth."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = refilled(self.tokens, self.updated, self.rate_per_minute, now)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount is available (0 if it is now)."""
+        self.refill()
+        return bucket_wait_time(self.tokens, self.rate_per_minute, amount)
+
+    def try_acquire(self, amount: float) -> float:
+        """Takes amount if available and returns 0, otherwise returns the seconds until it will be."""
+        wait = self.wait_time(amount)
+        if wait <= 0:
+            self.tokens -= amount
+        return wait
+
+    def adjust(self, amount: float) -> None:
+        """Takes (or, if negative, returns) tokens after the fact; the balance may go negative."""
+        self.refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+def refilled(tokens: float, updated: float, rate_per_minute: float, now: float) -> float:
+    return min(rate_per_minute, tokens + (now - updated) * rate_per_minute / 60)
+
+
+def bucket_wait_time(tokens: float, rate_per_minute: float, amount: float) -> float:
+    # a request bigger than the whole bucket goes through once the bucket is full
+    needed = min(amount, rate_per_minute)
+    if tokens >= needed:
+        return 0.0
+    return (needed - tokens) * 60 / rate_per_minute
+
+
+class LocalRateLimitBackend:
+    """Bucket and pause state for this worker process only."""
+
+    # whether calls block on I/O and should run off the event loop
+    blocking = False
+
+    def __init__(self):
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.paused_until: Dict[str, float] = {}
+
+    def bucket(self, key: str, rate_per_minute: float) -> TokenBucket:
+        if key not in self.buckets:
+            self.buckets[key] = TokenBucket(rate_per_minute)
+        return self.buckets[key]
+
+    def acquire(self, provider: str, demands: Dict[str, Tuple[float, float]]) -> float:
+        """
+        Takes from every bucket in demands ({bucket key: (rate per minute, amount)}) if all have
+        capacity and the provider isn't paused; otherwise takes nothing and returns the seconds to wait.
+        """
+        wait = self.paused_until.get(provider, 0.0) - time.monotonic()
+        if wait > 0:
+            return wait
+        buckets = [(self.bucket(key, rate), amount) for key, (rate, amount) in demands.items()]
+        wait = max((bucket.wait_time(amount) for bucket, amount in buckets), default=0.0)
+        if wait <= 0:
+            for bucket, amount in buckets:
+                bucket.tokens -= amount
+        return wait
+
+    def adjust(self, key: str, rate_per_minute: float, amount: float) -> None:
+        self.bucket(key, rate_per_minute).adjust(amount)
+
+    def pause(self, provider: str, seconds: float) -> None:
+        self.paused_until[provider] = max(
+            self.paused_until.get(provider, 0.0), time.monotonic() + seconds
+        )
+
+
+class SQLiteRateLimitBackend:
+    """
+    Bucket and pause state in a SQLite file, shared by every worker process on the host.
+    Each acquire is one IMMEDIATE transaction, so concurrent processes can't both take
+    the same capacity. Times are wall-clock since they are compared across processes.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_pauses (provider TEXT PRIMARY KEY, until REAL NOT NULL)"
+        )
+        # the connection is shared by the threads that calls are run on
+        self.lock = threading.Lock()
+
+    def acquire(self, provider: str, demands: Dict[str, Tuple[float, float]]) -> float:
+        with self.lock, self.transaction():
+            now = time.time()
+            row = self.db.execute(
+                "SELECT until FROM rate_limit_pauses WHERE provider = ?", (provider,)
+            ).fetchone()
+            if row and row[0] > now:
+                return row[0] - now
+            balances = {
+                key: (self.balance(key, rate, now), rate, amount)
+                for key, (rate, amount) in demands.items()
+            }
+            wait = max(
+                (bucket_wait_time(tokens, rate, amount) for tokens, rate, amount in balances.values()),
+                default=0.0,
+            )
+            if wait <= 0:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    [(key, tokens - amount, now) for key, (tokens, _, amount) in balances.items()],
+                )
+            return wait
+
+    def adjust(self, key: str, rate_per_minute: float, amount: float) -> None:
+        with self.lock, self.transaction():
+            now = time.time()
+            tokens = min(rate_per_minute, self.balance(key, rate_per_minute, now) - amount)
+            self.db.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+
+    def pause(self, provider: str, seconds: float) -> None:
+        with self.lock, self.transaction():
+            self.db.execute(
+                "INSERT INTO rate_limit_pauses (provider, until) VALUES (?, ?) "
+                "ON CONFLICT(provider) DO UPDATE SET until = max(until, excluded.until)",
+                (provider, time.time() + seconds),
+            )
+
+    def balance(self, key: str, rate_per_minute: float, now: float) -> float:
+        row = self.db.execute(
+            "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return rate_per_minute
+        return refilled(row[0], row[1], rate_per_minute, now)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+
+RateLimitBackend = Union[LocalRateLimitBackend, SQLiteRateLimitBackend]
+
+
+class ProviderRateLimiter:
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int = 0,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_retries: int = 2,
+        max_retry_wait_seconds: float = 10.0,
+        default_retry_after_seconds: float = 2.0,
+        backend: Optional[RateLimitBackend] = None,
+    ):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.max_retry_wait_seconds = max_retry_wait_seconds
+        self.default_retry_after_seconds = default_retry_after_seconds
+        self.backend = backend or LocalRateLimitBackend()
+        self.semaphore = asyncio.Semaphore(max_concurrent) if max_concurrent > 0 else None
+
+    @asynccontextmanager
+    async def limit(self, estimated_tokens: int, max_wait: Optional[float] = None) -> AsyncIterator[None]:
+        """
+        Waits for a free slot and bucket capacity, and holds the slot for the duration of the call.
+        Raises RateLimitWaitTooLong rather than wait longer than max_retry_wait_seconds or max_wait.
+        """
+        start = time.monotonic()
+        deadline = start + min(self.max_retry_wait_seconds, max_wait if max_wait is not None else float("inf"))
+        if self.semaphore:
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout=max(0.0, deadline - start))
+            except asyncio.TimeoutError:
+                raise RateLimitWaitTooLong(f"No free {self.name} call slot within {deadline - start:.1f}s") from None
+        try:
+            await self.wait_for_capacity(estimated_tokens, deadline)
+            llm_metrics.record(
+                "llm_rate_limit_wait_seconds",
+                time.monotonic() - start,
+                unit="s",
+                description="Time LLM calls waited for the client-side rate limiter",
+            )
+            yield
+        finally:
+            if self.semaphore:
+                self.semaphore.release()
+
+    async def wait_for_capacity(self, estimated_tokens: int, deadline: float = float("inf")) -> None:
+        demands: Dict[str, Tuple[float, float]] = {}
+        if self.requests_per_minute > 0:
+            demands[f"{self.name}:requests"] = (self.requests_per_minute, 1)
+        if self.tokens_per_minute > 0:
+            demands[f"{self.name}:tokens"] = (self.tokens_per_minute, estimated_tokens)
+        while True:
+            wait = await self.run_backend(self.backend.acquire, self.name, demands)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitWaitTooLong(f"{self.name} rate limit would hold the call back for {wait:.1f}s")
+            await asyncio.sleep(wait)
+
+    async def record_tokens(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Corrects the token bucket once the provider has reported actual usage."""
+        if self.tokens_per_minute > 0 and actual_tokens:
+            await self.run_backend(
+                self.backend.adjust,
+                f"{self.name}:tokens",
+                self.tokens_per_minute,
+                actual_tokens - estimated_tokens,
+            )
+
+    async def pause(self, retry_after_seconds: Optional[float]) -> float:
+        """Holds back all calls to the provider after a 429. Returns the pause in seconds."""
+        seconds = retry_after_seconds or self.default_retry_after_seconds
+        await self.run_backend(self.backend.pause, self.name, seconds)
+        llm_metrics.increment("llm_rate_limited", description="LLM calls rejected with a rate limit (429)")
+        return seconds
+
+    def should_retry(self, attempt: int, pause_seconds: float, time_left: Optional[float] = None) -> bool:
+        """Whether to retry after a 429 pause: only if the pause fits both the wait cap and time_left."""
+        if time_left is not None and pause_seconds >= time_left:
+            return False
+        return attempt < self.max_retries and pause_seconds <= self.max_retry_wait_seconds
+
+    async def run_backend(self, method, *args):
+        if self.backend.blocking:
+            # a shared store may wait on other processes' transactions; keep the event loop free
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+
+_limiters: Dict[str, ProviderRateLimiter] = {}
+_backend: Optional[RateLimitBackend] = None
+
+
+def provider_setting(provider_name: str, setting: str, default: str) -> str:
+    """Reads LLM_<PROVIDER>_<SETTING>, falling back to LLM_<SETTING>."""
+    return os.environ.get(
+        f"LLM_{provider_name.upper()}_{setting}", os.environ.get(f"LLM_{setting}", default)
+    )
+
+
+def get_rate_limiter(name: str, default_max_concurrent: int = 0) -> ProviderRateLimiter:
+    """
+    Returns the process-wide rate limiter for a provider, creating it from .env settings.
+    default_max_concurrent applies when no MAX_CONCURRENT_REQUESTS setting is given.
+    """
+    backend = get_rate_limit_backend()
+    if name not in _limiters:
+        _limiters[name] = ProviderRateLimiter(
+            name,
+            max_concurrent=int(
+                provider_setting(name, "MAX_CONCURRENT_REQUESTS", str(default_max_concurrent))
+            ),
+            requests_per_minute=float(provider_setting(name, "REQUESTS_PER_MINUTE", "0")),
+            tokens_per_minute=float(provider_setting(name, "TOKENS_PER_MINUTE", "0")),
+            max_retries=int(provider_setting(name, "RATE_LIMIT_RETRIES", "2")),
+            max_retry_wait_seconds=float(provider_setting(name, "RATE_LIMIT_MAX_WAIT_SECONDS", "10")),
+            backend=backend,
+        )
+    return _limiters[name]
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    """
+    Returns the process-wide limiter state: the SQLite file at LLM_RATE_LIMIT_DB_PATH if set,
+    otherwise in-memory buckets. Opening the file blocks, so workers call this at startup
+    (see ToolActivities) rather than on the first LLM call.
+    """
+    global _backend
+    if _backend is None:
+        db_path = os.environ.get("LLM_RATE_LIMIT_DB_PATH")
+        _backend = SQLiteRateLimitBackend(db_path) if db_path else LocalRateLimitBackend()
+    return _backend
+
+
+def reset_rate_limiters() -> None:
+    """Forgets all limiter state (mainly for tests)."""
+    global _backend
+    _limiters.clear()
+    _backend = None
@@ -0,0 +1,79 @@
+"""
+Coalescing of identical in-flight LLM requests ("singleflight").
+
+When a user double-submits, or a retried activity attempt overlaps one that is still
+running, the same prompt can be sent to the same provider and model concurrently.
+SingleFlight runs only the first of those calls; later callers with the same key wait
+for it and each get a copy of its result (or its exception). Nothing is cached: once
+the call finishes, the next request with that key goes upstream again.
+
+The upstream call runs as its own task, so a caller being cancelled (e.g. its activity
+timed out) doesn't cancel it for the others; it is only cancelled when every caller
+waiting on it has gone. Coalescing is per worker process.
+Counter: llm_singleflight_coalesced.
+"""
+import asyncio
+import copy
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from activities import llm_metrics
+
+
+def request_key(*parts: str) -> str:
+    """Hash identifying a request, e.g. from the provider name, model and prompt."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class _Call:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Runs fn(), unless a call with the same key is already in flight, in which case its
+        result is shared. Returns a copy of the result and whether this caller was coalesced
+        onto another call.
+        """
+        call = self._calls.get(key)
+        coalesced = call is not None
+        if call is None:
+            call = _Call(asyncio.create_task(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            llm_metrics.increment(
+                "llm_singleflight_coalesced",
+                description="LLM requests served by an identical request already in flight",
+            )
+
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.waiters == 1:
+                # nobody else is waiting for the upstream call
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+        # every caller gets its own copy, since results are updated in place afterwards
+        return copy.deepcopy(result), coalesced
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
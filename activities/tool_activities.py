@@ -1,17 +1,29 @@
+import asyncio
 import inspect
+import time
+from contextlib import aclosing
+from datetime import datetime, timezone
 from temporalio import activity
-from ollama import chat, ChatResponse
-from openai import OpenAI
-import json
-from typing import Sequence, Optional
+from temporalio.exceptions import ApplicationError
+from typing import List, Optional, Sequence
 from temporalio.common import RawValue
 import os
-from datetime import datetime
-import google.generativeai as genai
-import anthropic
-import deepseek
 from dotenv import load_dotenv
-from models.data_types import EnvLookupOutput, ValidationInput, ValidationResult, ToolPromptInput, EnvLookupInput
+from activities import llm_metrics
+from activities.circuit_breaker import get_circuit_breaker
+from activities.hedging import HedgePolicy
+from activities.json_repair import extract_json_object
+from activities.json_stream import IncrementalJSONFieldParser
+from activities.prevalidation import PromptPrevalidator
+from activities.rate_limiter import RateLimitWaitTooLong, get_rate_limit_backend, get_rate_limiter
+from activities.singleflight import SingleFlight, request_key
+from activities.validation_cache import ValidationCache
+from activities.llm_providers import LLMProvider, get_provider
+from dataclasses import asdict, replace
+from models.data_types import EnvLookupOutput, ValidationInput, ValidationResult, ToolPromptInput, EnvLookupInput, LLM_METADATA_KEY, LLMUsage
+from prompts.agent_prompt_generators import DYNAMIC_CONTEXT_MARKER, VALIDATION_MAX_OUTPUT_TOKENS
+from prompts.context_budget import HISTORY_END, HISTORY_START, count_tokens, fit_context_to_budget, load_encodings
+from prompts.history_serializer import compact_history_enabled, serialize_history
 
 load_dotenv(override=True)
 print(
@@ -27,111 +39,86 @@ if os.environ.get("LLM_PROVIDER") == "ollama":
     )
 
 
+# Minimum spacing between heartbeats carrying partial streamed text
+STREAM_HEARTBEAT_INTERVAL_SECONDS = 0.1
+
+# Text after a streamed JSON object that doesn't count as the model carrying on (closing code fence)
+TRAILING_TEXT_IGNORED = " \t\r\n`"
+
+# Output tokens assumed for a call when reserving tokens-per-minute capacity; corrected from usage afterwards
+ESTIMATED_OUTPUT_TOKENS = 300
+
+
 class ToolActivities:
     def __init__(self):
-        """Initialize LLM clients based on environment configuration."""
+        """Initialize the LLM provider adapter based on environment configuration.
+        Only the selected provider's SDK is imported (see activities/llm_providers)."""
         self.llm_provider = os.environ.get("LLM_PROVIDER", "openai").lower()
         print(f"Initializing ToolActivities with LLM provider: {self.llm_provider}")
+        self.provider: LLMProvider = get_provider(self.llm_provider)
+
+        # Ordered failover chain: LLM_PROVIDER first, then LLM_PROVIDER_FALLBACKS (comma separated)
+        self.providers: List[LLMProvider] = [self.provider]
+        for name in os.environ.get("LLM_PROVIDER_FALLBACKS", "").split(","):
+            name = name.strip().lower()
+            if name and name not in [p.name for p in self.providers]:
+                print(f"Adding fallback LLM provider: {name}")
+                self.providers.append(get_provider(name))
+
+        # With fallbacks configured, cap each provider call so there's time left to switch
+        # within the activity's start-to-close timeout.
+        self.llm_call_timeout: Optional[float] = None
+        if len(self.providers) > 1:
+            self.llm_call_timeout = float(os.environ.get("LLM_CALL_TIMEOUT_SECONDS", "15"))
+
+        # Optional hedging: race a second request when the first is slower than usual
+        self.hedge_policy: Optional[HedgePolicy] = HedgePolicy.from_env()
+        self.hedge_provider: Optional[LLMProvider] = None
+        if self.hedge_policy:
+            hedge_provider_name = os.environ.get("LLM_HEDGE_PROVIDER", "").strip().lower()
+            hedge_model = os.environ.get("LLM_HEDGE_MODEL") or None
+            if hedge_provider_name or hedge_model:
+                self.hedge_provider = get_provider(hedge_provider_name or self.llm_provider, hedge_model)
+            print(f"LLM request hedging enabled at p{self.hedge_policy.percentile:g} latency")
+
+        # Load tokenizer encodings now (if tiktoken is installed) so activities never download them on the event loop
+        load_encodings(
+            [p.model for p in self.providers] + ([self.hedge_provider.model] if self.hedge_provider else [])
+        )
 
-        # Initialize client variables (all set to None initially)
-        self.openai_client: Optional[OpenAI] = None
-        self.grok_client: Optional[OpenAI] = None
-        self.anthropic_client: Optional[anthropic.Anthropic] = None
-        self.genai_configured: bool = False
-        self.deepseek_client: Optional[deepseek.DeepSeekAPI] = None
-        self.ollama_model_name: Optional[str] = None
-        self.ollama_initialized: bool = False
-
-        # Only initialize the client specified by LLM_PROVIDER
-        if self.llm_provider == "openai":
-            if os.environ.get("OPENAI_API_KEY"):
-                self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-                print("Initialized OpenAI client")
-            else:
-                print("Warning: OPENAI_API_KEY not set but LLM_PROVIDER is 'openai'")
-        
-        elif self.llm_provider == "grok":
-            if os.environ.get("GROK_API_KEY"):
-                self.grok_client = OpenAI(api_key=os.environ.get("GROK_API_KEY"), base_url="https://api.x.ai/v1")
-                print("Initialized grok client")
-            else:
-                print("Warning: GROK_API_KEY not set but LLM_PROVIDER is 'grok'")
-
-        elif self.llm_provider == "anthropic":
-            if os.environ.get("ANTHROPIC_API_KEY"):
-                self.anthropic_client = anthropic.Anthropic(
-                    api_key=os.environ.get("ANTHROPIC_API_KEY")
-                )
-                print("Initialized Anthropic client")
-            else:
-                print(
-                    "Warning: ANTHROPIC_API_KEY not set but LLM_PROVIDER is 'anthropic'"
-                )
+        # Open the shared rate limit state (a SQLite file if configured) now rather than inside an activity
+        get_rate_limit_backend()
 
-        elif self.llm_provider == "google":
-            api_key = os.environ.get("GOOGLE_API_KEY")
-            if api_key:
-                genai.configure(api_key=api_key)
-                self.genai_configured = True
-                print("Configured Google Generative AI")
-            else:
-                print("Warning: GOOGLE_API_KEY not set but LLM_PROVIDER is 'google'")
-
-        elif self.llm_provider == "deepseek":
-            if os.environ.get("DEEPSEEK_API_KEY"):
-                self.deepseek_client = deepseek.DeepSeekAPI(
-                    api_key=os.environ.get("DEEPSEEK_API_KEY")
-                )
-                print("Initialized DeepSeek client")
-            else:
-                print(
-                    "Warning: DEEPSEEK_API_KEY not set but LLM_PROVIDER is 'deepseek'"
-                )
+        # Token budget for context instructions; compacts old history etc. when exceeded (0 disables)
+        self.context_token_budget: Optional[int] = (
+            int(os.environ["LLM_CONTEXT_TOKEN_BUDGET"])
+            if os.environ.get("LLM_CONTEXT_TOKEN_BUDGET")
+            else None
+        )
 
-        # For Ollama, we store the model name but actual initialization happens in warm_up_ollama
-        elif self.llm_provider == "ollama":
-            self.ollama_model_name = os.environ.get("OLLAMA_MODEL_NAME", "qwen2.5:14b")
-            print(
-                f"Using Ollama model: {self.ollama_model_name} (will be loaded on worker startup)"
-            )
-        else:
-            print(
-                f"Warning: Unknown LLM_PROVIDER '{self.llm_provider}', defaulting to OpenAI"
-            )
+        # Stream completions so partial responses can be shown while the LLM is still generating
+        self.streaming_enabled: bool = os.environ.get("LLM_STREAMING_ENABLED", "true").lower() != "false"
 
-    def warm_up_ollama(self):
-        """Pre-load the Ollama model to avoid cold start latency on first request"""
-        if self.llm_provider != "ollama" or self.ollama_initialized:
-            return False  # No need to warm up if not using Ollama or already warmed up
+        # Worker-level cache of validation results for repeated prompts
+        self.validation_cache: Optional[ValidationCache] = ValidationCache.from_env()
 
-        try:
-            print(
-                f"Pre-loading Ollama model '{self.ollama_model_name}' - this may take 30+ seconds..."
-            )
-            start_time = datetime.now()
-
-            # Make a simple request to load the model into memory
-            chat(
-                model=self.ollama_model_name,
-                messages=[
-                    {"role": "system", "content": "You are an AI assistant"},
-                    {
-                        "role": "user",
-                        "content": "Hello! This is a warm-up message to load the model.",
-                    },
-                ],
-            )
+        # Local rules that accept obviously valid prompts without an LLM call
+        self.prevalidator: Optional[PromptPrevalidator] = PromptPrevalidator.from_env()
 
-            elapsed_time = (datetime.now() - start_time).total_seconds()
-            print(f"✅ Ollama model loaded successfully in {elapsed_time:.2f} seconds")
-            self.ollama_initialized = True
-            return True
-        except Exception as e:
-            print(f"❌ Error pre-loading Ollama model: {str(e)}")
-            print(
-                "The worker will continue, but the first actual request may experience a delay."
-            )
-            return False
+        # Identical requests in flight at the same time share one upstream call
+        self.singleflight: Optional[SingleFlight] = (
+            SingleFlight()
+            if os.environ.get("LLM_SINGLEFLIGHT_ENABLED", "true").lower() != "false"
+            else None
+        )
+
+    async def warm_up_llm(self) -> bool:
+        """Pre-load the model if the provider supports it (e.g. Ollama) to avoid cold start latency"""
+        return await self.provider.warm_up()
+
+    async def keep_llm_warm(self) -> None:
+        """Keeps the model loaded between quiet periods if the provider supports it; runs until cancelled"""
+        await self.provider.keep_warm()
 
     @activity.defn
     async def agent_validatePrompt(
@@ -140,7 +127,35 @@ class ToolActivities:
         """
         Validates the prompt in the context of the conversation history and agent goal.
         Returns a ValidationResult indicating if the prompt makes sense given the context.
+        Clearly valid prompts are accepted locally by the prevalidator, and results are served from
+        the validation cache when the same prompt was seen in the same context.
         """
+        if self.prevalidator:
+            accept_reason = self.prevalidator.accept_reason(
+                validation_input.prompt,
+                validation_input.conversation_history,
+                validation_input.agent_goal,
+            )
+            if accept_reason:
+                activity.logger.info(
+                    f"Prompt accepted without LLM validation ({accept_reason}): {validation_input.prompt}"
+                )
+                return ValidationResult(validationResult=True, validationFailedReason={})
+
+        cache_key = None
+        if self.validation_cache:
+            cache_key = self.validation_cache.make_key(
+                validation_input.agent_goal.id,
+                validation_input.prompt,
+                validation_input.conversation_history,
+            )
+            cached = await self.validation_cache.get(cache_key)
+            if cached is not None:
+                activity.logger.info(
+                    f"Validation cache hit for prompt: {validation_input.prompt} ({self.validation_cache.stats()})"
+                )
+                return ValidationResult(**cached)
+
         # Create simple context string describing tools and goals
         tools_description = []
         for tool in validation_input.agent_goal.tools:
@@ -152,16 +167,24 @@ class ToolActivities:
             tools_description.append(tool_str)
         tools_str = "\n".join(tools_description)
 
-        # Convert conversation history to string
-        history_str = json.dumps(validation_input.conversation_history, indent=2)
+        # Convert conversation history to string, only encoding the messages added since the last turn
+        info = activity.info()
+        history_str = serialize_history(
+            validation_input.conversation_history,
+            compact=compact_history_enabled(),
+            cache_key=("validation", info.workflow_id, info.workflow_run_id),
+        )
 
         # Create context instructions
         context_instructions = f"""The agent goal and tools are as follows:
             Description: {validation_input.agent_goal.description}
             Available Tools:
             {tools_str}
+            {DYNAMIC_CONTEXT_MARKER}
             The conversation history to date is:
-            {history_str}"""
+            {HISTORY_START}
+            {history_str}
+            {HISTORY_END}"""
 
         # Create validation prompt
         validation_prompt = f"""The user's prompt is: "{validation_input.prompt}"
@@ -184,294 +207,295 @@ class ToolActivities:
 
         # Call the LLM with the validation prompt
         prompt_input = ToolPromptInput(
-            prompt=validation_prompt, context_instructions=context_instructions
+            prompt=validation_prompt,
+            context_instructions=context_instructions,
+            max_output_tokens=VALIDATION_MAX_OUTPUT_TOKENS,
         )
 
-        result = self.agent_toolPlanner(prompt_input)
+        result = await self.prompt_llm(prompt_input)
 
-        return ValidationResult(
+        validation_result = ValidationResult(
             validationResult=result.get("validationResult", False),
             validationFailedReason=result.get("validationFailedReason", {}),
+            llm_metadata=result.get(LLM_METADATA_KEY),
         )
+        if cache_key:
+            await self.validation_cache.set(
+                cache_key,
+                {
+                    "validationResult": validation_result.validationResult,
+                    "validationFailedReason": validation_result.validationFailedReason,
+                },
+            )
+        return validation_result
 
     @activity.defn
-    def agent_toolPlanner(self, input: ToolPromptInput) -> dict:
-        if self.llm_provider == "ollama":
-            return self.prompt_llm_ollama(input)
-        elif self.llm_provider == "google":
-            return self.prompt_llm_google(input)
-        elif self.llm_provider == "anthropic":
-            return self.prompt_llm_anthropic(input)
-        elif self.llm_provider == "deepseek":
-            return self.prompt_llm_deepseek(input)
-        elif self.llm_provider == "grok":
-            return self.prompt_llm_grok(input)
-        else:
-            return self.prompt_llm_openai(input)
+    async def agent_toolPlanner(self, input: ToolPromptInput) -> dict:
+        return await self.prompt_llm(input)
 
-    def parse_json_response(self, response_content: str) -> dict:
+    @activity.defn
+    async def agent_summarizeHistory(self, input: ToolPromptInput) -> dict:
         """
-        Parses the JSON response content and returns it as a dictionary.
+        Updates the rolling summary of older conversation history in the background. A separate
+        activity type from the planner, so the API doesn't take it for the agent's reply being generated.
         """
-        try:
-            data = json.loads(response_content)
-            return data
-        except json.JSONDecodeError as e:
-            print(f"Invalid JSON: {e}")
-            raise
-
-    def prompt_llm_openai(self, input: ToolPromptInput) -> dict:
-        if not self.openai_client:
-            api_key = os.environ.get("OPENAI_API_KEY")
-            if not api_key:
-                raise ValueError(
-                    "OPENAI_API_KEY is not set in the environment variables but LLM_PROVIDER is 'openai'"
-                )
-            self.openai_client = OpenAI(api_key=api_key)
-            print("Initialized OpenAI client on demand")
-
-        messages = [
-            {
-                "role": "system",
-                "content": input.context_instructions
-                + ". The current date is "
-                + datetime.now().strftime("%B %d, %Y"),
-            },
-            {
-                "role": "user",
-                "content": input.prompt,
-            },
-        ]
-
-        chat_completion = self.openai_client.chat.completions.create(
-            model="gpt-4o", messages=messages  # was gpt-4-0613
-        )
+        return await self.prompt_llm(input)
 
-        response_content = chat_completion.choices[0].message.content
-        activity.logger.info(f"ChatGPT response: {response_content}")
-
-        # Use the new sanitize function
-        response_content = self.sanitize_json_response(response_content)
+    async def prompt_llm(self, input: ToolPromptInput) -> dict:
+        """
+        Sends the prompt to the first healthy provider in the failover chain and returns the parsed JSON.
+        Errors, invalid JSON and slow calls feed each provider's circuit breaker; providers with an
+        open circuit are skipped. The result carries LLM_METADATA_KEY with the provider that answered
+        and any providers that were failed over, so the workflow can report the switch.
+        """
+        failed_over_from: List[str] = []
+        last_error: Optional[Exception] = None
 
-        return self.parse_json_response(response_content)
+        for provider in self.providers:
+            breaker = get_circuit_breaker(provider.name)
+            if not breaker.allow_request():
+                activity.logger.warning(f"Skipping LLM provider '{provider.name}': circuit open")
+                failed_over_from.append(provider.name)
+                continue
 
-    def prompt_llm_grok(self, input: ToolPromptInput) -> dict:
-        if not self.grok_client:
-            api_key = os.environ.get("GROK_API_KEY")
-            if not api_key:
-                raise ValueError(
-                    "GROK_API_KEY is not set in the environment variables but LLM_PROVIDER is 'grok'"
+            try:
+                result, answered_by = await self.prompt_provider_coalesced(provider, input)
+            except RateLimitWaitTooLong as e:
+                # held back by our own rate limiter: try the next provider without blaming this one
+                breaker.record_cancelled()
+                activity.logger.warning(f"LLM provider '{provider.name}' skipped: {str(e)}")
+                failed_over_from.append(provider.name)
+                last_error = e
+                continue
+            except Exception as e:
+                breaker.record_failure()
+                activity.logger.warning(f"LLM provider '{provider.name}' failed: {str(e)}")
+                failed_over_from.append(provider.name)
+                last_error = e
+                continue
+            except BaseException:
+                # cancelled (e.g. activity timeout or a losing hedge); don't leave a half-open trial pending
+                breaker.record_cancelled()
+                raise
+            # latency of the provider call itself, not counting time queued in the rate limiter
+            breaker.record_success(result[LLM_METADATA_KEY]["latency_seconds"])
+
+            if failed_over_from:
+                activity.logger.warning(
+                    f"Failed over from {failed_over_from} to LLM provider '{provider.name}'"
                 )
-            self.grok_client = OpenAI(api_key=api_key, base_url="https://api.x.ai/v1")
-            print("Initialized grok client on demand")
-
-        messages = [
-            {
-                "role": "system",
-                "content": input.context_instructions
-                + ". The current date is "
-                + datetime.now().strftime("%B %d, %Y"),
-            },
-            {
-                "role": "user",
-                "content": input.prompt,
-            },
-        ]
-
-        chat_completion = self.grok_client.chat.completions.create(
-            model="grok-2-1212", messages=messages  
-        )
+            result[LLM_METADATA_KEY].update(
+                {"provider": answered_by, "failed_over_from": failed_over_from}
+            )
+            return result
 
-        response_content = chat_completion.choices[0].message.content
-        activity.logger.info(f"Grok response: {response_content}")
+        # Nothing answered: fail the attempt and let Temporal retry the activity
+        if last_error is not None and len(self.providers) == 1:
+            raise last_error
+        raise ApplicationError(
+            f"All LLM providers failed or are unavailable: {failed_over_from}"
+        ) from last_error
 
-        # Use the new sanitize function
-        response_content = self.sanitize_json_response(response_content)
+    async def prompt_provider_coalesced(self, provider: LLMProvider, input: ToolPromptInput) -> tuple[dict, str]:
+        """
+        Calls the provider (hedged if enabled), sharing the call with any identical request to the
+        same provider and model that is already in flight. A coalesced result reports no token usage
+        or cost of its own, since it didn't cost anything upstream.
+        """
+        if not self.singleflight:
+            return await self.prompt_provider_hedged(provider, input)
 
-        return self.parse_json_response(response_content)
-    def prompt_llm_ollama(self, input: ToolPromptInput) -> dict:
-        # If not yet initialized, try to do so now (this is a backup if warm_up_ollama wasn't called or failed)
-        if not self.ollama_initialized:
-            print(
-                "Ollama model not pre-loaded. Loading now (this may take 30+ seconds)..."
+        key = request_key(provider.name, provider.model, input.context_instructions, input.prompt)
+        (result, answered_by), coalesced = await self.singleflight.do(
+            key, lambda: self.prompt_provider_hedged(provider, input)
+        )
+        if coalesced:
+            activity.logger.info(f"Coalesced identical in-flight request to {provider.display_name}")
+            result[LLM_METADATA_KEY].update(
+                {"usage": asdict(LLMUsage()), "cost_usd": 0.0, "coalesced": True}
             )
-            try:
-                self.warm_up_ollama()
-            except Exception:
-                # We already logged the error in warm_up_ollama, continue with the actual request
-                pass
+        return result, answered_by
 
-        model_name = self.ollama_model_name or os.environ.get(
-            "OLLAMA_MODEL_NAME", "qwen2.5:14b"
+    async def prompt_provider_hedged(self, provider: LLMProvider, input: ToolPromptInput) -> tuple[dict, str]:
+        """
+        Calls the provider, hedging with a second request if hedging is enabled and the first
+        is slow. Returns the parsed result and the name of the provider that answered.
+        """
+        if not self.hedge_policy:
+            return await self.prompt_provider(provider, input), provider.name
+
+        hedge_provider = self.hedge_provider or provider
+        # both requests stream into this activity; only one of them shows its partial response
+        heartbeat = PartialResponseHeartbeat()
+        return await self.hedge_policy.run(
+            provider.name,
+            lambda: self.prompt_provider(provider, input, heartbeat),
+            hedge_provider.name,
+            lambda: self.prompt_provider(hedge_provider, input, heartbeat),
         )
-        messages = [
-            {
-                "role": "system",
-                "content": input.context_instructions
-                + ". The current date is "
-                + get_current_date_human_readable(),
-            },
-            {
-                "role": "user",
-                "content": input.prompt,
-            },
-        ]
-
-        try:
-            response: ChatResponse = chat(model=model_name, messages=messages)
-            print(f"Chat response: {response.message.content}")
-
-            # Use the new sanitize function
-            response_content = self.sanitize_json_response(response.message.content)
-            return self.parse_json_response(response_content)
-        except (json.JSONDecodeError, ValueError) as e:
-            # Re-raise JSON-related exceptions to let Temporal retry the activity
-            print(f"JSON parsing error with Ollama response: {str(e)}")
-            raise
-        except Exception as e:
-            # Log and raise other exceptions that may need retrying
-            print(f"Error in Ollama chat: {str(e)}")
-            raise
 
-    def prompt_llm_google(self, input: ToolPromptInput) -> dict:
-        if not self.genai_configured:
-            api_key = os.environ.get("GOOGLE_API_KEY")
-            if not api_key:
-                raise ValueError(
-                    "GOOGLE_API_KEY is not set in the environment variables but LLM_PROVIDER is 'google'"
-                )
-            genai.configure(api_key=api_key)
-            self.genai_configured = True
-            print("Configured Google Generative AI on demand")
-
-        model = genai.GenerativeModel(
-            "models/gemini-1.5-flash",
-            system_instruction=input.context_instructions
-            + ". The current date is "
-            + datetime.now().strftime("%B %d, %Y"),
+    async def prompt_provider(
+        self, provider: LLMProvider, input: ToolPromptInput, heartbeat: Optional["PartialResponseHeartbeat"] = None
+    ) -> dict:
+        """
+        Calls a single provider and parses its reply. The context is first fit to the provider's
+        token budget. Token usage and context size are attached under LLM_METADATA_KEY.
+        """
+        budget = (
+            self.context_token_budget
+            if self.context_token_budget is not None
+            else provider.context_token_budget
         )
-        response = model.generate_content(input.prompt)
-        response_content = response.text
-        print(f"Google Gemini response: {response_content}")
-
-        # Use the new sanitize function
-        response_content = self.sanitize_json_response(response_content)
-
-        return self.parse_json_response(response_content)
-
-    def prompt_llm_anthropic(self, input: ToolPromptInput) -> dict:
-        if not self.anthropic_client:
-            api_key = os.environ.get("ANTHROPIC_API_KEY")
-            if not api_key:
-                raise ValueError(
-                    "ANTHROPIC_API_KEY is not set in the environment variables but LLM_PROVIDER is 'anthropic'"
-                )
-            self.anthropic_client = anthropic.Anthropic(api_key=api_key)
-            print("Initialized Anthropic client on demand")
-
-        response = self.anthropic_client.messages.create(
-            model="claude-3-5-sonnet-20241022",  
-            #model="claude-3-7-sonnet-20250219",  # doesn't do as well
-            max_tokens=1024,
-            system=input.context_instructions
-            + ". The current date is "
-            + get_current_date_human_readable(),
-            messages=[
-                {
-                    "role": "user",
-                    "content": input.prompt,
-                }
-            ],
+        context_instructions, budget_report = fit_context_to_budget(
+            input.context_instructions, budget, provider.model
         )
+        llm_metrics.record("llm_context_tokens", budget_report.tokens_after, unit="tokens")
+        if budget_report.compactions:
+            activity.logger.info(
+                f"Context for {provider.display_name} compacted from {budget_report.tokens_before} to "
+                f"{budget_report.tokens_after} tokens (budget {budget}): {budget_report.compactions}"
+            )
+            llm_metrics.increment("llm_context_compactions")
+            input = replace(input, context_instructions=context_instructions)
 
-        response_content = response.content[0].text
-        print(f"Anthropic response: {response_content}")
-
-        # Use the new sanitize function
-        response_content = self.sanitize_json_response(response_content)
-
-        return self.parse_json_response(response_content)
-
-    def prompt_llm_deepseek(self, input: ToolPromptInput) -> dict:
-        if not self.deepseek_client:
-            api_key = os.environ.get("DEEPSEEK_API_KEY")
-            if not api_key:
-                raise ValueError(
-                    "DEEPSEEK_API_KEY is not set in the environment variables but LLM_PROVIDER is 'deepseek'"
+        usage = LLMUsage()
+        response_content, latency_seconds = await self.call_provider_rate_limited(
+            provider, input, usage, budget_report.tokens_after + ESTIMATED_OUTPUT_TOKENS, heartbeat
+        )
+        activity.logger.info(f"{provider.display_name} response: {response_content}")
+        cost_usd = provider.estimate_cost(usage)
+        self.record_usage(provider, usage, cost_usd)
+
+        result = extract_json_object(response_content)
+        result[LLM_METADATA_KEY] = {
+            "model": provider.model,
+            "usage": asdict(usage),
+            "cost_usd": cost_usd,
+            "latency_seconds": round(latency_seconds, 3),
+            "context_tokens": budget_report.as_dict(),
+        }
+        return result
+
+    async def call_provider_rate_limited(
+        self,
+        provider: LLMProvider,
+        input: ToolPromptInput,
+        usage: LLMUsage,
+        estimated_tokens: int,
+        heartbeat: Optional["PartialResponseHeartbeat"] = None,
+    ) -> tuple[str, float]:
+        """
+        Calls the provider through its rate limiter, which queues the call until there is capacity,
+        but no longer than the activity has left. A 429 pauses the limiter for the Retry-After period
+        and the call is retried locally if the pause fits in the time left.
+        Returns the reply and the latency of the call, from when the limiter let it through.
+        """
+        limiter = get_rate_limiter(provider.name, provider.max_concurrent_requests)
+        attempt = 0
+        while True:
+            try:
+                async with limiter.limit(estimated_tokens, max_wait=activity_time_left()):
+                    start_time = time.monotonic()
+                    call = (
+                        self.stream_provider(provider, input, usage, heartbeat)
+                        if self.streaming_enabled
+                        else provider.complete(input, usage)
+                    )
+                    response_content = await asyncio.wait_for(call, timeout=self.llm_call_timeout)
+                    latency_seconds = time.monotonic() - start_time
+            except Exception as e:
+                retry_after = provider.rate_limit_retry_after(e)
+                if retry_after is None:
+                    raise
+                pause_seconds = await limiter.pause(retry_after)
+                if not limiter.should_retry(attempt, pause_seconds, activity_time_left()):
+                    raise
+                attempt += 1
+                activity.logger.warning(
+                    f"{provider.display_name} rate limited; retrying in {pause_seconds:.1f}s (attempt {attempt})"
                 )
-            self.deepseek_client = deepseek.DeepSeekAPI(api_key=api_key)
-            print("Initialized DeepSeek client on demand")
-
-        messages = [
-            {
-                "role": "system",
-                "content": input.context_instructions
-                + ". The current date is "
-                + datetime.now().strftime("%B %d, %Y"),
-            },
-            {
-                "role": "user",
-                "content": input.prompt,
-            },
-        ]
-
-        response = self.deepseek_client.chat_completion(prompt=messages)
-        response_content = response
-        print(f"DeepSeek response: {response_content}")
-
-        # Use the new sanitize function
-        response_content = self.sanitize_json_response(response_content)
-
-        return self.parse_json_response(response_content)
-
-    def sanitize_json_response(self, response_content: str) -> str:
+                continue
+            await limiter.record_tokens(estimated_tokens, usage.input_tokens + usage.output_tokens)
+            return response_content, latency_seconds
+
+    def record_usage(self, provider: LLMProvider, usage: LLMUsage, cost_usd: Optional[float] = None) -> None:
+        """Logs and records token usage, including how much of the prompt came from the provider's cache,
+        and the estimated cost (None if the model's price isn't known)."""
+        activity.logger.info(
+            f"{provider.display_name} usage: {usage.input_tokens} input tokens "
+            f"({usage.cached_input_tokens} cached, {usage.cache_write_tokens} written to cache), "
+            f"{usage.output_tokens} output tokens"
+            + (f", estimated cost ${cost_usd:.6f}" if cost_usd is not None else "")
+        )
+        llm_metrics.record("llm_input_tokens", usage.input_tokens, unit="tokens")
+        llm_metrics.record("llm_cached_input_tokens", usage.cached_input_tokens, unit="tokens")
+        llm_metrics.record("llm_output_tokens", usage.output_tokens, unit="tokens")
+        if cost_usd is not None:
+            llm_metrics.record("llm_cost_usd", cost_usd, unit="USD")
+
+    async def stream_provider(
+        self,
+        provider: LLMProvider,
+        input: ToolPromptInput,
+        usage: LLMUsage,
+        heartbeat: Optional["PartialResponseHeartbeat"] = None,
+    ) -> str:
         """
-        Extracts the JSON block from the response content as a string.
-        Supports:
-        - JSON surrounded by ```json and ```
-        - Raw JSON input
-        - JSON preceded or followed by extra text
-        Rejects invalid input that doesn't contain JSON.
+        Streams the provider's reply and returns the full text. While streaming, the decoded
+        "response" field is sent as activity heartbeat details ({"partial_response": ...}) so the
+        API can show the agent's reply before the completion finishes (see /stream-response).
+        Hedged requests share one heartbeat, which only one of the streams sends to.
+        Once the JSON object is complete, the stream is closed as soon as the model goes on
+        with anything but whitespace or a closing code fence, so trailing prose isn't waited for.
         """
+        parser = IncrementalJSONFieldParser("response")
+        heartbeat = heartbeat or PartialResponseHeartbeat()
+        stream_id = object()
+        chunks: List[str] = []
+        start_time = time.monotonic()
+        stopped_early = False
+
         try:
-            start_marker = "```json"
-            end_marker = "```"
-
-            json_str = None
-
-            # Case 1: JSON surrounded by markers
-            if start_marker in response_content and end_marker in response_content:
-                json_start = response_content.index(start_marker) + len(start_marker)
-                json_end = response_content.index(end_marker, json_start)
-                json_str = response_content[json_start:json_end].strip()
-
-            # Case 2: Text with valid JSON
-            else:
-                # Try to locate the JSON block by scanning for the first `{` and last `}`
-                json_start = response_content.find("{")
-                json_end = response_content.rfind("}")
-
-                if json_start != -1 and json_end != -1 and json_start < json_end:
-                    json_str = response_content[json_start : json_end + 1].strip()
-
-            # Validate and ensure the extracted JSON is valid
-            if json_str:
-                json.loads(json_str)  # This will raise an error if the JSON is invalid
-                return json_str
-
-            # If no valid JSON found, raise an error
-            raise ValueError("Response does not contain valid JSON.")
-
-        except json.JSONDecodeError:
-            # Invalid JSON
-            print(f"Invalid JSON detected in response: {response_content}")
-            raise ValueError("Response does not contain valid JSON.")
-        except Exception as e:
-            # Other errors
-            print(f"Error processing response: {str(e)}")
-            print(f"Full response: {response_content}")
+            async with aclosing(provider.stream(input, usage)) as stream:
+                async for chunk in stream:
+                    if not chunks:
+                        llm_metrics.record(
+                            "llm_time_to_first_token_seconds", time.monotonic() - start_time, unit="s"
+                        )
+                    chunks.append(chunk)
+                    if parser.feed(chunk):
+                        heartbeat.send(stream_id, parser.value)
+                    if parser.object_complete and parser.trailing_text.strip(TRAILING_TEXT_IGNORED):
+                        stopped_early = True
+                        break
+        except BaseException:
+            # let another stream of a hedged request show its reply instead
+            heartbeat.release(stream_id)
             raise
 
+        if parser.value:
+            heartbeat.send(stream_id, parser.value, final=True)
+        response_content = "".join(chunks)
+        if stopped_early:
+            llm_metrics.increment(
+                "llm_stream_early_stops", description="Streamed replies closed after the JSON object"
+            )
+            self.estimate_unreported_usage(provider, input, response_content, usage)
+        return response_content
+
+    @staticmethod
+    def estimate_unreported_usage(
+        provider: LLMProvider, input: ToolPromptInput, response_content: str, usage: LLMUsage
+    ) -> None:
+        """Fills in token counts the provider didn't get to report because the stream was closed early."""
+        output_tokens = count_tokens(response_content, provider.model)
+        if usage.output_tokens < output_tokens:
+            usage.output_tokens = output_tokens
+            usage.estimated = True
+        if not usage.input_tokens:
+            usage.input_tokens = count_tokens(input.context_instructions + input.prompt, provider.model)
+            usage.estimated = True
+
     # get env vars for workflow
     @activity.defn
     async def get_wf_env_vars(self, input: EnvLookupInput) -> EnvLookupOutput:
@@ -496,18 +520,70 @@ class ToolActivities:
         else:
             output.multi_goal_mode = True
 
+        # validate the prompt and plan the next step in a single LLM call
+        output.validate_and_plan = os.getenv("VALIDATE_AND_PLAN", "false").lower() == "true"
+
+        # plan the next step while the prompt is validated, discarding the plan if validation fails
+        output.speculative_planning = os.getenv("SPECULATIVE_PLANNING", "false").lower() == "true"
+
+        # serialize the conversation history in prompts without indentation
+        output.compact_prompt_history = compact_history_enabled()
+
+        # keep only the last N turns of history verbatim in prompts, with a rolling summary of the rest
+        output.rolling_summary_turns = int(os.getenv("ROLLING_SUMMARY_TURNS", "0"))
+
+        # leave out turns of earlier goals that aren't relevant to the current goal and prompt
+        output.history_retrieval_top_k = int(os.getenv("HISTORY_RETRIEVAL_TOP_K", "0"))
+        output.history_retrieval_recent_turns = int(os.getenv("HISTORY_RETRIEVAL_RECENT_TURNS", "4"))
+
+        # compact tool results before they enter the history (the full results stay queryable)
+        output.tool_result_compaction = os.getenv("TOOL_RESULT_COMPACTION", "true").lower() != "false"
+
+        # write LLM usage totals to search attributes when the session ends (they must be registered)
+        output.llm_usage_search_attributes = (
+            os.getenv("LLM_USAGE_SEARCH_ATTRIBUTES", "false").lower() == "true"
+        )
+
         return output
 
 
-def get_current_date_human_readable():
+class PartialResponseHeartbeat:
     """
-    Returns the current date in a human-readable format.
-
-    Example: Wednesday, January 1, 2025
+    Sends a streamed reply's partial "response" field as activity heartbeat details, at most
+    every STREAM_HEARTBEAT_INTERVAL_SECONDS. When requests are hedged, several streams run in
+    one activity; only the first to produce text sends, unless it fails and another takes over.
     """
-    from datetime import datetime
 
-    return datetime.now().strftime("%A, %B %d, %Y")
+    def __init__(self) -> None:
+        self.owner: Optional[object] = None
+        self.last_sent = 0.0
+
+    def send(self, stream_id: object, partial_response: str, final: bool = False) -> None:
+        if not activity.in_activity():
+            return
+        if self.owner is None:
+            self.owner = stream_id
+        if self.owner is not stream_id:
+            return
+        now = time.monotonic()
+        if final or now - self.last_sent >= STREAM_HEARTBEAT_INTERVAL_SECONDS:
+            activity.heartbeat({"partial_response": partial_response})
+            self.last_sent = now
+
+    def release(self, stream_id: object) -> None:
+        if self.owner is stream_id:
+            self.owner = None
+
+
+def activity_time_left() -> Optional[float]:
+    """Seconds left before the current activity attempt's start-to-close timeout (None outside an activity or without one)."""
+    if not activity.in_activity():
+        return None
+    info = activity.info()
+    if not info.start_to_close_timeout:
+        return None
+    elapsed = (datetime.now(timezone.utc) - info.started_time).total_seconds()
+    return max(0.0, info.start_to_close_timeout.total_seconds() - elapsed)
 
 
 @activity.defn(dynamic=True)
@@ -523,7 +599,8 @@ async def dynamic_tool_activity(args: Sequence[RawValue]) -> dict:
     if inspect.iscoroutinefunction(handler):
         result = await handler(tool_args)
     else:
-        result = handler(tool_args)
+        # sync tools may block (file I/O, HTTP clients, SDKs); keep them off the event loop the LLM activities share
+        result = await asyncio.to_thread(handler, tool_args)
 
     # Optionally log or augment the result
     activity.logger.info(f"Tool '{tool_name}' result: {result}")
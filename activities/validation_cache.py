@@ -0,0 +1,167 @@
+"""
+Worker-level cache for prompt validation results.
+
+Entries are keyed on a hash of (goal id, normalized prompt, trailing history window),
+so a repeated "yes" or "list agents" in the same conversational context is answered
+without an LLM call. The in-memory store is an LRU bounded by
+VALIDATION_CACHE_MAX_ENTRIES with a VALIDATION_CACHE_TTL_SECONDS expiry. If
+VALIDATION_CACHE_PATH is set, entries are also written to a SQLite file so they
+survive worker restarts and can be shared by workers on the same host. The SQLite reads and
+writes run in a thread so they don't block the activity event loop, and the file is pruned to
+max_entries every PRUNE_INTERVAL writes rather than on each one.
+
+Counters: validation_cache_hits, validation_cache_misses, validation_cache_evictions.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from activities import llm_metrics
+from models.data_types import ConversationHistory
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation ("Yes!" == "yes")."""
+    return re.sub(r"\s+", " ", prompt.strip().lower()).rstrip(" .!?")
+
+
+class ValidationCache:
+    PRUNE_INTERVAL = 100
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600,
+        history_window: int = 2,
+        db_path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.history_window = history_window
+        # key -> (stored at, value)
+        self.entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.db: Optional[sqlite3.Connection] = None
+        self.db_lock = threading.Lock()
+        self.writes_since_prune = 0
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS validation_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+
+    @classmethod
+    def from_env(cls) -> Optional["ValidationCache"]:
+        """Returns the cache configured in .env, or None if VALIDATION_CACHE_ENABLED is false."""
+        if os.environ.get("VALIDATION_CACHE_ENABLED", "true").lower() == "false":
+            return None
+        return cls(
+            max_entries=int(os.environ.get("VALIDATION_CACHE_MAX_ENTRIES", "1000")),
+            ttl_seconds=float(os.environ.get("VALIDATION_CACHE_TTL_SECONDS", "3600")),
+            history_window=int(os.environ.get("VALIDATION_CACHE_HISTORY_WINDOW", "2")),
+            db_path=os.environ.get("VALIDATION_CACHE_PATH") or None,
+        )
+
+    def make_key(
+        self, goal_id: str, prompt: str, conversation_history: ConversationHistory
+    ) -> str:
+        """Hashes the goal, the normalized prompt and the last history_window messages."""
+        messages = conversation_history.get("messages", [])
+        # the workflow records the raw prompt before validating it; it's already in the key, normalized
+        if messages and messages[-1].get("actor") == "user" and messages[-1].get("response") == prompt:
+            messages = messages[:-1]
+        window = messages[-self.history_window :] if self.history_window > 0 else []
+        material = json.dumps(
+            [goal_id, normalize_prompt(prompt), window], sort_keys=True, default=str
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is None and self.db is not None:
+            entry = await asyncio.to_thread(self.db_get, key)
+            if entry is not None:
+                self.store_in_memory(key, entry)
+
+        if entry is not None and now - entry[0] > self.ttl_seconds:
+            await self.delete(key)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            llm_metrics.increment("validation_cache_misses")
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        llm_metrics.increment("validation_cache_hits")
+        return entry[1]
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        entry = (time.time(), value)
+        self.store_in_memory(key, entry)
+        if self.db is not None:
+            self.writes_since_prune += 1
+            prune = self.writes_since_prune >= self.PRUNE_INTERVAL
+            if prune:
+                self.writes_since_prune = 0
+            await asyncio.to_thread(self.db_set, key, entry, prune)
+
+    def store_in_memory(self, key: str, entry: Tuple[float, Dict[str, Any]]) -> None:
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+            llm_metrics.increment("validation_cache_evictions")
+
+    async def delete(self, key: str) -> None:
+        self.entries.pop(key, None)
+        if self.db is not None:
+            await asyncio.to_thread(self.db_delete, key)
+
+    def db_get(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        with self.db_lock:
+            row = self.db.execute(
+                "SELECT stored_at, value FROM validation_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def db_set(self, key: str, entry: Tuple[float, Dict[str, Any]], prune: bool) -> None:
+        with self.db_lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO validation_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(entry[1]), entry[0]),
+            )
+            if prune:
+                # keep the file bounded too: drop expired rows and anything beyond max_entries
+                self.db.execute(
+                    "DELETE FROM validation_cache WHERE stored_at < ? OR stored_at <= "
+                    "(SELECT stored_at FROM validation_cache ORDER BY stored_at DESC LIMIT 1 OFFSET ?)",
+                    (entry[0] - self.ttl_seconds, self.max_entries),
+                )
+
+    def db_delete(self, key: str) -> None:
+        with self.db_lock:
+            self.db.execute("DELETE FROM validation_cache WHERE key = ?", (key,))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+        }
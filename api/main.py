@@ -1,9 +1,11 @@
+import json
 import os
 from fastapi import FastAPI
-from typing import Optional
+from fastapi.responses import StreamingResponse
+from typing import Optional, Tuple
 from temporalio.client import Client
 from temporalio.exceptions import TemporalError
-from temporalio.api.enums.v1 import WorkflowExecutionStatus
+from temporalio.api.enums.v1 import PendingActivityState, WorkflowExecutionStatus
 from fastapi import HTTPException
 from dotenv import load_dotenv
 import asyncio
@@ -17,6 +19,13 @@ from shared.config import get_temporal_client, TEMPORAL_TASK_QUEUE
 app = FastAPI()
 temporal_client: Optional[Client] = None
 
+# LLM activities whose heartbeats carry partial streamed responses (see ToolActivities.stream_provider)
+LLM_ACTIVITY_TYPES = ["agent_validatePrompt", "agent_toolPlanner"]
+STREAM_POLL_INTERVAL_SECONDS = 0.2
+STREAM_RESPONSE_TIMEOUT_SECONDS = 60
+# consecutive polls with no LLM activity running before the stream is considered finished
+STREAM_IDLE_POLLS = 3
+
 # Load environment variables
 load_dotenv()
 
@@ -142,6 +151,94 @@ async def get_agent_goal():
         return {}
 
 
+@app.get("/llm-usage")
+async def get_llm_usage():
+    """Calls the workflow's 'get_llm_usage' query: token usage and estimated cost per turn, goal and session."""
+    try:
+        handle = temporal_client.get_workflow_handle("agent-workflow")
+        return await handle.query("get_llm_usage")
+    except TemporalError as e:
+        # Workflow not found; return an empty response
+        print(e)
+        return {}
+
+
+async def get_llm_activity_progress(handle) -> Tuple[bool, Optional[str]]:
+    """Returns whether an LLM activity is running and the partial response it has streamed so far.
+    A planner running while the prompt is still being validated is a speculative plan (see
+    SPECULATIVE_PLANNING) that may yet be discarded, so its partial response is only shown once
+    validation has passed. Activities being cancelled (discarded plans) aren't shown either."""
+    description = await handle.describe()
+    pending_llm_activities = [
+        pending
+        for pending in description.raw_description.pending_activities
+        if pending.activity_type.name in LLM_ACTIVITY_TYPES
+        and pending.state != PendingActivityState.PENDING_ACTIVITY_STATE_CANCEL_REQUESTED
+    ]
+    validating = any(pending.activity_type.name == "agent_validatePrompt" for pending in pending_llm_activities)
+    llm_running = bool(pending_llm_activities)
+    partial_response = None
+    for pending in pending_llm_activities:
+        if validating and pending.activity_type.name == "agent_toolPlanner":
+            continue
+        if pending.heartbeat_details.payloads:
+            details = await temporal_client.data_converter.decode(
+                pending.heartbeat_details.payloads
+            )
+            if details and isinstance(details[0], dict):
+                partial_response = details[0].get("partial_response") or partial_response
+    return llm_running, partial_response
+
+
+@app.get("/tool-result/{result_ref}")
+async def get_tool_result(result_ref: int):
+    """Calls the workflow's 'get_tool_result' query: the full result of a tool whose result was
+    compacted in the conversation history (its result_ref)."""
+    try:
+        handle = temporal_client.get_workflow_handle("agent-workflow")
+        tool_result = await handle.query("get_tool_result", result_ref)
+    except TemporalError as e:
+        print(e)
+        raise HTTPException(status_code=404, detail="Workflow not found.")
+    if tool_result is None:
+        raise HTTPException(status_code=404, detail=f"No tool result {result_ref}.")
+    return tool_result
+
+
+@app.get("/stream-response")
+async def stream_response():
+    """Server-sent events with the agent's partial response while the LLM is still generating it.
+    Sends {"partial_response": "..."} events, then a "done" event once no LLM activity is running."""
+    handle = temporal_client.get_workflow_handle("agent-workflow")
+
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STREAM_RESPONSE_TIMEOUT_SECONDS
+        seen_llm_activity = False
+        idle_polls = 0
+        last_partial = None
+        while loop.time() < deadline:
+            try:
+                llm_running, partial_response = await get_llm_activity_progress(handle)
+            except TemporalError as e:
+                print(e)
+                break
+            if partial_response and partial_response != last_partial:
+                last_partial = partial_response
+                yield f"data: {json.dumps({'partial_response': partial_response})}\n\n"
+            if llm_running:
+                seen_llm_activity = True
+                idle_polls = 0
+            elif seen_llm_activity:
+                idle_polls += 1
+                if idle_polls >= STREAM_IDLE_POLLS:
+                    break
+            await asyncio.sleep(STREAM_POLL_INTERVAL_SECONDS)
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.post("/send-prompt")
 async def send_prompt(prompt: str):
     # Create combined input with goal from environment
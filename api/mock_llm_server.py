@@ -0,0 +1,443 @@
+"""
+Mock LLM server for running the agent offline, in tests and in load/latency benchmarks.
+
+It speaks enough of three wire formats for the provider adapters in activities/llm_providers:
+
+- OpenAI chat completions: POST /v1/chat/completions (set OPENAI_BASE_URL=http://localhost:8001/v1)
+- Anthropic messages: POST /v1/messages (set ANTHROPIC_BASE_URL=http://localhost:8001)
+- Ollama chat: POST /api/chat (set OLLAMA_HOST=http://localhost:8001)
+
+all with and without streaming. Replies are scripted per goal from the goal's
+example_conversation_history: the goal is recognized from its description in the
+context instructions, and the number of agent messages in the conversation history
+picks the step, so a conversation walks through the example's questions and tool
+confirmations. Validation prompts are always accepted, and a user message asking to
+end the conversation gets next="done". Rolling summary requests get a summary that
+records how many agent messages it replaces, so the script keeps its place.
+
+Faults are injected per request (MOCK_LLM_* env vars or command line flags):
+latency drawn from a distribution (fixed:S, uniform:MIN:MAX, normal:MEAN:STD or
+lognormal:MEDIAN:SIGMA, in seconds), and error rates for HTTP 500s, 429s with
+Retry-After, and malformed JSON replies.
+
+Usage: python -m api.mock_llm_server [--port 8001] [--latency lognormal:0.8:0.5] [--error-rate 0.02]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from models.tool_definitions import AgentGoal
+from prompts.context_budget import extract_history
+from tools.example_conversation import parse_example
+from tools.goal_registry import goal_list
+
+_CONFIRMED_TOOL_RE = re.compile(r"confirm on (\w+)")
+_END_CHAT_RE = re.compile(r"\b(end (the )?(chat|conversation)|i'?m (all )?(set|done)|goodbye|bye)\b", re.IGNORECASE)
+# Mock rolling summaries record how many of the goal's agent messages they replace, to keep the script's place
+_SUMMARY_RE = re.compile(r"\[mock summary of (\d+) agent messages\]")
+
+# Argument values for confirmed tools; they match the sample data the tools use without API keys
+MOCK_ARG_VALUES = {
+    "email": "bob.johnson@emailzzz.com",
+    "email_address": "bob.johnson@emailzzz.com",
+    "email_address_or_account_ID": "bob.johnson@emailzzz.com",
+    "city": "Sydney",
+    "month": "May",
+    "origin": "San Francisco",
+    "destination": "Sydney",
+    "team": "Wolverhampton Wanderers FC",
+    "goalID": "goal_event_flight_invoice",
+    "userConfirmation": "yes",
+    "amount": "100",
+    "address": "123 Main St",
+    "state": "AZ",
+}
+MOCK_VALUES_BY_TYPE = {"ISO8601": "2025-05-01", "number": 1, "float": 100.0}
+
+
+@dataclass
+class MockConfig:
+    latency: str = "fixed:0.05"
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    malformed_rate: float = 0.0
+    seed: Optional[int] = None
+    rng: random.Random = field(default_factory=random.Random, repr=False)
+
+    def __post_init__(self):
+        if self.seed is not None:
+            self.rng.seed(self.seed)
+        self.sample_latency()  # fail fast on a bad spec
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        seed = os.environ.get("MOCK_LLM_SEED")
+        return cls(
+            latency=os.environ.get("MOCK_LLM_LATENCY", "fixed:0.05"),
+            error_rate=float(os.environ.get("MOCK_LLM_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.environ.get("MOCK_LLM_RATE_LIMIT_RATE", "0")),
+            retry_after_seconds=float(os.environ.get("MOCK_LLM_RETRY_AFTER_SECONDS", "1")),
+            malformed_rate=float(os.environ.get("MOCK_LLM_MALFORMED_RATE", "0")),
+            seed=int(seed) if seed else None,
+        )
+
+    def sample_latency(self) -> float:
+        kind, *params = self.latency.split(":")
+        values = [float(p) for p in params]
+        if kind == "fixed":
+            return values[0]
+        if kind == "uniform":
+            return self.rng.uniform(values[0], values[1])
+        if kind == "normal":
+            return max(0.0, self.rng.gauss(values[0], values[1]))
+        if kind == "lognormal":
+            return self.rng.lognormvariate(math.log(values[0]), values[1])
+        raise ValueError(f"Unknown latency distribution: {self.latency}")
+
+    def fault(self) -> Optional[str]:
+        """Picks the fault to inject into this request, if any."""
+        roll = self.rng.random()
+        if roll < self.error_rate:
+            return "error"
+        if roll < self.error_rate + self.rate_limit_rate:
+            return "rate_limit"
+        if roll < self.error_rate + self.rate_limit_rate + self.malformed_rate:
+            return "malformed"
+        return None
+
+
+@dataclass
+class ScriptStep:
+    next: str
+    response: str
+    tool: Optional[str] = None
+
+
+def build_script(goal: AgentGoal) -> List[ScriptStep]:
+    """One step per planner reply in the goal's example conversation."""
+    tool_names = [tool.name for tool in goal.tools]
+    used: List[str] = []
+
+    def resolve(name: Optional[str]) -> Optional[str]:
+        # example conversations don't always spell tool names exactly (e.g. FuturePTO)
+        candidates = [t for t in tool_names if name and (t == name or t.startswith(name) or name.startswith(t))]
+        candidates = candidates or [t for t in tool_names if t not in used] or tool_names
+        tool = candidates[0] if candidates else None
+        used.append(tool)
+        return tool
+
+    steps: List[ScriptStep] = []
+    pending: Optional[str] = None
+    for message in parse_example(goal.example_conversation_history):
+        actor, text = message["actor"], message["response"]
+        if actor == "agent":
+            if pending is not None:
+                steps.append(ScriptStep("question", pending))
+            pending = text
+        elif actor == "user_confirmed_tool_run":
+            match = _CONFIRMED_TOOL_RE.search(text)
+            tool = resolve(match.group(1) if match else None)
+            steps.append(ScriptStep("confirm", pending or f"Ready to run {tool}.", tool))
+            pending = None
+        elif actor == "tool_result" and pending is not None:
+            # the tool ran without a confirmation step in the example
+            steps.append(ScriptStep("confirm", pending, resolve(None)))
+            pending = None
+        elif actor == "user" and pending is not None:
+            steps.append(ScriptStep("question", pending))
+            pending = None
+    steps.append(ScriptStep("done", pending or "All done, thanks!"))
+    return steps
+
+
+SCRIPTS: Dict[str, List[ScriptStep]] = {goal.id: build_script(goal) for goal in goal_list}
+
+
+def find_goal(context: str) -> Optional[AgentGoal]:
+    matches = [goal for goal in goal_list if goal.description and goal.description in context]
+    return max(matches, key=lambda goal: len(goal.description), default=None)
+
+
+def scripted_reply(context: str, prompt: str) -> Dict[str, Any]:
+    """The JSON reply the agent expects for this request."""
+    if "validationResult" in prompt:
+        return {"validationResult": True, "validationFailedReason": {}}
+    if '"summary"' in prompt:
+        return {"summary": mock_summary(context)}
+
+    goal = find_goal(context)
+    history = extract_history(context) or {"messages": []}
+    messages = history.get("messages", [])
+    if goal is None:
+        return {"response": "How can I help?", "next": "question", "tool": None, "args": {}}
+
+    messages, summarized_agent_turns = current_goal_messages(messages)
+
+    last_user = next((m.get("response") for m in reversed(messages) if m.get("actor") == "user"), None)
+    if isinstance(last_user, str) and _END_CHAT_RE.search(last_user):
+        return {"response": "Goodbye!", "next": "done", "tool": None, "args": {}}
+
+    script = SCRIPTS[goal.id]
+    agent_turns = summarized_agent_turns + sum(1 for m in messages if m.get("actor") == "agent")
+    step = script[min(agent_turns, len(script) - 1)]
+    args: Dict[str, Any] = {}
+    if step.tool:
+        tool = next(t for t in goal.tools if t.name == step.tool)
+        args = {
+            arg.name: MOCK_ARG_VALUES.get(arg.name, MOCK_VALUES_BY_TYPE.get(arg.type, f"mock {arg.name}"))
+            for arg in tool.arguments
+        }
+    return {"response": step.response, "next": step.next, "tool": step.tool, "args": args}
+
+
+def current_goal_messages(messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """The messages since the last goal change, and the agent messages of the goal replaced by a summary."""
+    for index in range(len(messages) - 1, -1, -1):
+        response = messages[index].get("response")
+        if messages[index].get("actor") == "tool_result" and isinstance(response, dict) and "new_goal" in response:
+            return messages[index + 1 :], 0
+    summarized = 0
+    for message in messages:
+        match = _SUMMARY_RE.search(str(message.get("response"))) if message.get("actor") == "conversation_summary" else None
+        if match:
+            summarized += int(match.group(1))
+    return messages, summarized
+
+
+def mock_summary(context: str) -> str:
+    """A rolling summary of the messages in the context, and of the summary before them if there is one."""
+    start = context.find('{"messages"')
+    messages = json.loads(context[start:])["messages"] if start != -1 else []
+    previous = _SUMMARY_RE.search(context[:start] if start != -1 else context)
+    messages, summarized = current_goal_messages(
+        [{"actor": "conversation_summary", "response": previous.group(0)}] + messages if previous else messages
+    )
+    agent_turns = summarized + sum(1 for m in messages if m.get("actor") == "agent")
+    return f"[mock summary of {agent_turns} agent messages]"
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def chunk_text(text: str, size: int = 16) -> List[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)] or [""]
+
+
+async def paced(chunks: List[str], latency: float) -> AsyncIterator[str]:
+    """Yields chunks spread over latency seconds, with the first after 30% of it (time to first token)."""
+    await asyncio.sleep(latency * 0.3)
+    gap = latency * 0.7 / max(1, len(chunks) - 1)
+    for index, chunk in enumerate(chunks):
+        if index:
+            await asyncio.sleep(gap)
+        yield chunk
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    config = config or MockConfig.from_env()
+    app = FastAPI(title="Mock LLM server")
+    app.state.config = config
+    app.state.requests = 0
+
+    async def prepare(context: str, prompt: str):
+        """Returns (reply text, latency, error response or None) for a request."""
+        app.state.requests += 1
+        latency = config.sample_latency()
+        fault = config.fault()
+        if fault == "error":
+            await asyncio.sleep(latency)
+            return None, latency, JSONResponse(
+                {"error": {"message": "Injected server error", "type": "server_error"}}, status_code=500
+            )
+        if fault == "rate_limit":
+            return None, latency, JSONResponse(
+                {"error": {"message": "Injected rate limit", "type": "rate_limit_error"}},
+                status_code=429,
+                headers={"retry-after": str(config.retry_after_seconds)},
+            )
+        reply = json.dumps(scripted_reply(context, prompt))
+        if fault == "malformed":
+            reply = reply[:-1] + ",\n"  # trailing comma and missing closing brace
+        return reply, latency, None
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        context = "\n".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+        prompt = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+        reply, latency, error = await prepare(context, prompt)
+        if error:
+            return error
+        model = body.get("model", "mock")
+        usage = {
+            "prompt_tokens": estimate_tokens(context + prompt),
+            "completion_tokens": estimate_tokens(reply),
+            "total_tokens": estimate_tokens(context + prompt) + estimate_tokens(reply),
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}
+                ],
+                "usage": usage,
+            }
+
+        async def events():
+            base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+            async for chunk in paced(chunk_text(reply), latency):
+                delta = {"index": 0, "delta": {"role": "assistant", "content": chunk}, "finish_reason": None}
+                yield f"data: {json.dumps(dict(base, choices=[delta]))}\n\n"
+            done = {"index": 0, "delta": {}, "finish_reason": "stop"}
+            yield f"data: {json.dumps(dict(base, choices=[done]))}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps(dict(base, choices=[], usage=usage))}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/messages")
+    async def anthropic_messages(request: Request):
+        body = await request.json()
+        system = body.get("system", "")
+        context = system if isinstance(system, str) else "".join(block.get("text", "") for block in system)
+        prompt = ""
+        for message in body.get("messages", []):
+            content = message.get("content", "")
+            prompt = content if isinstance(content, str) else "".join(b.get("text", "") for b in content)
+        reply, latency, error = await prepare(context, prompt)
+        if error:
+            return error
+        message_id = f"msg_{uuid.uuid4().hex}"
+        model = body.get("model", "mock")
+        usage = {
+            "input_tokens": estimate_tokens(context + prompt),
+            "output_tokens": estimate_tokens(reply),
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+        }
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return {
+                "id": message_id,
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [{"type": "text", "text": reply}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": usage,
+            }
+
+        def event(name: str, data: dict) -> str:
+            return f"event: {name}\ndata: {json.dumps(dict(data, type=name))}\n\n"
+
+        async def events():
+            start_usage = dict(usage, output_tokens=0)
+            yield event(
+                "message_start",
+                {
+                    "message": {
+                        "id": message_id, "type": "message", "role": "assistant", "model": model,
+                        "content": [], "stop_reason": None, "stop_sequence": None, "usage": start_usage,
+                    }
+                },
+            )
+            yield event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+            async for chunk in paced(chunk_text(reply), latency):
+                yield event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": chunk}})
+            yield event("content_block_stop", {"index": 0})
+            yield event(
+                "message_delta",
+                {"delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": usage["output_tokens"]}},
+            )
+            yield event("message_stop", {})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        model = body.get("model", "mock")
+        if not messages:
+            # a load request (warm-up)
+            return {"model": model, "created_at": now_iso(), "message": {"role": "assistant", "content": ""},
+                    "done": True, "done_reason": "load"}
+        context = "\n".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        prompt = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        reply, latency, error = await prepare(context, prompt)
+        if error:
+            return error
+        final = {
+            "model": model, "created_at": now_iso(), "done": True, "done_reason": "stop",
+            "prompt_eval_count": estimate_tokens(context + prompt), "eval_count": estimate_tokens(reply),
+        }
+        # Ollama streams unless told not to
+        if body.get("stream") is False:
+            await asyncio.sleep(latency)
+            return dict(final, message={"role": "assistant", "content": reply})
+
+        async def lines():
+            async for chunk in paced(chunk_text(reply), latency):
+                part = {"model": model, "created_at": now_iso(), "done": False,
+                        "message": {"role": "assistant", "content": chunk}}
+                yield json.dumps(part) + "\n"
+            yield json.dumps(dict(final, message={"role": "assistant", "content": ""})) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests, "config": repr(config)}
+
+    return app
+
+
+def now_iso() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock LLM server (OpenAI, Anthropic and Ollama APIs)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", help="fixed:S, uniform:MIN:MAX, normal:MEAN:STD or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--error-rate", type=float, help="share of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, help="share of requests answered with HTTP 429")
+    parser.add_argument("--malformed-rate", type=float, help="share of replies with malformed JSON")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    config = MockConfig.from_env()
+    for name in ("latency", "error_rate", "rate_limit_rate", "malformed_rate", "seed"):
+        if getattr(args, name) is not None:
+            setattr(config, name, getattr(args, name))
+    config.__post_init__()
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
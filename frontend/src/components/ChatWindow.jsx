@@ -62,7 +62,7 @@ const Message = memo(({ msg, idx, isLastMessage, onConfirm, onContentChange }) =
 
 Message.displayName = 'Message';
 
-const ChatWindow = memo(({ conversation, loading, onConfirm, onContentChange }) => {
+const ChatWindow = memo(({ conversation, loading, partialResponse, onConfirm, onContentChange }) => {
     const validateConversation = useCallback((conv) => {
         if (!Array.isArray(conv)) {
             console.error("ChatWindow expected conversation to be an array, got:", conv);
@@ -90,6 +90,9 @@ const ChatWindow = memo(({ conversation, loading, onConfirm, onContentChange })
                             onContentChange={onContentChange}
                         />
                     ))}
+                    {loading && partialResponse && (
+                        <MessageBubble message={{ response: partialResponse }} />
+                    )}
                     {loading && (
                         <div className="pt-2 flex justify-center">
                             <LoadingIndicator />
@@ -35,6 +35,7 @@ export default function App() {
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState(INITIAL_ERROR_STATE);
     const [done, setDone] = useState(true);
+    const [partialResponse, setPartialResponse] = useState("");
 
     const debouncedUserInput = useDebounce(userInput, DEBOUNCE_DELAY);
 
@@ -117,6 +118,15 @@ export default function App() {
     }, [fetchConversationHistory]);
     
 
+    // While waiting on the agent, show its reply as it streams in
+    useEffect(() => {
+        if (!loading) {
+            setPartialResponse("");
+            return;
+        }
+        return apiService.streamResponse(setPartialResponse);
+    }, [loading]);
+
     const scrollToBottom = useCallback(() => {
         if (containerRef.current) {
             if (scrollTimeoutRef.current) {
@@ -213,6 +223,7 @@ export default function App() {
                         <ChatWindow
                             conversation={conversation}
                             loading={loading}
+                            partialResponse={partialResponse}
                             onConfirm={handleConfirm}
                             onContentChange={handleContentChange}
                         />
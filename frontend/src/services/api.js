@@ -76,6 +76,21 @@ export const apiService = {
         }
     },
 
+    streamResponse(onPartialResponse) {
+        // Server-sent events with the agent's reply while the LLM is still generating it.
+        // Returns a function that closes the stream.
+        const source = new EventSource(`${API_BASE_URL}/stream-response`);
+        source.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            if (data.partial_response) {
+                onPartialResponse(data.partial_response);
+            }
+        };
+        source.addEventListener('done', () => source.close());
+        source.onerror = () => source.close();
+        return () => source.close();
+    },
+
     async confirm() {
         try {
             const res = await fetch(`${API_BASE_URL}/confirm`, { 
@@ -7,6 +7,7 @@ from models.tool_definitions import AgentGoal
 class AgentGoalWorkflowParams:
     conversation_summary: Optional[str] = None
     prompt_queue: Optional[Deque[str]] = None
+    llm_usage: Optional[Dict[str, Any]] = None  # usage totals carried over on continue-as-new
 
 
 @dataclass
@@ -19,11 +20,53 @@ Message = Dict[str, Union[str, Dict[str, Any]]]
 ConversationHistory = Dict[str, List[Message]]
 NextStep = Literal["confirm", "question", "pick-new-goal", "done"]
 
+# Key under which LLM activities attach call metadata (provider used, failovers) to their result dict.
+# The workflow removes it before the result is stored as tool data or conversation history.
+LLM_METADATA_KEY = "llm_metadata"
+
+
+@dataclass
+class LLMUsage:
+    """Token usage for one LLM call. input_tokens includes cached_input_tokens and cache_write_tokens."""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_input_tokens: int = 0  # prompt tokens served from the provider's prompt cache
+    cache_write_tokens: int = 0  # prompt tokens written to the provider's prompt cache
+    estimated: bool = False  # counted locally because the provider didn't report usage (e.g. a stream stopped early)
+
+
+@dataclass
+class LLMUsageTotals:
+    """LLM usage summed over calls (a turn, a goal or a session), from the activities' LLM metadata."""
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_input_tokens: int = 0
+    cache_write_tokens: int = 0
+    cost_usd: float = 0.0
+    unpriced_calls: int = 0  # calls whose model has no known price, so cost_usd leaves them out
+    latency_seconds: float = 0.0
+
+    def add(self, llm_metadata: Dict[str, Any]) -> None:
+        """Adds one call's metadata (see LLM_METADATA_KEY)."""
+        usage = llm_metadata.get("usage") or {}
+        self.calls += 1
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.output_tokens += usage.get("output_tokens", 0)
+        self.cached_input_tokens += usage.get("cached_input_tokens", 0)
+        self.cache_write_tokens += usage.get("cache_write_tokens", 0)
+        if llm_metadata.get("cost_usd") is None:
+            self.unpriced_calls += 1
+        else:
+            self.cost_usd += llm_metadata["cost_usd"]
+        self.latency_seconds += llm_metadata.get("latency_seconds", 0.0)
+
 
 @dataclass
 class ToolPromptInput:
     prompt: str
     context_instructions: str
+    max_output_tokens: Optional[int] = None  # output budget for the reply; None uses the provider default
 
 
 @dataclass
@@ -37,6 +80,7 @@ class ValidationInput:
 class ValidationResult:
     validationResult: bool
     validationFailedReason: dict = None
+    llm_metadata: Optional[dict] = None
 
     def __post_init__(self):
         # Initialize empty dict if None
@@ -51,4 +95,12 @@ class EnvLookupInput:
 @dataclass
 class EnvLookupOutput:
     show_confirm: bool
-    multi_goal_mode: bool
\ No newline at end of file
+    multi_goal_mode: bool
+    validate_and_plan: bool = False
+    llm_usage_search_attributes: bool = False
+    speculative_planning: bool = False
+    compact_prompt_history: bool = False
+    rolling_summary_turns: int = 0
+    history_retrieval_top_k: int = 0
+    history_retrieval_recent_turns: int = 4
+    tool_result_compaction: bool = True
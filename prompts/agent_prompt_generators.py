@@ -1,34 +1,100 @@
 from models.tool_definitions import AgentGoal
-from typing import Optional
+from prompts.history_serializer import serialize_history
+from typing import Hashable, Optional
 import json
 
 MULTI_GOAL_MODE:bool = None
 
+# "next" value the LLM returns in validate-and-plan mode when the user's prompt doesn't make sense
+INVALID_PROMPT_NEXT = "invalid-prompt"
+
+# Heading that starts the dynamic part of the context instructions. Everything before it
+# depends only on the goal (and multi-goal mode), so it is identical from turn to turn and
+# providers can reuse it as a cached prompt prefix. See split_static_context().
+DYNAMIC_CONTEXT_MARKER = "=== Conversation History ==="
+
+# Output token budgets for the JSON each kind of prompt asks for (see ToolPromptInput.max_output_tokens).
+# The planner's "response" can list several search results; validation and summaries are short.
+# A reply cut off at the budget is still repaired by the JSON extraction where possible.
+PLANNER_MAX_OUTPUT_TOKENS = 1024
+VALIDATION_MAX_OUTPUT_TOKENS = 256
+SUMMARY_MAX_OUTPUT_TOKENS = 200
+ROLLING_SUMMARY_MAX_OUTPUT_TOKENS = 400
+
 def generate_genai_prompt(
-    agent_goal: AgentGoal, conversation_history: str, multi_goal_mode:bool, raw_json: Optional[str] = None
+    agent_goal: AgentGoal, conversation_history: str, multi_goal_mode:bool, raw_json: Optional[str] = None,
+    validate_user_prompt: bool = False, compact_history: bool = False,
+    history_cache_key: Optional[Hashable] = None
 ) -> str:
     """
     Generates a concise prompt for producing or validating JSON instructions
     with the provided tools and conversation history.
+    The static goal, tool and JSON sections come first and the conversation history last,
+    so the prompt prefix stays stable between turns.
+    If validate_user_prompt is set, the LLM also validates the user's latest message in the
+    same call (see generate_prompt_validation_guidance).
+    The history is serialized incrementally across calls with the same history_cache_key, in
+    the compact encoding if compact_history is set (see prompts/history_serializer.py).
     """
-    prompt_lines = []
     set_multi_goal_mode_if_unset(multi_goal_mode)
+    prompt_lines = []
 
-    # Intro / Role
-    prompt_lines.append(
-        "You are an AI agent that helps fill required arguments for the tools described below. "
-        "You must respond with valid JSON ONLY, using the schema provided in the instructions."
-    )
-
-    # Main Conversation History
-    prompt_lines.append("=== Conversation History ===")
+    # Main Conversation History - dynamic content starts here
+    prompt_lines.append(DYNAMIC_CONTEXT_MARKER)
     prompt_lines.append(
         "This is the ongoing history to determine which tool and arguments to gather:"
     )
     prompt_lines.append("BEGIN CONVERSATION HISTORY")
-    prompt_lines.append(json.dumps(conversation_history, indent=2))
+    prompt_lines.append(serialize_history(conversation_history, compact_history, history_cache_key))
     prompt_lines.append("END CONVERSATION HISTORY")
+
+    # Prompt validation (validate-and-plan mode) - after the history so the static prefix is unchanged
+    if validate_user_prompt:
+        prompt_lines.append("")
+        prompt_lines.append("=== Prompt Validation ===")
+        prompt_lines.append(generate_prompt_validation_guidance())
+
+    # Validation Task (If raw_json is provided)
+    if raw_json is not None:
+        prompt_lines.append("")
+        prompt_lines.append("=== Validation Task ===")
+        prompt_lines.append("Validate and correct the following JSON if needed:")
+        prompt_lines.append(json.dumps(raw_json, indent=2))
+        prompt_lines.append("")
+        prompt_lines.append(
+            "Check syntax, 'tool' validity, 'args' completeness, "
+            "and set 'next' appropriately. Return ONLY corrected JSON."
+        )
+
+    # Prompt Start
     prompt_lines.append("")
+    if raw_json is not None:
+        prompt_lines.append("Begin by validating the provided JSON if necessary.")
+    else:
+        prompt_lines.append(
+            "Begin by producing a valid JSON response for the next tool or question."
+        )
+
+    return generate_static_context(agent_goal) + "\n".join(prompt_lines)
+
+def generate_static_context(agent_goal: AgentGoal) -> str:
+    """
+    Generates the part of the context instructions that only depends on the goal and
+    multi-goal mode: intro, example conversation, tool definitions and JSON instructions.
+
+    Args:
+        agent_goal: The current goal
+
+    Returns:
+        str: The static context, ending with the newline before DYNAMIC_CONTEXT_MARKER
+    """
+    prompt_lines = []
+
+    # Intro / Role
+    prompt_lines.append(
+        "You are an AI agent that helps fill required arguments for the tools described below. "
+        "You must respond with valid JSON ONLY, using the schema provided in the instructions."
+    )
 
     # Example Conversation History (from agent_goal)
     if agent_goal.example_conversation_history:
@@ -87,28 +153,40 @@ def generate_genai_prompt(
         "4) response should be short and user-friendly.\n"
     )
 
-    # Validation Task (If raw_json is provided)
-    if raw_json is not None:
-        prompt_lines.append("")
-        prompt_lines.append("=== Validation Task ===")
-        prompt_lines.append("Validate and correct the following JSON if needed:")
-        prompt_lines.append(json.dumps(raw_json, indent=2))
-        prompt_lines.append("")
-        prompt_lines.append(
-            "Check syntax, 'tool' validity, 'args' completeness, "
-            "and set 'next' appropriately. Return ONLY corrected JSON."
-        )
+    return "\n".join(prompt_lines) + "\n"
 
-    # Prompt Start
-    prompt_lines.append("")
-    if raw_json is not None:
-        prompt_lines.append("Begin by validating the provided JSON if necessary.")
-    else:
-        prompt_lines.append(
-            "Begin by producing a valid JSON response for the next tool or question."
-        )
+def generate_prompt_validation_guidance() -> str:
+    """
+    Generates the instructions for validating the user's latest message as part of planning,
+    mirroring the checks of the separate validation activity.
 
-    return "\n".join(prompt_lines)
+    Returns:
+        str: A prompt string telling the LLM when to reject the prompt instead of planning
+    """
+    return (
+        "Before deciding the next step, check that the user's latest message makes sense given the goal "
+        "and the conversation history. If the response is low content such as \"yes\" or \"that's right\" "
+        "the user is probably responding to a previous prompt, so examine it in that context.\n"
+        "If the message is wildly nonsensical or makes no sense toward the goal and current conversation "
+        f"history, do not plan: set next='{INVALID_PROMPT_NEXT}', tool=null, args={{}} and in response "
+        "explain why the request doesn't make sense and what information the user should provide instead."
+    )
+
+def split_static_context(context_instructions: str) -> tuple[str, str]:
+    """
+    Splits context instructions into the static prefix (goal, tools, instructions) and the
+    dynamic remainder (conversation history onwards).
+
+    Args:
+        context_instructions: Context built by generate_genai_prompt or the validation activity
+
+    Returns:
+        tuple[str, str]: (static prefix, dynamic part); the prefix is empty if there is no marker
+    """
+    marker_index = context_instructions.find(DYNAMIC_CONTEXT_MARKER)
+    if marker_index == -1:
+        return "", context_instructions
+    return context_instructions[:marker_index], context_instructions[marker_index:]
 
 def generate_tool_completion_prompt(current_tool: str, dynamic_result: dict) -> str:
     """
@@ -0,0 +1,197 @@
+"""
+Token-aware budgeting of LLM context instructions.
+
+The planner and validation contexts share a layout: static goal/tool sections, an
+optional example conversation between BEGIN EXAMPLE / END EXAMPLE, and the conversation
+history as JSON between BEGIN CONVERSATION HISTORY / END CONVERSATION HISTORY.
+fit_context_to_budget() measures the context with the provider's tokenizer and, if it
+is over budget, compacts the lowest-value sections first:
+
+1. verbose tool results in older history messages are truncated
+2. the oldest history messages are dropped (the most recent ones are always kept)
+3. the example conversation is dropped
+
+The history is trimmed before the example because the example is part of the static
+prompt prefix that providers cache (see generate_genai_prompt); dropping it changes the
+prefix and loses the cache.
+
+tiktoken isn't a dependency of the project, so by default token counts are a
+characters-per-token estimate. With tiktoken installed, counts use the model's encoding
+(or o200k_base for non-OpenAI models). Encodings may be downloaded on first use, so
+the worker loads them at startup with load_encodings(), not in an activity.
+"""
+import json
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from prompts.history_serializer import encode, is_compact
+
+HISTORY_START = "BEGIN CONVERSATION HISTORY"
+HISTORY_END = "END CONVERSATION HISTORY"
+EXAMPLE_START = "BEGIN EXAMPLE"
+EXAMPLE_END = "END EXAMPLE"
+
+# Rough average for English text and JSON across current tokenizers
+CHARS_PER_TOKEN_ESTIMATE = 4
+
+# Messages at the end of the history that are never dropped or truncated
+MIN_RECENT_MESSAGES = 6
+# Older tool results longer than this (in characters of JSON) are truncated
+TOOL_RESULT_MAX_CHARS = 400
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """Returns a tiktoken encoding for the model, or None if tiktoken or the encoding is unavailable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # non-OpenAI models: o200k_base is a reasonable approximation of modern tokenizers
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # e.g. the encoding file can't be downloaded
+        print(f"tiktoken encoding unavailable for {model}, estimating token counts: {e}")
+        return None
+
+
+def load_encodings(models: List[str]) -> None:
+    """Loads (and if needed downloads) the models' encodings ahead of the first count_tokens call."""
+    for model in models:
+        get_encoding(model)
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    """Counts tokens for the model, falling back to an estimate without tiktoken."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN_ESTIMATE - 1) // CHARS_PER_TOKEN_ESTIMATE
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@dataclass
+class BudgetReport:
+    budget: int
+    tokens_before: int
+    tokens_after: int
+    compactions: List[str] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "budget": self.budget,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "compactions": self.compactions,
+        }
+
+
+def fit_context_to_budget(
+    context_instructions: str, budget: Optional[int], model: str = ""
+) -> tuple[str, BudgetReport]:
+    """
+    Compacts the context instructions until they fit in budget tokens (or nothing is left to compact).
+
+    Args:
+        context_instructions: Context in the layout produced by generate_genai_prompt / the validation activity
+        budget: Maximum tokens for the context; None or 0 disables budgeting (tokens are still counted)
+        model: Model name used to pick the tokenizer
+
+    Returns:
+        tuple[str, BudgetReport]: The (possibly compacted) context and what was done to it
+    """
+    tokens = count_tokens(context_instructions, model)
+    report = BudgetReport(budget=budget or 0, tokens_before=tokens, tokens_after=tokens)
+    if not budget or tokens <= budget:
+        return context_instructions, report
+
+    context = context_instructions
+    history = extract_history(context)
+
+    if history is not None and truncate_old_tool_results(history):
+        context = replace_history(context, history)
+        report.compactions.append("truncated older tool results")
+        tokens = count_tokens(context, model)
+
+    if tokens > budget and history is not None:
+        messages = history.get("messages", [])
+        droppable = max(0, len(messages) - MIN_RECENT_MESSAGES)
+        if droppable:
+            # binary search for the fewest oldest messages to drop (all droppable if nothing fits)
+            low, high = 1, droppable
+            while low < high:
+                middle = (low + high) // 2
+                candidate = replace_history(context, omit_oldest(history, middle))
+                if count_tokens(candidate, model) <= budget:
+                    high = middle
+                else:
+                    low = middle + 1
+            context = replace_history(context, omit_oldest(history, low))
+            report.compactions.append(f"omitted {low} oldest messages")
+            tokens = count_tokens(context, model)
+
+    # last, as the example is in the cached static prefix
+    if tokens > budget and EXAMPLE_START in context:
+        context = drop_example(context)
+        report.compactions.append("dropped example conversation")
+        tokens = count_tokens(context, model)
+
+    report.tokens_after = tokens
+    return context, report
+
+
+def extract_history(context: str) -> Optional[Dict[str, Any]]:
+    start = context.find(HISTORY_START)
+    end = context.find(HISTORY_END, start)
+    if start == -1 or end == -1:
+        return None
+    try:
+        history = json.loads(context[start + len(HISTORY_START) : end])
+    except json.JSONDecodeError:
+        return None
+    return history if isinstance(history, dict) else None
+
+
+def replace_history(context: str, history: Dict[str, Any]) -> str:
+    start = context.find(HISTORY_START) + len(HISTORY_START)
+    end = context.find(HISTORY_END, start)
+    # keep the encoding the history was serialized with
+    serialized = encode(history, compact=is_compact(context[start:end]))
+    return context[:start] + "\n" + serialized + "\n" + context[end:]
+
+
+def truncate_old_tool_results(history: Dict[str, Any]) -> bool:
+    """Truncates long tool results outside the recent window, in place. Returns True if any changed."""
+    messages = history.get("messages", [])
+    changed = False
+    for message in messages[: max(0, len(messages) - MIN_RECENT_MESSAGES)]:
+        if message.get("actor") != "tool_result":
+            continue
+        serialized = json.dumps(message.get("response"), default=str)
+        if len(serialized) > TOOL_RESULT_MAX_CHARS:
+            message["response"] = serialized[:TOOL_RESULT_MAX_CHARS] + "... [truncated]"
+            changed = True
+    return changed
+
+
+def omit_oldest(history: Dict[str, Any], count: int) -> Dict[str, Any]:
+    if count <= 0:
+        return history
+    messages = history.get("messages", [])
+    note = {
+        "actor": "system",
+        "response": f"[{count} earlier messages omitted to fit the context budget]",
+    }
+    return dict(history, messages=[note] + messages[count:])
+
+
+def drop_example(context: str) -> str:
+    start = context.find(EXAMPLE_START)
+    end = context.find(EXAMPLE_END, start)
+    if start == -1 or end == -1:
+        return context
+    return context[:start] + "[example conversation omitted]" + context[end + len(EXAMPLE_END) :]
@@ -0,0 +1,113 @@
+"""
+Serialization of the conversation history for LLM context instructions.
+
+The history only grows by appending messages, so a HistorySerializer keeps each message's
+JSON and only encodes the messages added since its last call, instead of json.dumps-ing the
+whole history every turn. Messages already encoded are recognised by comparing them by value
+with a copy taken when they were encoded, so a deserialized copy of the history (e.g. in an
+activity) reuses them and a message changed in place doesn't; any change re-encodes from the
+first message that differs.
+
+Two encodings are supported, both valid JSON that extract_history() parses:
+- indented: identical to json.dumps(history, indent=2), the historical format
+- compact: no indentation or spaces after separators, cutting the history's size and tokens
+  (set COMPACT_PROMPT_HISTORY=true)
+"""
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+# Histories (i.e. workflows) whose serializers are kept by serialize_history
+MAX_CACHED_HISTORIES = 256
+
+COMPACT_SEPARATORS = (",", ":")
+
+_serializers: "OrderedDict[Hashable, HistorySerializer]" = OrderedDict()
+_serializers_lock = threading.Lock()
+
+
+def compact_history_enabled() -> bool:
+    return os.getenv("COMPACT_PROMPT_HISTORY", "false").lower() == "true"
+
+
+class HistorySerializer:
+    """Incrementally serializes one conversation's history ({"messages": [...]})."""
+
+    def __init__(self, compact: bool = False) -> None:
+        self.compact = compact
+        # copies of the encoded messages, as they were when encoded
+        self._messages: List[Any] = []
+        self._encoded: List[str] = []
+        self._lock = threading.Lock()
+
+    def serialize(self, history: Dict[str, Any]) -> str:
+        messages = history.get("messages") if isinstance(history, dict) else None
+        if not isinstance(messages, list) or len(history) != 1:
+            return encode(history, self.compact)
+        with self._lock:
+            return self._serialize_messages(messages)
+
+    def _serialize_messages(self, messages: List[Any]) -> str:
+        reused = 0
+        for cached, message in zip(self._messages, messages):
+            if cached != message:
+                break
+            reused += 1
+        del self._messages[reused:], self._encoded[reused:]
+        for message in messages[reused:]:
+            self._messages.append(copy.deepcopy(message))
+            self._encoded.append(self.encode_message(message))
+
+        if self.compact:
+            return '{"messages":[' + ",".join(self._encoded) + "]}"
+        if not self._encoded:
+            return '{\n  "messages": []\n}'
+        return '{\n  "messages": [\n' + ",\n".join(self._encoded) + "\n  ]\n}"
+
+    def encode_message(self, message: Any) -> str:
+        if self.compact:
+            return json.dumps(message, separators=COMPACT_SEPARATORS)
+        # a list item two levels deep in json.dumps(history, indent=2)
+        return "    " + json.dumps(message, indent=2).replace("\n", "\n    ")
+
+
+def encode(history: Any, compact: bool = False) -> str:
+    """Serializes a history in one go."""
+    if compact:
+        return json.dumps(history, separators=COMPACT_SEPARATORS)
+    return json.dumps(history, indent=2)
+
+
+def serialize_history(history: Dict[str, Any], compact: bool = False, cache_key: Optional[Hashable] = None) -> str:
+    """
+    Serializes the conversation history, reusing the encoding of the messages seen in the
+    previous call with the same cache_key (e.g. the workflow ID and run ID).
+
+    Args:
+        history: The conversation history
+        compact: Use the compact encoding instead of the indented one
+        cache_key: Identifies the conversation; None serializes without caching
+
+    Returns:
+        str: The history as JSON
+    """
+    if cache_key is None:
+        return encode(history, compact)
+    key = (cache_key, compact)
+    with _serializers_lock:
+        serializer = _serializers.get(key)
+        if serializer is None:
+            serializer = _serializers[key] = HistorySerializer(compact)
+            if len(_serializers) > MAX_CACHED_HISTORIES:
+                _serializers.popitem(last=False)
+        else:
+            _serializers.move_to_end(key)
+    return serializer.serialize(history)
+
+
+def is_compact(serialized_history: str) -> bool:
+    """Whether a serialized history uses the compact encoding (JSON strings never contain raw newlines)."""
+    return "\n" not in serialized_history.strip()
@@ -0,0 +1,143 @@
+"""
+Compaction of tool results before they enter the conversation history.
+
+A tool result is added to the history (and so re-sent with every later prompt) and embedded in
+the tool completion prompt. Results like search hits or order lists can be kilobytes, so each
+tool can have a CompactionRule:
+
+- list_fields: for lists of records, the fields of each record to keep (field projection)
+- max_items: records kept per list; the number left out is recorded as "<list>_omitted"
+- max_string_chars: longer strings (e.g. descriptions) are cut short
+- max_chars: cap on the compacted result as JSON; lists are shortened further to fit, and as a
+  last resort the result is replaced by a truncated JSON string
+
+Tools without a rule only get the default size cap. A compacted result carries "result_ref",
+the index of the full result in the workflow's tool results, which the get_tool_result query
+(GET /tool-result/{ref}) returns.
+"""
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_MAX_CHARS = 2000
+TRUNCATION_SUFFIX = "..."
+
+
+@dataclass(frozen=True)
+class CompactionRule:
+    list_fields: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    max_items: Optional[int] = None
+    max_string_chars: Optional[int] = None
+    max_chars: int = DEFAULT_MAX_CHARS
+
+
+# Fields kept are the ones the agent shows the user or passes to the goal's next tool
+TOOL_RESULT_RULES: Dict[str, CompactionRule] = {
+    "FindEvents": CompactionRule(
+        list_fields={"events": ("city", "eventName", "month", "dateFrom", "dateTo", "description")},
+        max_items=8,
+        max_string_chars=160,
+    ),
+    "SearchFlights": CompactionRule(
+        list_fields={
+            "results": (
+                "operating_carrier",
+                "outbound_flight_code",
+                "return_operating_carrier",
+                "return_flight_code",
+                "price",
+            )
+        },
+        max_items=6,
+    ),
+    "SearchFixtures": CompactionRule(
+        list_fields={"fixtures": ("homeTeam", "awayTeam", "date")},
+        max_items=10,
+    ),
+    "ListOrders": CompactionRule(
+        # the order data has both "last_order_update" and "last_update"
+        list_fields={
+            "orders": (
+                "id",
+                "summary",
+                "status",
+                "order_date",
+                "last_order_update",
+                "last_update",
+                "tracking_id",
+            )
+        },
+        max_items=10,
+    ),
+    # the user picks an agent from the whole list, so it's only projected
+    "ListAgents": CompactionRule(
+        list_fields={"agents": ("agent_name", "goal_id", "agent_description")},
+        max_chars=6000,
+    ),
+}
+
+
+def compact_tool_result(tool: str, result: Dict[str, Any], result_ref: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Compacts a tool result with the tool's rule, leaving the result itself unchanged.
+
+    Args:
+        tool: The tool's name
+        result: The tool's result
+        result_ref: Where the full result can be looked up, added to the result if it was compacted
+
+    Returns:
+        Dict[str, Any]: The compacted result, or the result itself if it needed no compaction
+    """
+    if not isinstance(result, dict):
+        return result
+    rule = TOOL_RESULT_RULES.get(tool, CompactionRule())
+
+    compacted: Dict[str, Any] = {}
+    list_lengths: Dict[str, int] = {}
+    for key, value in result.items():
+        if key in rule.list_fields and isinstance(value, list):
+            fields = rule.list_fields[key]
+            value = [
+                {name: item[name] for name in fields if name in item} if isinstance(item, dict) else item
+                for item in value
+            ]
+            list_lengths[key] = len(value)
+        compacted[key] = truncate_strings(value, rule.max_string_chars)
+
+    max_items = {key: min(length, rule.max_items or length) for key, length in list_lengths.items()}
+    limited = limit_items(compacted, max_items, list_lengths)
+    # shorten the lists further until the result fits
+    while len(json.dumps(limited, default=str)) > rule.max_chars and any(n > 1 for n in max_items.values()):
+        max_items = {key: max(1, n // 2) for key, n in max_items.items()}
+        limited = limit_items(compacted, max_items, list_lengths)
+    if len(json.dumps(limited, default=str)) > rule.max_chars:
+        text = json.dumps(limited, default=str)
+        limited = {"tool": result.get("tool", tool), "result": text[: rule.max_chars] + TRUNCATION_SUFFIX}
+
+    if limited == result:
+        return result
+    if result_ref is not None:
+        limited["result_ref"] = result_ref
+    return limited
+
+
+def limit_items(result: Dict[str, Any], max_items: Dict[str, int], list_lengths: Dict[str, int]) -> Dict[str, Any]:
+    limited = dict(result)
+    for key, count in max_items.items():
+        if count < list_lengths[key]:
+            limited[key] = result[key][:count]
+            limited[f"{key}_omitted"] = list_lengths[key] - count
+    return limited
+
+
+def truncate_strings(value: Any, max_chars: Optional[int]) -> Any:
+    if max_chars is None:
+        return value
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + TRUNCATION_SUFFIX
+    if isinstance(value, dict):
+        return {key: truncate_strings(item, max_chars) for key, item in value.items()}
+    if isinstance(value, list):
+        return [truncate_strings(item, max_chars) for item in value]
+    return value
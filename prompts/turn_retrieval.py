@@ -0,0 +1,193 @@
+"""
+Local retrieval of the conversation turns relevant to the current goal and prompt.
+
+In long multi-goal sessions most of the history belongs to earlier goals. With retrieval on,
+the history sent to the LLM keeps:
+
+- the most recent turns
+- every turn of the current goal (they hold the arguments gathered and the tools already run)
+- the top_k earlier turns that best match the current goal and the user's latest message,
+  scored with BM25 over the words of each turn
+
+and replaces the other turns with a note saying how many were left out. A turn is a user
+message and the messages after it, up to the next user message. Everything runs in-process
+and is deterministic, so the workflow can call it directly.
+"""
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Words, keeping emails, dates and IDs whole (argument names like account_id are split)
+_WORD_RE = re.compile(r"[a-z0-9]+(?:[.@-][a-z0-9]+)*")
+# Very common words, and the keys every agent message has
+STOP_WORDS = frozenset(
+    "a an and are as at be by can do for from have i if in is it me my of on or please so that the this "
+    "to we what when which with would you your yes no next response tool args none null true false".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in STOP_WORDS]
+
+
+def message_words(message: Dict[str, Any]) -> List[str]:
+    """The words of a message's content (keys and values of its response)."""
+    return tokenize(" ".join(_strings(message.get("response"))))
+
+
+def _strings(value: Any) -> Iterable[str]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield str(key)
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+    elif value is not None:
+        yield str(value)
+
+
+class TurnIndex:
+    """BM25 index over the turns of one conversation, updated incrementally as messages are appended."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.turn_starts: List[int] = []
+        self._term_counts: List[Counter] = []
+        self._lengths: List[int] = []
+        self._document_frequency: Counter = Counter()
+        self._total_length = 0
+        self._indexed_messages = 0
+
+    def update(self, messages: List[Dict[str, Any]]) -> None:
+        """Indexes the messages appended since the last update (the last turn is re-indexed, as it may have grown)."""
+        if len(messages) < self._indexed_messages:
+            self.reset()
+        if len(messages) == self._indexed_messages:
+            return
+        turn_start = 0
+        if self.turn_starts:
+            turn_start = self.turn_starts.pop()
+            self._remove_last_turn()
+        for index in range(turn_start + 1, len(messages)):
+            if messages[index].get("actor") == "user":
+                self._add_turn(messages, turn_start, index)
+                turn_start = index
+        self._add_turn(messages, turn_start, len(messages))
+        self._indexed_messages = len(messages)
+
+    def turn_end(self, turn: int) -> int:
+        return self.turn_starts[turn + 1] if turn + 1 < len(self.turn_starts) else self._indexed_messages
+
+    def scores(self, query: str) -> List[float]:
+        """BM25 score of each turn for the query."""
+        turns = len(self._term_counts)
+        if not turns:
+            return []
+        average_length = self._total_length / turns or 1
+        weights = {}
+        for term in set(tokenize(query)):
+            frequency = self._document_frequency.get(term, 0)
+            if frequency:
+                weights[term] = math.log(1 + (turns - frequency + 0.5) / (frequency + 0.5))
+        scores = []
+        for counts, length in zip(self._term_counts, self._lengths):
+            score = 0.0
+            for term, weight in weights.items():
+                count = counts.get(term, 0)
+                if count:
+                    score += weight * count * (BM25_K1 + 1) / (
+                        count + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    )
+            scores.append(score)
+        return scores
+
+    def _add_turn(self, messages: List[Dict[str, Any]], start: int, end: int) -> None:
+        counts: Counter = Counter()
+        for message in messages[start:end]:
+            counts.update(message_words(message))
+        self.turn_starts.append(start)
+        self._term_counts.append(counts)
+        self._lengths.append(sum(counts.values()))
+        self._document_frequency.update(counts.keys())
+        self._total_length += self._lengths[-1]
+
+    def _remove_last_turn(self) -> None:
+        counts = self._term_counts.pop()
+        self._document_frequency.subtract(counts.keys())
+        self._total_length -= self._lengths.pop()
+
+
+def select_relevant_messages(
+    index: TurnIndex,
+    messages: List[Dict[str, Any]],
+    query: str,
+    top_k: int,
+    recent_turns: int,
+    keep_from: int = 0,
+    skip_before: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Picks the turns to send to the LLM, in their original order, with a note in place of each
+    run of left-out turns.
+
+    Args:
+        index: The conversation's TurnIndex (updated here with any new messages)
+        messages: All the conversation's messages
+        query: What the turns should be relevant to, e.g. the current goal and the user's latest message
+        top_k: Earlier turns to include by relevance
+        recent_turns: Most recent turns always included
+        keep_from: Index of the first message of the current goal; its turns are always included
+        skip_before: Messages before this index are left out entirely (e.g. covered by a summary)
+
+    Returns:
+        List of messages
+    """
+    index.update(messages)
+    turns = [turn for turn, start in enumerate(index.turn_starts) if start >= skip_before]
+    kept = set(turns[-recent_turns:]) if recent_turns > 0 else set()
+    kept.update(turn for turn in turns if index.turn_end(turn) > keep_from)
+    candidates = [turn for turn in turns if turn not in kept]
+    if candidates and top_k > 0:
+        scores = index.scores(query)
+        ranked = sorted(candidates, key=lambda turn: (-scores[turn], -turn))
+        kept.update(turn for turn in ranked[:top_k] if scores[turn] > 0)
+
+    selected: List[Dict[str, Any]] = []
+    omitted = 0
+    for turn in turns:
+        if turn not in kept:
+            omitted += 1
+            continue
+        if omitted:
+            selected.append(omitted_turns_note(omitted))
+            omitted = 0
+        selected.extend(messages[index.turn_starts[turn] : index.turn_end(turn)])
+    if omitted:
+        selected.append(omitted_turns_note(omitted))
+    return selected
+
+
+def omitted_turns_note(count: int) -> Dict[str, Any]:
+    return {
+        "actor": "system",
+        "response": f"[{count} earlier turn{'s' if count != 1 else ''} omitted as not relevant to the current request]",
+    }
+
+
+def goal_query(agent_goal: Any, latest_prompt: Optional[str]) -> str:
+    """Retrieval query for a goal: its short description, tool and argument names, and the user's latest message.
+    (The full description mostly repeats the tools, in wording that matches any turn.)"""
+    parts = [agent_goal.agent_friendly_description or ""]
+    for tool in agent_goal.tools:
+        parts.append(tool.name)
+        parts.extend(arg.name for arg in tool.arguments)
+    parts.append(latest_prompt or "")
+    return " ".join(parts)
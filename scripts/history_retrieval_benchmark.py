@@ -0,0 +1,152 @@
+"""
+Benchmark of the prompt size saved by retrieving only the relevant past turns (see
+prompts/turn_retrieval.py) in long multi-goal sessions.
+
+A synthetic session hops between HR, finance and ecommerce goals through ChangeGoal, as
+goal_choose_agent_type does, gathering arguments and running each goal's tools. When a new
+goal starts, the planner prompt is built with the full history and with the retrieved history;
+the report shows their estimated tokens (count_tokens), the turns kept, how many of the
+earlier turns retrieved for relevance were of a related goal (one sharing a tool with the
+current goal), and the time to select the turns with the incrementally updated index.
+
+Usage: python scripts/history_retrieval_benchmark.py [--turns 200] [--top-k 4] [--recent-turns 4]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from prompts.agent_prompt_generators import generate_genai_prompt  # noqa: E402
+from prompts.context_budget import count_tokens  # noqa: E402
+from prompts.turn_retrieval import TurnIndex, goal_query, select_relevant_messages  # noqa: E402
+from tools.goal_registry import (  # noqa: E402
+    goal_ecomm_list_orders,
+    goal_ecomm_order_status,
+    goal_fin_check_account_balances,
+    goal_fin_move_money,
+    goal_hr_check_pto,
+    goal_hr_schedule_pto,
+)
+
+GOALS = [
+    goal_hr_check_pto,
+    goal_fin_check_account_balances,
+    goal_ecomm_list_orders,
+    goal_hr_schedule_pto,
+    goal_fin_move_money,
+    goal_ecomm_order_status,
+]
+ARG_VALUES = {
+    "email": "laine@awesome.com",
+    "email_address": "matt.murdock@nelsonmurdock.com",
+    "email_address_or_account_ID": "11235",
+    "account_id": "11235",
+    "start_date": "2025-07-14",
+    "end_date": "2025-07-18",
+    "order_id": "102",
+    "tracking_id": "1Z999AA10123456784",
+    "amount": "500",
+    "accounttype": "checking",
+    "destinationaccount": "savings",
+    "userConfirmation": "yes",
+}
+
+
+class Session:
+    def __init__(self):
+        self.messages = []
+        self.turn_goals = []  # goal of each turn
+        self.goal = GOALS[0]
+        self.goal_started_at = 0
+
+    def turn(self, prompt, *replies):
+        self.turn_goals.append(self.goal)
+        self.messages.append({"actor": "user", "response": prompt})
+        self.messages.extend({"actor": actor, "response": response} for actor, response in replies)
+
+    def run_tool(self, tool, args):
+        confirm = {"next": "confirm", "tool": tool, "args": args, "response": f"Shall I run {tool}?"}
+        return [
+            ("agent", confirm),
+            ("user_confirmed_tool_run", dict(confirm, next="user_confirmed_tool_run")),
+            ("tool_result", {"tool": tool, "status": "success", "details": f"{tool} completed for {args}"}),
+            ("agent", {"next": "question", "tool": None, "args": {}, "response": f"{tool} is done. Anything else?"}),
+        ]
+
+    def work_on_goal(self):
+        for tool in self.goal.tools:
+            if tool.name == "ListAgents":
+                continue
+            self.turn(
+                f"What do you need from me for {tool.name}?",
+                ("agent", {"next": "question", "tool": tool.name, "args": {},
+                           "response": f"{tool.description} I need: {', '.join(a.name for a in tool.arguments)}"}),
+            )
+            args = {arg.name: ARG_VALUES.get(arg.name, f"some {arg.name}") for arg in tool.arguments}
+            self.turn(", ".join(f"my {name} is {value}" for name, value in args.items()), *self.run_tool(tool.name, args))
+
+    def change_goal(self, goal):
+        replies = self.run_tool("ChangeGoal", {"goalID": goal.id})
+        replies[2] = ("tool_result", {"tool": "ChangeGoal", "new_goal": goal.id})
+        # the turn asking for a goal counts as that goal's
+        self.goal = goal
+        self.turn(f"Next I'd like to do this: {goal.agent_friendly_description}", *replies)
+        self.goal_started_at = len(self.messages) - 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--recent-turns", type=int, default=4)
+    args = parser.parse_args()
+
+    session = Session()
+    checkpoints = sorted({args.turns // 4, args.turns // 2, args.turns})
+    index = TurnIndex()
+    select_seconds = []
+
+    print(f"top_k {args.top_k}, recent turns {args.recent_turns}")
+    print(
+        f"{'turns':>6}{'full (tokens)':>15}{'retrieved (tokens)':>20}{'saved':>8}"
+        f"{'turns kept':>12}{'related goal':>14}{'select (ms)':>13}"
+    )
+    goal_number = 0
+    while len(session.turn_goals) < args.turns:
+        session.work_on_goal()
+        goal_number += 1
+        session.change_goal(GOALS[goal_number % len(GOALS)])
+
+        # select after every goal, as the workflow does each turn, so the index is updated incrementally
+        latest_prompt = next(m["response"] for m in reversed(session.messages) if m["actor"] == "user")
+        query = goal_query(session.goal, latest_prompt)
+        start = time.perf_counter()
+        selected = select_relevant_messages(
+            index, session.messages, query, args.top_k, args.recent_turns, keep_from=session.goal_started_at
+        )
+        select_seconds.append(time.perf_counter() - start)
+
+        if checkpoints and len(session.turn_goals) >= checkpoints[0]:
+            checkpoints.pop(0)
+            full = generate_genai_prompt(session.goal, {"messages": session.messages}, True)
+            retrieved = generate_genai_prompt(session.goal, {"messages": selected}, True)
+            full_tokens, retrieved_tokens = count_tokens(full), count_tokens(retrieved)
+            selected_ids = {id(message) for message in selected}
+            kept = [turn for turn, start in enumerate(index.turn_starts) if id(session.messages[start]) in selected_ids]
+            # turns kept for their relevance rather than for being recent or of the current goal
+            recent_from = len(index.turn_starts) - args.recent_turns
+            earlier = [turn for turn in kept if index.turn_end(turn) <= session.goal_started_at and turn < recent_from]
+            tools = {tool.name for tool in session.goal.tools} - {"ListAgents"}
+            related = sum(1 for turn in earlier if tools & {tool.name for tool in session.turn_goals[turn].tools})
+            print(
+                f"{len(session.turn_goals):>6}{full_tokens:>15}{retrieved_tokens:>20}"
+                f"{1 - retrieved_tokens / full_tokens:>8.0%}{len(kept):>12}"
+                f"{f'{related}/{len(earlier)}':>14}{select_seconds[-1] * 1000:>13.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
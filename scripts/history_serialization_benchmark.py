@@ -0,0 +1,98 @@
+"""
+Benchmark of serializing the conversation history into prompts over a whole session, as
+json.dumps(history, indent=2) of the entire history every turn (as before) and incrementally
+(see prompts/history_serializer.py), in the indented and compact encodings.
+
+For each session length the history grows one message per turn and is serialized after every
+turn. "copies" serializes a freshly deserialized copy each turn, as the validation activity
+receives it (the copying itself isn't timed). Sizes are for the final history, with tokens
+estimated by count_tokens.
+
+Usage: python scripts/history_serialization_benchmark.py [--messages 50 250]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from prompts.context_budget import count_tokens  # noqa: E402
+from prompts.history_serializer import HistorySerializer, encode  # noqa: E402
+
+FLIGHTS = [
+    {"carrier": "Qantas", "flight_number": f"QF{100 + i}", "price": 1200 + 37 * i, "stops": i % 2, "departs": "2025-03-01T09:30"}
+    for i in range(4)
+]
+
+
+def make_message(i: int) -> dict:
+    """User prompts, agent replies and tool results in turn, shaped like the workflow's."""
+    kind = i % 3
+    if kind == 0:
+        return {"actor": "user", "response": f"Yes please, search flights for the event {i}"}
+    if kind == 1:
+        return {
+            "actor": "agent",
+            "response": {
+                "response": "I found some flights. Would you like to create an invoice for one of them?",
+                "next": "confirm",
+                "tool": "SearchFlights",
+                "args": {"origin": "SFO", "destination": "MEL", "dateDepart": "2025-03-01", "dateReturn": "2025-03-08"},
+            },
+        }
+    return {"actor": "tool_result", "response": {"tool": "SearchFlights", "results": FLIGHTS}}
+
+
+def run_session(serialize, messages: int, copies: bool) -> tuple[float, str]:
+    history = {"messages": []}
+    elapsed = 0.0
+    serialized = ""
+    for i in range(messages):
+        history["messages"].append(make_message(i))
+        turn_history = json.loads(json.dumps(history)) if copies else history
+        start = time.perf_counter()
+        serialized = serialize(turn_history)
+        elapsed += time.perf_counter() - start
+    return elapsed, serialized
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, nargs="+", default=[50, 250])
+    args = parser.parse_args()
+
+    modes = {
+        "json.dumps indent=2": (lambda: lambda history: encode(history), False),
+        "incremental indented": (lambda: HistorySerializer().serialize, False),
+        "incremental indented, copies": (lambda: HistorySerializer().serialize, True),
+        "json.dumps compact": (lambda: lambda history: encode(history, compact=True), False),
+        "incremental compact": (lambda: HistorySerializer(compact=True).serialize, False),
+        "incremental compact, copies": (lambda: HistorySerializer(compact=True).serialize, True),
+    }
+
+    for messages in args.messages:
+        print(f"\nsession of {messages} messages")
+        print(f"{'serialization':<32}{'session (ms)':>13}{'last turn (ms)':>16}{'chars':>9}{'tokens':>8}")
+        for name, (make_serializer, copies) in modes.items():
+            serialize = make_serializer()
+            session_seconds, serialized = run_session(serialize, messages, copies)
+            # time the last turn again on a warm serializer, as the next turn would see it
+            history = {"messages": [make_message(i) for i in range(messages)]}
+            serialize = make_serializer()
+            serialize({"messages": history["messages"][:-1]})
+            if copies:
+                history = json.loads(json.dumps(history))
+            start = time.perf_counter()
+            serialize(history)
+            last_turn_seconds = time.perf_counter() - start
+            print(
+                f"{name:<32}{session_seconds * 1000:>13.2f}{last_turn_seconds * 1000:>16.3f}"
+                f"{len(serialized):>9}{count_tokens(serialized):>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark of LLM provider connection reuse under parallel load, against the mock LLM server.
+
+Calls go through a TCP proxy that counts the connections opened, and are made:
+- with a new HTTP client, and so a new connection, per call
+- with blocking requests.post in a thread, as the deepseek SDK did (also capped by the
+  default thread pool size)
+- with the pooled OpenAI adapter client, with a pool smaller than the concurrency (calls
+  queue for a connection) and one sized to it (see activities/llm_providers/http_pool.py)
+
+The mock server is plain HTTP on localhost, so each new connection only costs a TCP
+handshake here; against a hosted provider every one is also a TLS handshake.
+
+Usage: python scripts/http_pool_benchmark.py [--calls 256] [--concurrency 32] [--latency fixed:0.5]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import requests
+import uvicorn
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from activities.llm_providers.openai_provider import OpenAIProvider  # noqa: E402
+from api.mock_llm_server import MockConfig, create_app  # noqa: E402
+from models.data_types import ToolPromptInput  # noqa: E402
+
+PROMPT = ToolPromptInput(prompt="next step", context_instructions="You are a helpful agent.")
+BODY = {"model": "mock", "messages": [{"role": "user", "content": PROMPT.prompt}]}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int) -> None:
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+
+
+def run_mock_server(port: int, latency: str) -> None:
+    app = create_app(MockConfig(latency=latency))
+    uvicorn.run(app, port=port, log_level="warning", backlog=4096)
+
+
+def run_counting_proxy(port: int, target_port: int, connections) -> None:
+    """Forwards TCP connections to the mock server, counting them in a shared value."""
+
+    async def pipe(reader, writer):
+        try:
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        with connections.get_lock():
+            connections.value += 1
+        upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", target_port)
+        await asyncio.gather(pipe(client_reader, upstream_writer), pipe(upstream_reader, client_writer))
+
+    async def serve():
+        server = await asyncio.start_server(handle, "127.0.0.1", port, backlog=4096)
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+async def run_calls(call, calls: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed() for _ in range(calls)))
+    return latencies, time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=32)
+    # long enough that the clients wait on the server rather than on the CPU
+    parser.add_argument("--latency", default="fixed:0.5", help="mock server latency distribution")
+    args = parser.parse_args()
+
+    # the mock server and the proxy run in their own processes so they don't compete with the clients
+    server_port, proxy_port = free_port(), free_port()
+    connections = multiprocessing.Value("i", 0)
+    processes = [
+        multiprocessing.Process(target=run_mock_server, args=(server_port, args.latency), daemon=True),
+        multiprocessing.Process(target=run_counting_proxy, args=(proxy_port, server_port, connections), daemon=True),
+    ]
+    for process in processes:
+        process.start()
+    wait_for_port(server_port)
+    wait_for_port(proxy_port)
+    base_url = f"http://127.0.0.1:{proxy_port}/v1"
+    os.environ.update(OPENAI_API_KEY="mock", OPENAI_BASE_URL=base_url)
+
+    async def post_new_client():
+        async with httpx.AsyncClient(timeout=30) as client:
+            (await client.post(f"{base_url}/chat/completions", json=BODY)).raise_for_status()
+
+    def post_blocking():
+        requests.post(f"{base_url}/chat/completions", json=BODY, timeout=30).raise_for_status()
+
+    def pooled_provider(max_connections: int):
+        os.environ["LLM_HTTP_MAX_CONNECTIONS"] = str(max_connections)
+        provider = OpenAIProvider(model="mock")
+        return lambda: provider.complete(PROMPT)
+
+    small_pool = max(1, args.concurrency // 8)
+    modes = {
+        "new client per call": post_new_client,
+        "requests.post in a thread": lambda: asyncio.to_thread(post_blocking),
+        f"pooled, {small_pool} connections": pooled_provider(small_pool),
+        f"pooled, {args.concurrency} connections": pooled_provider(args.concurrency),
+    }
+
+    print(f"{args.calls} calls, {args.concurrency} in parallel, mock latency {args.latency}")
+    print(f"{'client':<28}{'connections':>12}{'p50 (ms)':>10}{'p95 (ms)':>10}{'calls/s':>10}")
+    for name, call in modes.items():
+        connections.value = 0
+        latencies, elapsed = await run_calls(call, args.calls, args.concurrency)
+        p95 = statistics.quantiles(latencies, n=20)[-1]
+        print(
+            f"{name:<28}{connections.value:>12}{statistics.median(latencies) * 1000:>10.1f}"
+            f"{p95 * 1000:>10.1f}{args.calls / elapsed:>10.1f}"
+        )
+
+    for process in processes:
+        process.terminate()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
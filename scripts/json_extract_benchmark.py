@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of LLM reply JSON extraction: single-pass extract_json_object vs. the previous sanitize + parse.
+
+The previous implementation (ToolActivities.sanitize_json_response followed by
+parse_json_response) is reproduced below so the two can be compared on the same
+replies: clean JSON, fenced or prose-wrapped JSON, and defective JSON that the old
+code rejected (each rejection cost an activity retry).
+
+Usage: python scripts/json_extract_benchmark.py [--number 20000]
+"""
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from activities.json_repair import extract_json_object  # noqa: E402
+
+REPLY = {
+    "response": "I found 4 Wolves matches in May 2025. Which match would you like to attend?",
+    "next": "question",
+    "tool": "SearchFixtures",
+    "args": {"team": "Wolverhampton Wanderers FC", "date_from": "2025-04-15", "date_to": "2025-05-05"},
+}
+CLEAN = json.dumps(REPLY, indent=2)
+
+CASES = {
+    "clean": CLEAN,
+    "code fence": f"```json\n{CLEAN}\n```",
+    "prose around": f"Sure, here is the JSON:\n{CLEAN}\nLet me know if you need anything else.",
+    "trailing comma": CLEAN[:-2] + ",\n}",
+    "single quotes": str(REPLY),
+    "truncated": CLEAN[: CLEAN.rindex("}") - 1],
+}
+
+
+def legacy_extract(response_content: str) -> dict:
+    """ToolActivities.sanitize_json_response + parse_json_response before the single-pass extractor."""
+    start_marker = "```json"
+    end_marker = "```"
+    json_str = None
+    if start_marker in response_content and end_marker in response_content:
+        json_start = response_content.index(start_marker) + len(start_marker)
+        json_end = response_content.index(end_marker, json_start)
+        json_str = response_content[json_start:json_end].strip()
+    else:
+        json_start = response_content.find("{")
+        json_end = response_content.rfind("}")
+        if json_start != -1 and json_end != -1 and json_start < json_end:
+            json_str = response_content[json_start : json_end + 1].strip()
+    if not json_str:
+        raise ValueError("Response does not contain valid JSON.")
+    json.loads(json_str)
+    return json.loads(json_str)
+
+
+def measure(extract, text: str, number: int):
+    try:
+        extract(text)
+    except ValueError:
+        return None
+    return timeit.timeit(lambda: extract(text), number=number) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=20000, help="calls per case")
+    args = parser.parse_args()
+
+    print(f"{'case':<16}{'previous (us)':>16}{'single-pass (us)':>18}")
+    for name, text in CASES.items():
+        row = [measure(extract, text, args.number) for extract in (legacy_extract, extract_json_object)]
+        cells = ["rejected" if seconds is None else f"{seconds * 1e6:.2f}" for seconds in row]
+        print(f"{name:<16}{cells[0]:>16}{cells[1]:>18}")
+
+
+if __name__ == "__main__":
+    main()
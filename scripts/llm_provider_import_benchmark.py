@@ -0,0 +1,78 @@
+"""
+Measures worker cold-start cost of each LLM provider adapter.
+
+Every measurement runs in a fresh interpreter so module caches don't hide import
+cost. For each provider we report the wall time to import and construct the adapter
+(the same work ToolActivities does at startup) and the resulting peak RSS. The
+"all providers" row imports every SDK, which is what the worker used to do before
+providers were loaded lazily.
+
+Usage: python scripts/llm_provider_import_benchmark.py [--runs 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Runs in a child interpreter: imports the adapter(s), then reports time and peak memory.
+CHILD_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+from activities.llm_providers import PROVIDER_REGISTRY, get_provider
+names = sys.argv[1].split(",")
+for name in names:
+    get_provider(name)
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": elapsed, "max_rss_mb": rss_kb / 1024}))
+"""
+
+
+def measure(provider_names: str, runs: int) -> dict:
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT))
+    samples = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-c", CHILD_SCRIPT, provider_names],
+            cwd=REPO_ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        # adapters print status lines; the measurement is the last line
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return {
+        "seconds": statistics.median(s["seconds"] for s in samples),
+        "max_rss_mb": statistics.median(s["max_rss_mb"] for s in samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3, help="runs per provider (median is reported)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(REPO_ROOT))
+    from activities.llm_providers import PROVIDER_REGISTRY
+
+    rows = [(name, name) for name in PROVIDER_REGISTRY]
+    rows.append(("all providers", ",".join(PROVIDER_REGISTRY)))
+
+    print(f"{'provider':<16}{'import+init (s)':>18}{'peak RSS (MB)':>16}")
+    for label, names in rows:
+        try:
+            result = measure(names, args.runs)
+        except subprocess.CalledProcessError as e:
+            print(f"{label:<16}{'failed':>18}  {e.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{label:<16}{result['seconds']:>18.3f}{result['max_rss_mb']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import asyncio
-import concurrent.futures
 import os
+from datetime import timedelta
 from dotenv import load_dotenv
 import logging
 
@@ -35,7 +35,7 @@ async def main():
         print("Please wait while the model is being loaded...")
 
         # This call will load the model and measure initialization time
-        success = activities.warm_up_ollama()
+        success = await activities.warm_up_llm()
 
         if success:
             print("===========================================================")
@@ -53,23 +53,36 @@ async def main():
 
 
 
-    # Run the worker
-    with concurrent.futures.ThreadPoolExecutor(max_workers=100) as activity_executor:
-        worker = Worker(
-            client,
-            task_queue=TEMPORAL_TASK_QUEUE,
-            workflows=[AgentGoalWorkflow],
-            activities=[
-                activities.agent_validatePrompt,
-                activities.agent_toolPlanner,
-                activities.get_wf_env_vars,
-                dynamic_tool_activity,
-            ],
-            activity_executor=activity_executor,
-        )
-
-        print(f"Starting worker, connecting to task queue: {TEMPORAL_TASK_QUEUE}")
+    # Run the worker. All activities are async (LLM calls use async provider clients),
+    # so they run concurrently on the event loop and no activity thread pool is needed.
+    # Sync tool handlers are run in threads by dynamic_tool_activity so they can't block it.
+    worker = Worker(
+        client,
+        task_queue=TEMPORAL_TASK_QUEUE,
+        workflows=[AgentGoalWorkflow],
+        activities=[
+            activities.agent_validatePrompt,
+            activities.agent_toolPlanner,
+            activities.agent_summarizeHistory,
+            activities.get_wf_env_vars,
+            dynamic_tool_activity,
+        ],
+        # LLM provider connection pools are sized to this (see activities/llm_providers/http_pool.py)
+        max_concurrent_activities=int(os.environ.get("WORKER_MAX_CONCURRENT_ACTIVITIES", "100")),
+        # LLM activities heartbeat partial streamed responses; send them to the server promptly
+        # so the API's /stream-response endpoint can show them while the LLM is still generating
+        default_heartbeat_throttle_interval=timedelta(milliseconds=250),
+        max_heartbeat_throttle_interval=timedelta(milliseconds=250),
+    )
+
+    # Re-warm the model in the background if it has been idle (a no-op for hosted providers)
+    keep_warm_task = asyncio.create_task(activities.keep_llm_warm())
+
+    print(f"Starting worker, connecting to task queue: {TEMPORAL_TASK_QUEUE}")
+    try:
         await worker.run()
+    finally:
+        keep_warm_task.cancel()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,30 @@
+from activities.llm_providers.anthropic_provider import AnthropicProvider
+from models.data_types import ToolPromptInput
+from prompts.agent_prompt_generators import DYNAMIC_CONTEXT_MARKER, generate_genai_prompt
+from tools.goal_registry import goal_event_flight_invoice
+
+
+def test_only_the_static_prefix_is_marked_for_caching(monkeypatch):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    provider = AnthropicProvider()
+    history = {"messages": [{"actor": "user", "response": "I want to go to an event in Melbourne"}]}
+    context = generate_genai_prompt(goal_event_flight_invoice, history, False)
+
+    static, dynamic = provider.system_blocks(ToolPromptInput(prompt="hi", context_instructions=context))
+
+    assert static["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in dynamic
+    assert dynamic["text"].startswith(DYNAMIC_CONTEXT_MARKER)
+    assert "Melbourne" in dynamic["text"] and "The current date is" in dynamic["text"]
+    assert static["text"] + dynamic["text"] == provider.system_prompt(
+        ToolPromptInput(prompt="hi", context_instructions=context), human_readable_date=True
+    )
+
+
+def test_prompt_without_marker_is_sent_as_one_uncached_block(monkeypatch):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    provider = AnthropicProvider()
+
+    blocks = provider.system_blocks(ToolPromptInput(prompt="hi", context_instructions="Summarize this conversation"))
+
+    assert len(blocks) == 1 and "cache_control" not in blocks[0]
@@ -0,0 +1,72 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from activities.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    get_circuit_breaker,
+    reset_circuit_breakers,
+)
+from activities.llm_providers.base import LLMProvider
+from activities.tool_activities import ToolActivities
+from models.data_types import ToolPromptInput
+
+
+def test_opens_on_failure_rate_and_recovers_after_trial():
+    breaker = CircuitBreaker("test", window_size=4, min_calls=4, failure_rate_threshold=0.5, open_seconds=30)
+
+    with patch("activities.circuit_breaker.time.monotonic", return_value=100.0):
+        breaker.record_success(1.0)
+        breaker.record_success(1.0)
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert not breaker.allow_request()
+
+    # after open_seconds a single trial call is allowed through
+    with patch("activities.circuit_breaker.time.monotonic", return_value=131.0):
+        assert breaker.allow_request()
+        assert breaker.state == HALF_OPEN
+        assert not breaker.allow_request()
+        breaker.record_success(1.0)
+        assert breaker.state == CLOSED
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("test", window_size=2, min_calls=2, slow_call_seconds=5)
+    breaker.record_success(6.0)
+    breaker.record_success(7.0)
+    assert breaker.state == OPEN
+
+
+async def test_cancelled_trial_call_releases_the_half_open_trial():
+    class HangingProvider(LLMProvider):
+        name = "hanging"
+
+        async def complete(self, input, usage=None):
+            await asyncio.sleep(60)
+
+    reset_circuit_breakers()
+    activities = ToolActivities.__new__(ToolActivities)
+    activities.providers = [HangingProvider("model")]
+    activities.singleflight = activities.hedge_policy = activities.llm_call_timeout = None
+    activities.context_token_budget = None
+    activities.streaming_enabled = False
+
+    breaker = get_circuit_breaker("hanging")
+    breaker.open()
+    breaker.opened_at -= breaker.open_seconds
+    call = asyncio.create_task(activities.prompt_llm(ToolPromptInput("hi", "ctx")))
+    await asyncio.sleep(0.05)
+    assert breaker.state == HALF_OPEN and breaker.trial_in_flight
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await call
+
+    assert breaker.allow_request()
+    reset_circuit_breakers()
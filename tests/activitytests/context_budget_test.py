@@ -0,0 +1,17 @@
+from prompts.context_budget import EXAMPLE_START, HISTORY_END, HISTORY_START, count_tokens, fit_context_to_budget
+from prompts.history_serializer import encode
+
+
+def test_history_is_trimmed_before_the_cached_example():
+    messages = [{"actor": "user", "response": f"message {i} " + "words " * 50} for i in range(40)]
+    context = (
+        f"Static goal and tools.\n{EXAMPLE_START}\nagent: hello\n{'example ' * 200}END EXAMPLE\n"
+        f"{HISTORY_START}\n{encode({'messages': messages}, compact=True)}\n{HISTORY_END}"
+    )
+    budget = count_tokens(context) // 2
+
+    compacted, report = fit_context_to_budget(context, budget)
+
+    assert report.tokens_after <= budget
+    assert EXAMPLE_START in compacted
+    assert len(report.compactions) == 1 and report.compactions[0].startswith("omitted")
@@ -0,0 +1,13 @@
+import google.ai.generativelanguage as glm
+from google.generativeai.types import GenerateContentResponse
+
+from activities.llm_providers.google_provider import GoogleProvider
+
+
+def test_stream_chunks_without_text_are_skipped():
+    text = glm.GenerateContentResponse(candidates=[glm.Candidate(content=glm.Content(parts=[glm.Part(text="{}")]))])
+    blocked = glm.GenerateContentResponse(candidates=[glm.Candidate(finish_reason=glm.Candidate.FinishReason.SAFETY)])
+
+    assert GoogleProvider.chunk_text(GenerateContentResponse.from_response(text)) == "{}"
+    assert GoogleProvider.chunk_text(GenerateContentResponse.from_response(blocked)) == ""
+    assert GoogleProvider.chunk_text(GenerateContentResponse.from_response(glm.GenerateContentResponse())) == ""
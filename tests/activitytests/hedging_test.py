@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+import pytest
+
+from activities import llm_metrics
+from activities.hedging import HedgePolicy
+
+
+def reply(provider, seconds, calls, text='{"next": "question"}'):
+    async def call():
+        calls.append(provider)
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            calls.append(f"{provider} cancelled")
+            raise
+        return json.loads(text)
+
+    return call
+
+
+async def test_no_hedge_when_the_primary_is_fast():
+    llm_metrics.reset_llm_stats()
+    policy = HedgePolicy(initial_delay_seconds=0.2)
+    calls = []
+
+    result, name = await policy.run("openai", reply("openai", 0.01, calls), "anthropic", reply("anthropic", 0, calls))
+
+    assert (result, name) == ({"next": "question"}, "openai")
+    assert calls == ["openai"]
+    assert "llm_hedges_fired" not in llm_metrics.get_llm_stats()["counters"]
+    assert len(policy.tracker("openai").latencies) == 1
+
+
+async def test_hedge_fires_after_the_delay_wins_and_the_loser_is_cancelled():
+    llm_metrics.reset_llm_stats()
+    policy = HedgePolicy(initial_delay_seconds=0.05)
+    calls = []
+
+    result, name = await policy.run("openai", reply("openai", 5, calls), "anthropic", reply("anthropic", 0.01, calls))
+    await asyncio.sleep(0)
+
+    assert name == "anthropic" and result == {"next": "question"}
+    assert calls == ["openai", "anthropic", "openai cancelled"]
+    counters = llm_metrics.get_llm_stats()["counters"]
+    assert counters["llm_hedges_fired"] == 1 and counters["llm_hedges_won"] == 1
+
+
+async def test_invalid_json_falls_through_to_the_other_request():
+    policy = HedgePolicy(initial_delay_seconds=0.01)
+    calls = []
+
+    result, name = await policy.run(
+        "openai", reply("openai", 0.05, calls, text="not json"), "anthropic", reply("anthropic", 0.1, calls)
+    )
+
+    assert (result, name) == ({"next": "question"}, "anthropic")
+
+    # and the error is raised if neither request returns valid JSON
+    with pytest.raises(json.JSONDecodeError):
+        await policy.run(
+            "openai", reply("openai", 0.05, calls, text="not json"), "anthropic", reply("anthropic", 0, calls, "{")
+        )
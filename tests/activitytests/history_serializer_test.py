@@ -0,0 +1,50 @@
+import copy
+import json
+
+from prompts.context_budget import extract_history, replace_history
+from prompts.history_serializer import HistorySerializer, serialize_history
+
+
+def message(i):
+    if i % 2:
+        return {"actor": "agent", "response": {"next": "question", "response": f"Where to? ({i})", "args": {}}}
+    return {"actor": "user", "response": f"To Melbourne, café number {i}"}
+
+
+def test_incremental_serialization_matches_json_dumps():
+    serializer = HistorySerializer()
+    history = {"messages": []}
+    assert serializer.serialize(history) == json.dumps(history, indent=2)
+
+    for i in range(5):
+        history["messages"].append(message(i))
+        assert serializer.serialize(history) == json.dumps(history, indent=2)
+
+    # a message changed in place is re-encoded, not served from the cache
+    history["messages"][2]["response"] = "To Sydney instead"
+    assert serializer.serialize(history) == json.dumps(history, indent=2)
+
+    # a deserialized copy, as an activity receives it, reuses the encoded messages
+    history = copy.deepcopy(history)
+    history["messages"].append(message(5))
+    assert serializer.serialize(history) == json.dumps(history, indent=2)
+
+    # changed or dropped messages are re-encoded
+    history["messages"][1] = {"actor": "system", "response": "[summary]"}
+    del history["messages"][-1]
+    assert serializer.serialize(history) == json.dumps(history, indent=2)
+
+
+def test_compact_history_is_smaller_and_round_trips_through_context_budgeting():
+    history = {"messages": [message(i) for i in range(10)]}
+    compact = serialize_history(history, compact=True, cache_key="conversation")
+    indented = serialize_history(history, cache_key="conversation")
+
+    assert json.loads(compact) == json.loads(indented) == history
+    assert len(compact) < len(indented) * 0.7
+
+    context = f"Tools...\nBEGIN CONVERSATION HISTORY\n{compact}\nEND CONVERSATION HISTORY\nBegin."
+    assert extract_history(context) == history
+    shorter = {"messages": history["messages"][5:]}
+    # replacing the history keeps its encoding
+    assert replace_history(context, shorter) == context.replace(compact, json.dumps(shorter, separators=(",", ":")))
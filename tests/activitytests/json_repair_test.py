@@ -0,0 +1,27 @@
+import pytest
+
+from activities.json_repair import extract_json_object
+
+
+def test_extracts_object_from_fences_and_prose():
+    assert extract_json_object('```json\n{"next": "question"}\n```') == {"next": "question"}
+    assert extract_json_object('Here you go: {"next": "done", "args": {}} Thanks!') == {"next": "done", "args": {}}
+
+
+def test_repairs_common_defects():
+    assert extract_json_object('{"args": {"a": 1,}, "tool": "X",}') == {"args": {"a": 1}, "tool": "X"}
+    assert extract_json_object("{'response': 'it\\'s fine', 'tool': None}") == {"response": "it's fine", "tool": None}
+    assert extract_json_object('{"response": "two\nlines"}') == {"response": "two\nlines"}
+
+
+def test_repairs_truncated_replies():
+    assert extract_json_object('{"response": "hi", "args": {"a": 1}') == {"response": "hi", "args": {"a": 1}}
+    # a half-written value is dropped rather than returned
+    assert extract_json_object('{"response": "hi", "next": "quest') == {"response": "hi"}
+
+
+def test_rejects_unrepairable_replies():
+    with pytest.raises(ValueError):
+        extract_json_object("I can't help with that.")
+    with pytest.raises(ValueError):
+        extract_json_object("{response: hi}")
@@ -0,0 +1,73 @@
+import json
+from unittest.mock import patch
+
+from activities.json_stream import IncrementalJSONFieldParser
+from activities.llm_providers.base import LLMProvider
+from activities.tool_activities import PartialResponseHeartbeat, ToolActivities
+from models.data_types import LLMUsage, ToolPromptInput
+
+
+def test_extracts_response_field_across_chunk_boundaries():
+    reply = "Here you go:\n```json\n" + json.dumps(
+        {
+            "next": "question",
+            "args": {"response": "not this one", "dates": ["}", "{"]},
+            "response": 'Which city? "Sydney" é \U0001F600',
+            "tool": None,
+        }
+    ) + "\n```"
+
+    for chunk_size in (1, 3, 7, len(reply)):
+        parser = IncrementalJSONFieldParser("response")
+        streamed = "".join(
+            parser.feed(reply[i : i + chunk_size]) for i in range(0, len(reply), chunk_size)
+        )
+        assert streamed == 'Which city? "Sydney" é \U0001F600'
+        assert parser.field_complete
+        assert parser.object_complete
+
+
+def test_partial_value_is_available_before_object_closes():
+    parser = IncrementalJSONFieldParser("response")
+    parser.feed('{"next": "question", "response": "Hel')
+    assert parser.value == "Hel"
+    assert not parser.field_complete
+
+
+async def test_stream_is_closed_once_prose_follows_the_object():
+    closed = []
+
+    class ChattyProvider(LLMProvider):
+        async def stream(self, input, usage=None):
+            try:
+                for chunk in ('{"next": "done", ', '"response": "Bye"}', "\n```", "\nI hope"):
+                    yield chunk
+                while True:
+                    yield " this helps"
+            finally:
+                closed.append(True)
+
+    usage = LLMUsage()
+    reply = await ToolActivities.stream_provider(
+        ToolActivities.__new__(ToolActivities), ChattyProvider("model"), ToolPromptInput("bye", "ctx"), usage
+    )
+    assert json.loads(reply[: reply.index("}") + 1]) == {"next": "done", "response": "Bye"}
+    assert closed == [True]
+    assert usage.estimated and usage.input_tokens > 0 and usage.output_tokens > 0
+
+
+def test_only_one_hedged_stream_heartbeats():
+    sent = []
+    heartbeat = PartialResponseHeartbeat()
+    primary, hedge = object(), object()
+    with patch("activities.tool_activities.activity.in_activity", return_value=True), patch(
+        "activities.tool_activities.activity.heartbeat", side_effect=sent.append
+    ):
+        heartbeat.send(hedge, "Which", final=True)
+        heartbeat.send(primary, "Hello", final=True)
+        heartbeat.send(hedge, "Which city?", final=True)
+        # the stream showing its reply failed; the other one takes over
+        heartbeat.release(hedge)
+        heartbeat.send(primary, "Hello there", final=True)
+
+    assert sent == [{"partial_response": text} for text in ("Which", "Which city?", "Hello there")]
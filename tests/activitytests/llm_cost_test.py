@@ -0,0 +1,34 @@
+import pytest
+
+from activities.llm_providers.base import LLMProvider, ModelPrice
+from models.data_types import LLMUsage, LLMUsageTotals
+
+
+class PricedProvider(LLMProvider):
+    name = "priced"
+    model_prices = {
+        "model": ModelPrice(input=2.0, output=10.0),
+        "model-mini": ModelPrice(input=1.0, output=4.0, cached_input=0.25, cache_write=1.25),
+    }
+
+
+def test_cost_uses_longest_matching_prefix_and_cache_prices():
+    usage = LLMUsage(input_tokens=1_000_000, output_tokens=100_000, cached_input_tokens=600_000, cache_write_tokens=200_000)
+    assert PricedProvider("model-2").estimate_cost(usage) == pytest.approx(2.0 + 1.0)
+    # 200k uncached + 600k cached + 200k written + 100k output
+    assert PricedProvider("model-mini-1").estimate_cost(usage) == pytest.approx(0.2 + 0.15 + 0.25 + 0.4)
+    assert PricedProvider("other").estimate_cost(usage) is None
+
+
+def test_price_override_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_PRICED_PRICE_PER_MTOK", "1,2")
+    assert PricedProvider("other").estimate_cost(LLMUsage(input_tokens=1_000_000, output_tokens=1_000_000)) == 3.0
+
+
+def test_totals_count_unpriced_calls():
+    totals = LLMUsageTotals()
+    usage = {"input_tokens": 100, "output_tokens": 10, "cached_input_tokens": 50, "cache_write_tokens": 0}
+    totals.add({"usage": usage, "cost_usd": 0.5, "latency_seconds": 1.5})
+    totals.add({"usage": usage, "cost_usd": None, "latency_seconds": 0.5})
+    assert (totals.calls, totals.input_tokens, totals.cached_input_tokens) == (2, 200, 100)
+    assert (totals.cost_usd, totals.unpriced_calls, totals.latency_seconds) == (0.5, 1, 2.0)
@@ -0,0 +1,88 @@
+import pytest
+
+from activities.json_repair import extract_json_object
+from activities.llm_providers.anthropic_provider import AnthropicProvider
+from activities.llm_providers.ollama_provider import OllamaProvider
+from activities.llm_providers.openai_provider import OpenAIProvider
+from api.mock_llm_server import MockConfig, scripted_reply
+from models.data_types import LLMUsage, ToolPromptInput
+from prompts.agent_prompt_generators import generate_genai_prompt
+from tools.goal_registry import goal_event_flight_invoice
+from workflows.workflow_helpers import prompt_rolling_summary
+
+
+def planner_input(messages: list) -> ToolPromptInput:
+    return ToolPromptInput(
+        prompt="next step",
+        context_instructions=generate_genai_prompt(
+            goal_event_flight_invoice, {"messages": messages}, multi_goal_mode=False
+        ),
+    )
+
+
+def test_script_follows_the_goal_example():
+    first = scripted_reply(planner_input([]).context_instructions, "next step")
+    assert first["next"] == "question"
+
+    messages = [
+        {"actor": "user", "response": "I'd like to travel to an event"},
+        {"actor": "agent", "response": first},
+        {"actor": "user", "response": "Sydney in May please"},
+    ]
+    confirm = scripted_reply(planner_input(messages).context_instructions, "next step")
+    assert confirm["next"] == "confirm" and confirm["tool"] == "FindEvents"
+    assert confirm["args"] == {"city": "Sydney", "month": "May"}
+
+    messages.append({"actor": "user", "response": "Thanks, end the conversation"})
+    assert scripted_reply(planner_input(messages).context_instructions, "next step")["next"] == "done"
+
+
+def test_script_keeps_its_place_behind_a_rolling_summary():
+    first = scripted_reply(planner_input([]).context_instructions, "next step")
+    older = [
+        {"actor": "user", "response": "I'd like to travel to an event"},
+        {"actor": "agent", "response": first},
+    ]
+    summary = scripted_reply(*prompt_rolling_summary(None, older))["summary"]
+
+    messages = [
+        {"actor": "conversation_summary", "response": summary},
+        {"actor": "user", "response": "Sydney in May please"},
+    ]
+    confirm = scripted_reply(planner_input(messages).context_instructions, "next step")
+    assert confirm["next"] == "confirm" and confirm["tool"] == "FindEvents"
+
+
+@pytest.mark.parametrize(
+    "make_provider",
+    [
+        lambda url: OpenAIProvider(),
+        lambda url: AnthropicProvider(),
+        lambda url: OllamaProvider(model="mock", host=url),
+    ],
+    ids=["openai", "anthropic", "ollama"],
+)
+async def test_providers_talk_to_the_mock(mock_server, monkeypatch, make_provider):
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{mock_server}/v1")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "mock")
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", mock_server)
+    provider = make_provider(mock_server)
+
+    usage = LLMUsage()
+    streamed = "".join([chunk async for chunk in provider.stream(planner_input([]), usage)])
+    assert extract_json_object(streamed)["next"] == "question"
+    assert usage.input_tokens > 0 and usage.output_tokens > 0
+
+    reply = extract_json_object(await provider.complete(planner_input([])))
+    assert reply == extract_json_object(streamed)
+
+
+def test_injected_faults():
+    config = MockConfig(error_rate=0.2, rate_limit_rate=0.3, malformed_rate=0.1, seed=7)
+    faults = [config.fault() for _ in range(10000)]
+    assert abs(faults.count("error") / 10000 - 0.2) < 0.02
+    assert abs(faults.count("rate_limit") / 10000 - 0.3) < 0.02
+    assert abs(faults.count("malformed") / 10000 - 0.1) < 0.02
+    with pytest.raises(ValueError):
+        MockConfig(latency="poisson:1")
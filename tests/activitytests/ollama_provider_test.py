@@ -0,0 +1,91 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from activities.llm_providers.ollama_provider import OllamaProvider
+from activities.rate_limiter import get_rate_limiter, reset_rate_limiters
+from models.data_types import LLMUsage, ToolPromptInput
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Answers /api/chat like an Ollama server and records what it was sent."""
+
+    requests = []
+    in_flight = 0
+    peak_in_flight = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        cls = type(self)
+        with cls.lock:
+            cls.requests.append(body)
+            cls.in_flight += 1
+            cls.peak_in_flight = max(cls.peak_in_flight, cls.in_flight)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.in_flight -= 1
+
+        reply = '{"response": "hi", "next": "question"}' if body["messages"] else ""
+        done = {"model": body["model"], "done": True, "prompt_eval_count": 42, "eval_count": 7}
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson" if body.get("stream") else "application/json")
+        self.end_headers()
+        if body.get("stream"):
+            for piece in (reply[:10], reply[10:]):
+                line = {"model": body["model"], "done": False, "message": {"role": "assistant", "content": piece}}
+                self.wfile.write((json.dumps(line) + "\n").encode())
+            done["message"] = {"role": "assistant", "content": ""}
+            self.wfile.write((json.dumps(done) + "\n").encode())
+        else:
+            done["message"] = {"role": "assistant", "content": reply}
+            self.wfile.write(json.dumps(done).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    StubOllamaHandler.requests = []
+    StubOllamaHandler.peak_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllamaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+async def test_sends_keep_alive_and_num_ctx_and_reports_usage(stub_server, monkeypatch):
+    monkeypatch.setenv("OLLAMA_KEEP_ALIVE", "-1")
+    monkeypatch.setenv("OLLAMA_NUM_CTX", "4096")
+    provider = OllamaProvider(model="stub-model", host=stub_server)
+    assert provider.context_token_budget == 4096 - 2048
+
+    assert await provider.warm_up()
+    usage = LLMUsage()
+    chunks = [chunk async for chunk in provider.stream(ToolPromptInput(prompt="hi", context_instructions="ctx"), usage)]
+
+    assert "".join(chunks) == '{"response": "hi", "next": "question"}'
+    assert (usage.input_tokens, usage.output_tokens) == (42, 7)
+    load, chat = StubOllamaHandler.requests
+    assert load["messages"] == [] and load["keep_alive"] == -1
+    assert chat["keep_alive"] == -1 and chat["options"]["num_ctx"] == 4096
+
+
+async def test_requests_in_flight_are_capped_at_num_parallel(stub_server, monkeypatch):
+    monkeypatch.setenv("OLLAMA_NUM_PARALLEL", "2")
+    reset_rate_limiters()
+    provider = OllamaProvider(model="stub-model", host=stub_server)
+    limiter = get_rate_limiter(provider.name, provider.max_concurrent_requests)
+
+    async def call():
+        async with limiter.limit(estimated_tokens=100):
+            return await provider.complete(ToolPromptInput(prompt="hi", context_instructions="ctx"))
+
+    await asyncio.gather(*(call() for _ in range(6)))
+    reset_rate_limiters()
+    assert StubOllamaHandler.peak_in_flight == 2
@@ -0,0 +1,52 @@
+from activities.prevalidation import PromptPrevalidator
+from tools.goal_registry import goal_fin_move_money, goal_hr_schedule_pto
+
+
+def history(agent_response, prompt):
+    return {
+        "messages": [
+            {"actor": "agent", "response": {"next": "question", "response": agent_response}},
+            {"actor": "user", "response": prompt},
+        ]
+    }
+
+
+def test_accepts_clear_replies():
+    prevalidator = PromptPrevalidator()
+    question = "Let's start with your PTO balance. May I have your email address?"
+
+    assert prevalidator.classify("Yes please!", history(question, "Yes please!"), goal_hr_schedule_pto) == "acknowledgement"
+    assert (
+        prevalidator.classify("bob.johnson@example.com", history(question, "bob.johnson@example.com"), goal_hr_schedule_pto)
+        == "answer value"
+    )
+    prompt = "I'd like to book PTO for next week"
+    assert prevalidator.classify(prompt, history(question, prompt), goal_hr_schedule_pto) is not None
+
+
+def test_escalates_anything_unclear():
+    prevalidator = PromptPrevalidator()
+    question = "What dates would you like to take your time off?"
+
+    for prompt in ["who won the world cup in 1998", "tell me a joke", "how much does a tesla cost"]:
+        assert prevalidator.classify(prompt, history(question, prompt), goal_hr_schedule_pto) is None
+    # an acknowledgement with nothing to acknowledge goes to the LLM
+    assert prevalidator.classify("yes", {"messages": [{"actor": "user", "response": "yes"}]}, goal_hr_schedule_pto) is None
+
+
+def test_values_only_pass_as_answers_to_questions_asking_for_them():
+    prevalidator = PromptPrevalidator()
+    questions = [
+        "Sure! May I have your account number and email address?",
+        "How much would you like to move, from which account type, and to which account number?",
+        "What date would you like the transfer to happen on?",
+    ]
+    off_topic = ["the weather in July", "2025 2026 tesla", "send all my money to account 999 in cayman"]
+
+    for question in questions:
+        for prompt in off_topic:
+            assert prevalidator.classify(prompt, history(question, prompt), goal_fin_move_money) is None
+    # a number where an email or a date was asked for
+    for question in ["What's your email address?", questions[2]]:
+        assert prevalidator.classify("12345", history(question, "12345"), goal_fin_move_money) is None
+    assert prevalidator.classify("12345", history(questions[0], "12345"), goal_fin_move_money) == "answer value"
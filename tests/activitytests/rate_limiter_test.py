@@ -0,0 +1,108 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from activities.llm_providers.base import LLMProvider
+from activities.rate_limiter import (
+    ProviderRateLimiter,
+    RateLimitWaitTooLong,
+    SQLiteRateLimitBackend,
+    TokenBucket,
+    get_rate_limit_backend,
+    get_rate_limiter,
+    reset_rate_limiters,
+)
+
+
+class RateLimitError(Exception):
+    def __init__(self, headers):
+        self.response = SimpleNamespace(status_code=429, headers=headers)
+
+
+def test_token_bucket_reports_wait_until_capacity():
+    bucket = TokenBucket(rate_per_minute=60)
+    assert bucket.try_acquire(60) == 0.0
+    assert 0.9 < bucket.try_acquire(1) <= 1.0
+    # usage reported later than estimated is returned to the bucket
+    bucket.adjust(-30)
+    assert bucket.try_acquire(20) == 0.0
+
+
+async def test_limits_calls_in_flight():
+    limiter = ProviderRateLimiter("test", max_concurrent=2)
+    in_flight = 0
+    peak = 0
+
+    async def call():
+        nonlocal in_flight, peak
+        async with limiter.limit(estimated_tokens=100):
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    await asyncio.gather(*(call() for _ in range(6)))
+    assert peak == 2
+
+
+async def test_waits_are_capped_by_the_time_left():
+    limiter = ProviderRateLimiter("test", requests_per_minute=60, max_retry_wait_seconds=10)
+    for _ in range(60):
+        async with limiter.limit(estimated_tokens=100):
+            pass
+    # the bucket refills in a second; fine with 10s to spare, not with half a second
+    with pytest.raises(RateLimitWaitTooLong):
+        async with limiter.limit(estimated_tokens=100, max_wait=0.5):
+            pass
+    assert not limiter.should_retry(0, pause_seconds=5, time_left=4)
+    assert limiter.should_retry(0, pause_seconds=5, time_left=15)
+
+
+def test_reads_retry_after_from_rate_limit_errors():
+    provider = LLMProvider()
+    assert provider.rate_limit_retry_after(RateLimitError({"retry-after": "7"})) == 7.0
+    assert provider.rate_limit_retry_after(RateLimitError({"retry-after-ms": "1500"})) == 1.5
+    assert provider.rate_limit_retry_after(RateLimitError({})) == 0.0
+    assert provider.rate_limit_retry_after(ValueError("not a rate limit")) is None
+
+
+def test_sqlite_backend_shares_buckets_and_pauses_between_processes(tmp_path):
+    # two backends on the same file stand in for two worker processes
+    path = str(tmp_path / "limits.sqlite")
+    first, second = SQLiteRateLimitBackend(path), SQLiteRateLimitBackend(path)
+    demands = {"openai:requests": (2, 1)}
+
+    assert first.acquire("openai", demands) == 0.0
+    assert second.acquire("openai", demands) == 0.0
+    assert first.acquire("openai", demands) > 0
+
+    second.pause("other", 5)
+    assert 4 < first.acquire("other", {}) <= 5
+
+
+def test_limiters_use_the_backend_opened_at_startup(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_RATE_LIMIT_DB_PATH", str(tmp_path / "limits.sqlite"))
+    reset_rate_limiters()
+    try:
+        backend = get_rate_limit_backend()
+        assert isinstance(backend, SQLiteRateLimitBackend)
+        assert get_rate_limiter("openai").backend is backend
+        assert get_rate_limiter("anthropic").backend is backend
+    finally:
+        reset_rate_limiters()
+
+
+def acquire_all(path, attempts):
+    """Takes what it can from a 10 requests/minute bucket, from its own process and connection."""
+    backend = SQLiteRateLimitBackend(path)
+    return sum(backend.acquire("openai", {"openai:requests": (10, 1)}) == 0.0 for _ in range(attempts))
+
+
+def test_sqlite_backend_never_grants_more_than_capacity_across_processes(tmp_path):
+    path = str(tmp_path / "limits.sqlite")
+    SQLiteRateLimitBackend(path)  # create the tables before the workers race
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        granted = list(pool.map(acquire_all, [path] * 4, [8] * 4))
+    assert sum(granted) == 10
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from activities import llm_metrics
+from activities.singleflight import SingleFlight, request_key
+
+
+async def test_identical_requests_share_one_call():
+    llm_metrics.reset_llm_stats()
+    singleflight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"next": "question", "llm_metadata": {}}
+
+    key = request_key("openai", "gpt-4o", "context", "prompt")
+    results = await asyncio.gather(*(singleflight.do(key, fetch) for _ in range(3)))
+
+    assert len(calls) == 1
+    assert [coalesced for _, coalesced in results] == [False, True, True]
+    assert results[0][0] == results[1][0] and results[0][0] is not results[1][0]
+    assert llm_metrics.get_llm_stats()["counters"]["llm_singleflight_coalesced"] == 2
+    assert singleflight.in_flight() == 0
+
+    # nothing is cached once the call is done
+    await singleflight.do(key, fetch)
+    assert len(calls) == 2
+
+
+async def test_cancelled_caller_does_not_cancel_the_call_for_others():
+    singleflight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return "reply"
+
+    first = asyncio.create_task(singleflight.do("key", fetch))
+    second = asyncio.create_task(singleflight.do("key", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+
+    assert await second == ("reply", True)
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+async def test_errors_are_shared():
+    singleflight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("Response does not contain valid JSON.")
+
+    results = await asyncio.gather(*(singleflight.do("key", fetch) for _ in range(2)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
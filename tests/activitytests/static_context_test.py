@@ -0,0 +1,48 @@
+import dataclasses
+
+from prompts.agent_prompt_generators import (
+    DYNAMIC_CONTEXT_MARKER,
+    generate_genai_prompt,
+    generate_static_context,
+    split_static_context,
+)
+from tools.goal_registry import goal_hr_schedule_pto, goal_list
+
+HISTORY = {"messages": [{"actor": "user", "response": "I'd like to book PTO"}]}
+
+
+def test_static_context_is_the_prompt_prefix():
+    prompt = generate_genai_prompt(goal_hr_schedule_pto, HISTORY, False)
+
+    static, dynamic = split_static_context(prompt)
+    assert dynamic.startswith(DYNAMIC_CONTEXT_MARKER)
+    assert generate_static_context(goal_hr_schedule_pto) == static
+
+
+def test_changed_goal_definition_changes_static_context():
+    before = generate_static_context(goal_hr_schedule_pto)
+    changed = dataclasses.replace(goal_hr_schedule_pto, description="Help the user book time off.")
+
+    after = generate_static_context(changed)
+    assert after != before
+    assert "Goal: Help the user book time off." in after
+    assert generate_genai_prompt(changed, HISTORY, False).startswith(after)
+
+
+def test_static_prefix_is_byte_identical_across_turns_for_every_goal():
+    turns = [
+        HISTORY,
+        {"messages": HISTORY["messages"] + [{"actor": "agent", "response": {"response": "Sure, when?"}}]},
+    ]
+    for goal in goal_list:
+        prefixes = set()
+        for history in turns:
+            static, dynamic = split_static_context(generate_genai_prompt(goal, history, False))
+            assert static.endswith("\n") and dynamic.startswith(DYNAMIC_CONTEXT_MARKER)
+            assert "I'd like to book PTO" not in static
+            prefixes.add(static.encode("utf-8"))
+        assert len(prefixes) == 1, goal.id
+
+
+def test_prompt_without_marker_is_all_dynamic():
+    assert split_static_context("Summarize this conversation") == ("", "Summarize this conversation")
@@ -0,0 +1,97 @@
+import copy
+import json
+
+from prompts.tool_result_compaction import TOOL_RESULT_RULES, compact_tool_result
+from tools.ecommerce.list_orders import list_orders
+from tools.find_events import find_events
+from tools.goal_registry import goal_list
+from tools.list_agents import list_agents
+from tools.search_fixtures import search_fixtures_example
+from tools.search_flights import search_flights
+
+
+def test_projects_and_truncates_listed_records():
+    result = {
+        "currency": "USD",
+        "results": [
+            {"operating_carrier": "Qantas", "outbound_flight_code": f"QF{i}", "price": 1000 + i, "seats": ["..."] * 50}
+            for i in range(10)
+        ],
+        "tool": "SearchFlights",
+    }
+    original = copy.deepcopy(result)
+
+    compacted = compact_tool_result("SearchFlights", result, result_ref=3)
+
+    assert result == original
+    assert compacted["results"][0] == {"operating_carrier": "Qantas", "outbound_flight_code": "QF0", "price": 1000}
+    assert len(compacted["results"]) == 6 and compacted["results_omitted"] == 4
+    assert compacted["currency"] == "USD" and compacted["tool"] == "SearchFlights"
+    assert compacted["result_ref"] == 3
+
+
+def test_small_results_are_left_alone_and_big_ones_capped():
+    change_goal = {"new_goal": "goal_hr_check_pto", "tool": "ChangeGoal"}
+    assert compact_tool_result("ChangeGoal", change_goal, result_ref=0) is change_goal
+
+    events = dict(find_events({"city": "Melbourne", "month": "April"}), tool="FindEvents")
+    compacted = compact_tool_result("FindEvents", events, result_ref=1)
+    assert all(len(event["description"]) <= 163 for event in compacted["events"])
+    assert all(event["month"] for event in compacted["events"])
+
+    huge = {"tool": "CheckPayBankStatus", "log": "x" * 10000}
+    capped = compact_tool_result("CheckPayBankStatus", huge, result_ref=2)
+    assert len(json.dumps(capped)) < 2200 and capped["result_ref"] == 2
+
+
+# each rule's tool with real arguments, the goal's next tool, and which of the next tool's arguments
+# come from which field of the listed records
+NEXT_TOOL_ARGUMENTS = {
+    "FindEvents": (
+        find_events,
+        {"city": "Melbourne", "month": "April"},
+        "SearchFlights",
+        {"destination": ("events", "city"), "dateDepart": ("events", "dateFrom"), "dateReturn": ("events", "dateTo")},
+    ),
+    "SearchFlights": (
+        search_flights,
+        {"origin": "San Francisco", "destination": "Melbourne"},
+        "CreateInvoice",
+        {"amount": ("results", "price"), "tripDetails": ("results", "outbound_flight_code")},
+    ),
+    "SearchFixtures": (
+        search_fixtures_example,
+        {"team": "Wolverhampton Wanderers FC", "date_from": "2025-04-01", "date_to": "2025-05-31"},
+        "SearchTrains",
+        {"destination": ("fixtures", "homeTeam"), "outbound_time": ("fixtures", "date")},
+    ),
+    "ListOrders": (
+        list_orders,
+        {"email_address": "heisenberg@blue-meth.com"},
+        "TrackPackage",
+        {"tracking_id": ("orders", "tracking_id")},
+    ),
+    "ListAgents": (list_agents, {}, "ChangeGoal", {"goalID": ("agents", "goal_id")}),
+}
+
+
+def test_compaction_keeps_the_next_tools_arguments():
+    assert set(NEXT_TOOL_ARGUMENTS) == set(TOOL_RESULT_RULES)
+    tool_arguments = {
+        tool.name: {argument.name for argument in tool.arguments}
+        for goal in goal_list
+        for tool in goal.tools
+    }
+
+    for tool, (handler, args, next_tool, sources) in NEXT_TOOL_ARGUMENTS.items():
+        result = dict(handler(args), tool=tool)
+        compacted = compact_tool_result(tool, result, result_ref=0)
+
+        assert set(sources) <= tool_arguments[next_tool]
+        for argument, (records, field_name) in sources.items():
+            kept = len(compacted[records])
+            assert kept > 0, tool
+            expected = [record.get(field_name) for record in result[records][:kept]]
+            assert [record.get(field_name) for record in compacted[records]] == expected, (tool, argument)
+        if tool == "ListOrders":
+            assert {"tracking_id": "USPS12345", "last_update": "2025-04-06"}.items() <= compacted["orders"][0].items()
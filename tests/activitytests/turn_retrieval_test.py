@@ -0,0 +1,38 @@
+from prompts.turn_retrieval import TurnIndex, goal_query, select_relevant_messages
+from tools.goal_registry import goal_fin_check_account_balances
+
+
+def turn(prompt, reply):
+    return [{"actor": "user", "response": prompt}, {"actor": "agent", "response": {"next": "question", "response": reply}}]
+
+
+def test_incremental_index_matches_a_fresh_one():
+    messages = []
+    incremental = TurnIndex()
+    for i in range(6):
+        messages.extend(turn(f"prompt {i} about topic{i % 3}", f"reply {i}"))
+        incremental.update(messages[:-1])
+        incremental.update(messages)
+
+    fresh = TurnIndex()
+    fresh.update(messages)
+    assert incremental.turn_starts == fresh.turn_starts == [0, 2, 4, 6, 8, 10]
+    assert incremental.scores("topic1 reply") == fresh.scores("topic1 reply")
+
+
+def test_keeps_recent_current_goal_and_relevant_turns():
+    messages = (
+        turn("My email is laine@awesome.com", "Your PTO balance is 10 days")  # relevant: the account check needs the email
+        + turn("Can you list my orders?", "You have 3 orders")
+        + turn("Track order 102", "It's out for delivery")
+        + turn("Now check my account balance", "What's your account ID?")  # the current goal starts here
+        + turn("11235", "Thanks")
+    )
+    index = TurnIndex()
+    query = goal_query(goal_fin_check_account_balances, "11235")
+
+    selected = select_relevant_messages(index, messages, query, top_k=1, recent_turns=1, keep_from=6)
+
+    assert selected == messages[:2] + [
+        {"actor": "system", "response": "[2 earlier turns omitted as not relevant to the current request]"}
+    ] + messages[6:]
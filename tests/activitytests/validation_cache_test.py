@@ -0,0 +1,60 @@
+from activities.validation_cache import ValidationCache
+
+ACCEPTED = {"validationResult": True, "validationFailedReason": {}}
+
+
+async def test_least_recently_used_entry_is_evicted():
+    cache = ValidationCache(max_entries=2)
+    await cache.set("a", ACCEPTED)
+    await cache.set("b", ACCEPTED)
+    assert await cache.get("a") == ACCEPTED
+
+    await cache.set("c", ACCEPTED)
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == ACCEPTED and await cache.get("c") == ACCEPTED
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 2
+
+
+async def test_expired_entries_are_dropped(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("activities.validation_cache.time.time", lambda: now[0])
+    cache = ValidationCache(ttl_seconds=60, db_path=str(tmp_path / "cache.db"))
+    await cache.set("a", ACCEPTED)
+
+    now[0] += 61
+
+    assert await cache.get("a") is None
+    assert cache.stats()["size"] == 0
+    assert cache.db_get("a") is None
+
+
+async def test_entries_are_reloaded_from_sqlite(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    first = ValidationCache(max_entries=2, db_path=db_path)
+    first.PRUNE_INTERVAL = 1
+    for key in ("a", "b", "c"):
+        await first.set(key, dict(ACCEPTED, key=key))
+
+    restarted = ValidationCache(max_entries=2, db_path=db_path)
+
+    assert await restarted.get("c") == dict(ACCEPTED, key="c")
+    # pruned down to max_entries in the file as well
+    assert first.db.execute("SELECT COUNT(*) FROM validation_cache").fetchone()[0] == 2
+
+
+def test_key_normalizes_the_prompt_and_uses_the_history_window():
+    cache = ValidationCache(history_window=2)
+    earlier = [{"actor": "user", "response": "hi"}, {"actor": "agent", "response": "Which city?"}]
+    history = {"messages": earlier + [{"actor": "agent", "response": "Confirm?"}]}
+
+    key = cache.make_key("goal_event_flight_invoice", "Yes!", history)
+
+    assert key == cache.make_key("goal_event_flight_invoice", "  yes ", history)
+    # the raw prompt the workflow already recorded isn't part of the window
+    recorded = {"messages": history["messages"] + [{"actor": "user", "response": "Yes!"}]}
+    assert key == cache.make_key("goal_event_flight_invoice", "Yes!", recorded)
+    # only the last history_window messages count
+    assert key == cache.make_key("goal_event_flight_invoice", "yes", {"messages": history["messages"][1:]})
+    assert key != cache.make_key("goal_event_flight_invoice", "yes", {"messages": earlier})
+    assert key != cache.make_key("goal_hr_check_pto", "yes", history)
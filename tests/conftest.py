@@ -1,13 +1,19 @@
 import asyncio
 import multiprocessing
+import socket
 import sys
-from typing import AsyncGenerator
+import threading
+import time
+from typing import AsyncGenerator, Iterator
 
 import pytest
 import pytest_asyncio
+import uvicorn
 from temporalio.client import Client
 from temporalio.testing import WorkflowEnvironment
 
+from api.mock_llm_server import MockConfig, create_app
+
 # Due to https://github.com/python/cpython/issues/77906, multiprocessing on
 # macOS starting with Python 3.8 has changed from "fork" to "spawn". For
 # pre-3.8, we are changing it for them.
@@ -53,3 +59,21 @@ async def env(request) -> AsyncGenerator[WorkflowEnvironment, None]:
 @pytest_asyncio.fixture
 async def client(env: WorkflowEnvironment) -> Client:
     return env.client
+
+
+@pytest.fixture(scope="session")
+def mock_server() -> Iterator[str]:
+    """Runs the mock LLM server (api/mock_llm_server.py) on a free port and yields its URL."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(create_app(MockConfig(latency="fixed:0.01", seed=1)), port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join()
@@ -1,80 +1,67 @@
+import uuid
+
 from temporalio.client import Client, WorkflowExecutionStatus
 from temporalio.worker import Worker
-import concurrent.futures
-from temporalio.testing import WorkflowEnvironment
 from api.main import get_initial_agent_goal
 from models.data_types import AgentGoalWorkflowParams, CombinedInput
 from workflows.agent_goal_workflow import AgentGoalWorkflow
 from activities.tool_activities import ToolActivities, dynamic_tool_activity
-from unittest.mock import patch
-from dotenv import load_dotenv
-import os
-from contextlib import contextmanager
-
-
-@contextmanager
-def my_context():
-    print("Setup")
-    yield "some_value"  # Value assigned to 'as' variable
-    print("Cleanup")
-
-
 
-async def test_flight_booking(client: Client):
 
-    #load_dotenv("test_flights_single.env")
-    
-    with my_context() as value:
-        print(f"Working with {value}")
-    
-        
-        # Create the test environment
-        #env = await WorkflowEnvironment.start_local()
-        #client = env.client
-        task_queue_name = "agent-ai-workflow"
-        workflow_id = "agent-workflow"
+async def test_flight_booking(client: Client, mock_server: str, monkeypatch):
+    # talk to the mock LLM server (api/mock_llm_server.py) instead of a live provider
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{mock_server}/v1")
+    monkeypatch.setenv("LLM_PROVIDER_FALLBACKS", "")
+    monkeypatch.setenv("LLM_HEDGE_ENABLED", "false")
+    # summarize history early so the rolling summary activity runs too
+    monkeypatch.setenv("ROLLING_SUMMARY_TURNS", "1")
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=100) as activity_executor:        
-            worker = Worker(
-                client, 
-                task_queue=task_queue_name,
-                workflows=[AgentGoalWorkflow],
-                activities=[ToolActivities.agent_validatePrompt, ToolActivities.agent_toolPlanner, ToolActivities.get_wf_env_vars, dynamic_tool_activity],
-                activity_executor=activity_executor,
-            )
+    task_queue_name = "agent-ai-workflow"
+    workflow_id = f"agent-workflow-{uuid.uuid4()}"
 
-            async with worker:                 
-                initial_agent_goal = get_initial_agent_goal()
-                # Create combined input
-                combined_input = CombinedInput(
-                    tool_params=AgentGoalWorkflowParams(None, None),
-                    agent_goal=initial_agent_goal,
-                )
+    # every activity the workflow can call, as registered in scripts/run_worker.py
+    activities = ToolActivities()
+    worker = Worker(
+        client,
+        task_queue=task_queue_name,
+        workflows=[AgentGoalWorkflow],
+        activities=[
+            activities.agent_validatePrompt,
+            activities.agent_toolPlanner,
+            activities.agent_summarizeHistory,
+            activities.get_wf_env_vars,
+            dynamic_tool_activity,
+        ],
+    )
 
-                prompt="Hello!"
+    async with worker:
+        initial_agent_goal = get_initial_agent_goal()
+        # Create combined input
+        combined_input = CombinedInput(
+            tool_params=AgentGoalWorkflowParams(None, None),
+            agent_goal=initial_agent_goal,
+        )
 
-                #async with Worker(client, task_queue=task_queue_name, workflows=[AgentGoalWorkflow], activities=[ToolActivities.agent_validatePrompt, ToolActivities.agent_toolPlanner, dynamic_tool_activity]):
+        prompt = "Hello!"
 
-                # todo set goal categories for scenarios
-                handle = await client.start_workflow(
-                    AgentGoalWorkflow.run,
-                    combined_input,
-                    id=workflow_id, 
-                    task_queue=task_queue_name,
-                    start_signal="user_prompt",
-                    start_signal_args=[prompt],
-                )
-                # todo send signals to simulate user input
-                # await handle.signal(AgentGoalWorkflow.user_prompt, "book flights") # for multi-goal
-                await handle.signal(AgentGoalWorkflow.user_prompt, "sydney in september")
-                assert WorkflowExecutionStatus.RUNNING == (await handle.describe()).status
+        # todo set goal categories for scenarios
+        handle = await client.start_workflow(
+            AgentGoalWorkflow.run,
+            combined_input,
+            id=workflow_id,
+            task_queue=task_queue_name,
+            start_signal="user_prompt",
+            start_signal_args=[prompt],
+        )
+        # todo send signals to simulate user input
+        # await handle.signal(AgentGoalWorkflow.user_prompt, "book flights") # for multi-goal
+        await handle.signal(AgentGoalWorkflow.user_prompt, "sydney in september")
+        assert WorkflowExecutionStatus.RUNNING == (await handle.describe()).status
 
-                
-                #assert ["Hello, user1", "Hello, user2"] == await handle.result()
-                await handle.signal(AgentGoalWorkflow.user_prompt, "I'm all set, end conversation")
-                
-                #assert WorkflowExecutionStatus.COMPLETED == (await handle.describe()).status
+        await handle.signal(AgentGoalWorkflow.user_prompt, "I'm all set, end conversation")
 
-                result = await handle.result()
-                #todo dump workflow history for analysis optional
-                #todo assert result is good
\ No newline at end of file
+        result = await handle.result()
+        assert WorkflowExecutionStatus.COMPLETED == (await handle.describe()).status
+        assert "end conversation" in result
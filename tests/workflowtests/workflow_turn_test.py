@@ -0,0 +1,159 @@
+"""Turn handling of AgentGoalWorkflow that doesn't need a Temporal server: the workflow's
+helper methods are called directly, with activity handles replaced by futures."""
+import asyncio
+import logging
+
+import pytest
+from temporalio import workflow
+
+from models.data_types import ValidationResult
+from prompts.agent_prompt_generators import (
+    INVALID_PROMPT_NEXT,
+    generate_genai_prompt,
+    generate_missing_args_prompt,
+    generate_tool_completion_prompt,
+    split_static_context,
+)
+from tools.goal_registry import goal_event_flight_invoice
+from workflows.agent_goal_workflow import AgentGoalWorkflow
+
+
+@pytest.fixture
+def agent_workflow(monkeypatch) -> AgentGoalWorkflow:
+    # workflow.logger only works inside a running workflow
+    monkeypatch.setattr(workflow, "logger", logging.getLogger("agent_goal_workflow"))
+    agent_workflow = AgentGoalWorkflow()
+    agent_workflow.goal = goal_event_flight_invoice
+    return agent_workflow
+
+
+def test_validate_and_plan_prompt_asks_for_invalid_prompt_after_the_static_prefix():
+    history = {"messages": [{"actor": "user", "response": "purple monkey dishwasher"}]}
+
+    combined = generate_genai_prompt(goal_event_flight_invoice, history, False, validate_user_prompt=True)
+    plan_only = generate_genai_prompt(goal_event_flight_invoice, history, False)
+
+    assert f"next='{INVALID_PROMPT_NEXT}'" in combined and INVALID_PROMPT_NEXT not in plan_only
+    assert split_static_context(combined)[0] == split_static_context(plan_only)[0]
+
+
+def test_rejected_prompt_is_answered_as_a_question(agent_workflow):
+    agent_workflow.add_message("user", "purple monkey dishwasher")
+    rejected = {"next": INVALID_PROMPT_NEXT, "tool": None, "args": {}, "response": "Which city's events?"}
+
+    assert agent_workflow.reply_to_rejected_prompt(rejected)
+    assert agent_workflow.conversation_history["messages"][-1] == {
+        "actor": "agent",
+        "response": {"next": "question", "response": "Which city's events?"},
+    }
+
+    planned = {"next": "confirm", "tool": "FindEvents", "args": {"city": "Melbourne"}, "response": "..."}
+    assert not agent_workflow.reply_to_rejected_prompt(planned)
+    assert len(agent_workflow.conversation_history["messages"]) == 2
+
+
+def test_tool_completion_prompts_bypass_validation(agent_workflow):
+    tool_data = {"next": "confirm", "tool": "SearchFlights", "response": "Where from?"}
+
+    assert agent_workflow.is_user_prompt("sydney in september")
+    assert not agent_workflow.is_user_prompt(generate_tool_completion_prompt("FindEvents", {"events": []}))
+    assert not agent_workflow.is_user_prompt(generate_missing_args_prompt("SearchFlights", tool_data, ["origin"]))
+
+
+PLANNER_METADATA = {
+    "provider": "openai",
+    "model": "gpt-4o",
+    "usage": {"input_tokens": 900, "output_tokens": 60, "cached_input_tokens": 0, "cache_write_tokens": 0},
+    "cost_usd": 0.003,
+    "latency_seconds": 1.5,
+}
+
+
+async def test_answered_speculative_plan_is_discarded_and_its_usage_recorded(agent_workflow):
+    agent_workflow.add_message("user", "purple monkey dishwasher")
+    plan = asyncio.get_running_loop().create_future()
+    plan.set_result({"next": "question", "response": "...", "llm_metadata": PLANNER_METADATA})
+
+    agent_workflow.discard_speculative_plan(plan)
+
+    assert agent_workflow.speculation_stats == {
+        "used": 0,
+        "discarded": 1,
+        "cancelled": 0,
+        "latency_saved_seconds": 0.0,
+    }
+    assert agent_workflow.llm_usage.calls == 1 and agent_workflow.llm_usage.input_tokens == 900
+    assert agent_workflow.llm_usage_by_turn[-1]["calls"][0]["call"] == "planner (discarded)"
+
+
+async def test_failed_validation_cancels_a_running_speculative_plan(agent_workflow):
+    running = asyncio.get_running_loop().create_future()
+    failed = asyncio.get_running_loop().create_future()
+    failed.set_exception(RuntimeError("planner failed"))
+    reason = {"next": "question", "response": "Please tell me which city."}
+
+    agent_workflow.reply_to_failed_validation(ValidationResult(False, reason), running)
+    agent_workflow.discard_speculative_plan(failed)
+
+    assert running.cancelled()
+    assert agent_workflow.conversation_history["messages"] == [{"actor": "agent", "response": reason}]
+    assert agent_workflow.speculation_stats["cancelled"] == 2
+    assert agent_workflow.speculation_stats["discarded"] == 0
+    assert agent_workflow.llm_usage.calls == 0
+
+
+def test_used_speculative_plan_saves_the_shorter_call(agent_workflow):
+    agent_workflow.record_speculative_plan_used(0.8, PLANNER_METADATA)
+    agent_workflow.record_speculative_plan_used(2.0, PLANNER_METADATA)
+
+    assert agent_workflow.speculation_stats["used"] == 2
+    assert agent_workflow.speculation_stats["latency_saved_seconds"] == pytest.approx(0.8 + 1.5)
+
+
+def conversation(turns):
+    messages = []
+    for turn in range(turns):
+        messages.append({"actor": "user", "response": f"prompt {turn}"})
+        messages.append({"actor": "agent", "response": {"next": "question", "response": f"reply {turn}"}})
+    return {"messages": messages}
+
+
+def test_prompt_history_splices_the_summary_before_the_recent_window(agent_workflow):
+    agent_workflow.conversation_history = conversation(4)
+    agent_workflow.rolling_summary_turns = 2
+    assert agent_workflow.prompt_history() is agent_workflow.conversation_history
+
+    agent_workflow.rolling_summary = {"actor": "conversation_summary", "response": "The user sent prompts 0 and 1."}
+    agent_workflow.rolling_summary_covers = agent_workflow.recent_window_start()
+
+    messages = agent_workflow.prompt_history()["messages"]
+    assert agent_workflow.rolling_summary_covers == 4
+    assert messages[0] == agent_workflow.rolling_summary
+    assert messages[1:] == agent_workflow.conversation_history["messages"][4:]
+    assert len(agent_workflow.conversation_history["messages"]) == 8
+
+
+async def test_finished_refresh_is_applied_and_a_stale_one_ignored(agent_workflow):
+    agent_workflow.conversation_history = conversation(5)
+    agent_workflow.rolling_summary = {"actor": "conversation_summary", "response": "Prompts 0 and 1."}
+    agent_workflow.rolling_summary_covers = 4
+
+    stale = asyncio.get_running_loop().create_future()
+    stale.set_result({"summary": "Prompt 0.", "llm_metadata": PLANNER_METADATA})
+    agent_workflow.rolling_summary_refresh = stale
+    agent_workflow.rolling_summary_refresh_covers = 2
+
+    assert agent_workflow.prompt_history()["messages"][0]["response"] == "Prompts 0 and 1."
+    assert agent_workflow.rolling_summary_covers == 4 and agent_workflow.rolling_summary_refresh is None
+    # the call still counts towards usage
+    assert agent_workflow.llm_usage.calls == 1
+
+    fresh = asyncio.get_running_loop().create_future()
+    agent_workflow.rolling_summary_refresh = fresh
+    agent_workflow.rolling_summary_refresh_covers = 6
+    assert agent_workflow.prompt_history()["messages"][0]["response"] == "Prompts 0 and 1."
+
+    fresh.set_result({"summary": "Prompts 0 to 2."})
+    messages = agent_workflow.prompt_history()["messages"]
+    assert messages[0] == {"actor": "conversation_summary", "response": "Prompts 0 to 2."}
+    assert messages[1:] == agent_workflow.conversation_history["messages"][6:]
@@ -0,0 +1,15 @@
+"""Parsing of the goals' example conversations (AgentGoal.example_conversation_history)."""
+import re
+from typing import Dict, List
+
+_TURN_RE = re.compile(r"(user_confirmed_tool_run|tool_result|user|agent): ")
+
+
+def parse_example(example: str) -> List[Dict[str, str]]:
+    """Splits an example conversation string into history messages."""
+    parts = _TURN_RE.split(example)
+    # parts: [preamble, actor, text, actor, text, ...]
+    return [
+        {"actor": actor, "response": text.strip()}
+        for actor, text in zip(parts[1::2], parts[2::2])
+    ]
@@ -1,11 +1,12 @@
 from collections import deque
+from dataclasses import asdict
 from datetime import timedelta
 from typing import Dict, Any, Union, List, Optional, Deque, TypedDict
 
-from temporalio.common import RetryPolicy
+from temporalio.common import RetryPolicy, SearchAttributeKey
 from temporalio import workflow
 
-from models.data_types import ConversationHistory, EnvLookupOutput, NextStep, ValidationInput, EnvLookupInput
+from models.data_types import ConversationHistory, EnvLookupOutput, NextStep, ValidationInput, ValidationResult, EnvLookupInput, LLM_METADATA_KEY, LLMUsageTotals
 from models.tool_definitions import AgentGoal
 from workflows.workflow_helpers import LLM_ACTIVITY_START_TO_CLOSE_TIMEOUT, \
     LLM_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT
@@ -14,16 +15,33 @@ from workflows import workflow_helpers as helpers
 with workflow.unsafe.imports_passed_through():
     from activities.tool_activities import ToolActivities
     from prompts.agent_prompt_generators import (
-        generate_genai_prompt
+        generate_genai_prompt,
+        INVALID_PROMPT_NEXT,
+        PLANNER_MAX_OUTPUT_TOKENS,
+        ROLLING_SUMMARY_MAX_OUTPUT_TOKENS,
     )
     from models.data_types import (
         CombinedInput,
         ToolPromptInput,
     )
+    from prompts.turn_retrieval import TurnIndex, goal_query, select_relevant_messages
     from tools.goal_registry import goal_list
 
 # Constants
 MAX_TURNS_BEFORE_CONTINUE = 250
+# In rolling summary mode, messages that must have left the recent window before the summary is
+# refreshed, so it isn't rewritten (one more LLM call) after every turn
+ROLLING_SUMMARY_MIN_MESSAGES = 4
+
+# Custom search attributes set from the session's LLM usage when it ends (if LLM_USAGE_SEARCH_ATTRIBUTES=true).
+# They must be registered with the namespace first, see setup.md.
+LLM_CALLS_ATTRIBUTE = SearchAttributeKey.for_int("LLMCalls")
+LLM_INPUT_TOKENS_ATTRIBUTE = SearchAttributeKey.for_int("LLMInputTokens")
+LLM_CACHED_INPUT_TOKENS_ATTRIBUTE = SearchAttributeKey.for_int("LLMCachedInputTokens")
+LLM_OUTPUT_TOKENS_ATTRIBUTE = SearchAttributeKey.for_int("LLMOutputTokens")
+LLM_COST_ATTRIBUTE = SearchAttributeKey.for_float("LLMCostUSD")
+LLM_LATENCY_ATTRIBUTE = SearchAttributeKey.for_float("LLMLatencySeconds")
+AGENT_GOALS_ATTRIBUTE = SearchAttributeKey.for_keyword_list("AgentGoals")
 
 #ToolData as part of the workflow is what's accessible to the UI - see LLMResponse.jsx for example
 class ToolData(TypedDict, total=False):
@@ -48,6 +66,36 @@ class AgentGoalWorkflow:
         self.goal: AgentGoal = {"tools": []}
         self.show_tool_args_confirmation: bool = True # set from env file in activity lookup_wf_env_settings
         self.multi_goal_mode: bool = False # set from env file in activity lookup_wf_env_settings
+        self.validate_and_plan: bool = False # set from env file in activity lookup_wf_env_settings
+        self.llm_usage_search_attributes: bool = False # set from env file in activity lookup_wf_env_settings
+        self.llm_provider: Optional[str] = None # provider that answered the most recent LLM activity
+        self.llm_failovers: List[Dict[str, Any]] = [] # provider switches reported by the LLM activities
+        # LLM token usage and estimated cost, for the session, per goal and per turn (see get_llm_usage)
+        self.llm_usage: LLMUsageTotals = LLMUsageTotals()
+        self.llm_usage_by_goal: Dict[str, LLMUsageTotals] = {}
+        self.llm_usage_by_turn: List[Dict[str, Any]] = []
+        self.speculative_planning: bool = False # set from env file in activity lookup_wf_env_settings
+        self.compact_prompt_history: bool = False # set from env file in activity lookup_wf_env_settings
+        self.rolling_summary_turns: int = 0 # set from env file in activity lookup_wf_env_settings
+        # rolling summary mode: a summary message standing in for the first rolling_summary_covers
+        # messages in prompts, and the background activity refreshing it (see refresh_rolling_summary)
+        self.rolling_summary: Optional[Dict[str, Any]] = None
+        self.rolling_summary_covers: int = 0
+        self.rolling_summary_refresh: Optional[workflow.ActivityHandle] = None
+        self.rolling_summary_refresh_covers: int = 0
+        self.history_retrieval_top_k: int = 0 # set from env file in activity lookup_wf_env_settings
+        self.history_retrieval_recent_turns: int = 4 # set from env file in activity lookup_wf_env_settings
+        self.tool_result_compaction: bool = True # set from env file in activity lookup_wf_env_settings
+        # index of the first message of the current goal, and the index of past turns for retrieval
+        self.goal_started_at: int = 0
+        self.turn_index: TurnIndex = TurnIndex()
+        # outcome of speculative planning: plans used or discarded, and the latency saved
+        self.speculation_stats: Dict[str, Any] = {
+            "used": 0,
+            "discarded": 0,
+            "cancelled": 0,
+            "latency_saved_seconds": 0.0,
+        }
 
     # see ../api/main.py#temporal_client.start_workflow() for how the input parameters are set
     @workflow.run
@@ -68,6 +116,13 @@ class AgentGoalWorkflow:
         if params and params.prompt_queue:
             self.prompt_queue.extend(params.prompt_queue)
 
+        # usage totals of the session so far, if this run continued as new
+        if params and params.llm_usage:
+            self.llm_usage = LLMUsageTotals(**params.llm_usage["session"])
+            self.llm_usage_by_goal = {
+                goal_id: LLMUsageTotals(**totals) for goal_id, totals in params.llm_usage["goals"].items()
+            }
+
         waiting_for_confirm = False 
         current_tool = None
 
@@ -78,6 +133,10 @@ class AgentGoalWorkflow:
         #   - calling the LLM through activities to determine next steps and prompts
         #   - executing the selected tools via activities
         while True:
+            # summarize history that left the recent window while we wait for the user
+            if not self.prompt_queue and not self.confirmed:
+                self.refresh_rolling_summary()
+
             # wait indefinitely for input from signals - user_prompt, end_chat, or confirm as defined below
             await workflow.wait_condition(
                 lambda: bool(self.prompt_queue) or self.chat_ended or self.confirmed
@@ -85,6 +144,8 @@ class AgentGoalWorkflow:
 
             # handle chat should end. When chat ends, push conversation history to workflow results.
             if self.chat_should_end():
+                self.cancel_rolling_summary_refresh()
+                self.upsert_llm_usage_search_attributes()
                 return f"{self.conversation_history}"
 
             # Execute the tool 
@@ -99,50 +160,56 @@ class AgentGoalWorkflow:
                 workflow.logger.info(f"workflow step: processing message on the prompt queue, message is {prompt}")
                 
                 # Validate user-provided prompts
+                validate_in_planner = False
+                speculative_plan: Optional[workflow.ActivityHandle] = None
                 if self.is_user_prompt(prompt): 
                     self.add_message("user", prompt)
 
-                    # Validate the prompt before proceeding
-                    validation_input = ValidationInput(
-                        prompt=prompt,
-                        conversation_history=self.conversation_history,
-                        agent_goal=self.goal,
-                    )
-                    validation_result = await workflow.execute_activity_method(
-                        ToolActivities.agent_validatePrompt,
-                        args=[validation_input],
-                        schedule_to_close_timeout=LLM_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-                        start_to_close_timeout=LLM_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-                        retry_policy=RetryPolicy(
-                            initial_interval=timedelta(seconds=5), backoff_coefficient=1
-                        ),
-                    )
-
-                    # If validation fails, provide that feedback to the user - i.e., "your words make no sense, puny human" end this iteration of processing
-                    if not validation_result.validationResult:
-                        workflow.logger.warning(f"Prompt validation failed: {validation_result.validationFailedReason}")
-                        self.add_message("agent", validation_result.validationFailedReason)
-                        continue
-
-                # If valid, proceed with generating the context and prompt
-                context_instructions = generate_genai_prompt(
-                    agent_goal=self.goal, 
-                    conversation_history = self.conversation_history, 
-                    multi_goal_mode=self.multi_goal_mode, 
-                    raw_json=self.tool_data)
-                
-                prompt_input = ToolPromptInput(prompt=prompt, context_instructions=context_instructions)
-
-                # connect to LLM and execute to get next steps
-                tool_data = await workflow.execute_activity_method(
-                    ToolActivities.agent_toolPlanner,
-                    prompt_input,
-                    schedule_to_close_timeout=LLM_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-                    start_to_close_timeout=LLM_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-                    retry_policy=RetryPolicy(
-                        initial_interval=timedelta(seconds=5), backoff_coefficient=1
-                    ),
-                )
+                    # In validate-and-plan mode the planner call below validates the prompt too
+                    if self.validate_and_plan:
+                        validate_in_planner = True
+                    else:
+                        # In speculative mode, plan the next step while the prompt is being validated
+                        if self.speculative_planning:
+                            speculative_plan = self.start_planner(prompt, validate_in_planner)
+                            speculation_started_at = workflow.now()
+
+                        # Validate the prompt before proceeding
+                        validation_input = ValidationInput(
+                            prompt=prompt,
+                            conversation_history=self.prompt_history(),
+                            agent_goal=self.goal,
+                        )
+                        validation_result = await workflow.execute_activity_method(
+                            ToolActivities.agent_validatePrompt,
+                            args=[validation_input],
+                            schedule_to_close_timeout=LLM_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
+                            start_to_close_timeout=LLM_ACTIVITY_START_TO_CLOSE_TIMEOUT,
+                            retry_policy=RetryPolicy(
+                                initial_interval=timedelta(seconds=5), backoff_coefficient=1
+                            ),
+                        )
+                        self.record_llm_metadata(validation_result.llm_metadata, "validation")
+                        if speculative_plan:
+                            validation_seconds = (workflow.now() - speculation_started_at).total_seconds()
+
+                        # If validation fails, provide that feedback to the user - i.e., "your words make no sense, puny human" end this iteration of processing
+                        if not validation_result.validationResult:
+                            self.reply_to_failed_validation(validation_result, speculative_plan)
+                            continue
+
+                # If valid, proceed with generating the context and prompt, and
+                # connect to LLM and execute to get next steps (unless that's already underway)
+                planner = speculative_plan or self.start_planner(prompt, validate_in_planner)
+                tool_data = await planner
+                llm_metadata = tool_data.pop(LLM_METADATA_KEY, None)
+                self.record_llm_metadata(llm_metadata, "planner")
+                if speculative_plan:
+                    self.record_speculative_plan_used(validation_seconds, llm_metadata)
+
+                # The combined call rejected the prompt: reply like a failed validation would
+                if validate_in_planner and self.reply_to_rejected_prompt(tool_data):
+                    continue
 
                 tool_data["force_confirm"] = self.show_tool_args_confirmation
                 self.tool_data = tool_data
@@ -184,6 +251,8 @@ class AgentGoalWorkflow:
                     #here we could send conversation to AI for analysis
 
                     # end the workflow
+                    self.cancel_rolling_summary_refresh()
+                    self.upsert_llm_usage_search_attributes()
                     return str(self.conversation_history)
 
                 self.add_message("agent", tool_data)
@@ -192,7 +261,10 @@ class AgentGoalWorkflow:
                     self.prompt_queue,
                     self.goal,
                     MAX_TURNS_BEFORE_CONTINUE,
-                    self.add_message
+                    self.add_message,
+                    self.record_llm_metadata,
+                    self.llm_usage_snapshot,
+                    self.cancel_rolling_summary_refresh,
                 )
 
     #Signal that comes from api/main.py via a post to /send-prompt
@@ -254,6 +326,28 @@ class AgentGoalWorkflow:
         """Query handler to retrieve the latest tool data response if available."""
         return self.tool_data
 
+    @workflow.query
+    def get_tool_result(self, result_ref: int) -> Optional[Dict[str, Any]]:
+        """Query handler to retrieve a tool's full result by the result_ref of its compacted copy in the history."""
+        if 0 <= result_ref < len(self.tool_results):
+            return self.tool_results[result_ref]
+        return None
+
+    @workflow.query
+    def get_llm_provider_status(self) -> Dict[str, Any]:
+        """Query handler to retrieve the active LLM provider and any provider failovers so far."""
+        return {"provider": self.llm_provider, "failovers": self.llm_failovers}
+
+    @workflow.query
+    def get_llm_usage(self) -> Dict[str, Any]:
+        """Query handler to retrieve LLM token usage, estimated cost and latency for the session,
+        per goal, and per turn (each turn also lists its calls with their context size)."""
+        return dict(
+            self.llm_usage_snapshot(),
+            turns=self.llm_usage_by_turn,
+            speculative_planning=self.speculation_stats,
+        )
+
     def add_message(self, actor: str, response: Union[str, Dict[str, Any]]) -> None:
         """Add a message to the conversation history.
 
@@ -271,6 +365,248 @@ class AgentGoalWorkflow:
             {"actor": actor, "response": response}
         )
 
+    def record_llm_metadata(self, llm_metadata: Optional[Dict[str, Any]], call: str) -> None:
+        """Track which LLM provider answered and what the call used, and log when the activity had to fail over.
+
+        Args:
+            llm_metadata: The metadata returned by an LLM activity (see LLM_METADATA_KEY)
+            call: Which LLM call of the turn this was ("validation", "planner" or "summary")
+        """
+        if not llm_metadata:
+            return
+        provider = llm_metadata.get("provider")
+        usage = llm_metadata.get("usage")
+        if usage:
+            cost_usd = llm_metadata.get("cost_usd")
+            workflow.logger.info(
+                f"LLM usage from {provider}: {usage['input_tokens']} input tokens "
+                f"({usage['cached_input_tokens']} cached), {usage['output_tokens']} output tokens"
+                + (f", estimated cost ${cost_usd:.6f}" if cost_usd is not None else "")
+            )
+            self.record_llm_usage(llm_metadata, call)
+        context_tokens = llm_metadata.get("context_tokens")
+        if context_tokens:
+            workflow.logger.info(
+                f"LLM context: {context_tokens['tokens_after']} tokens (budget {context_tokens['budget']})"
+                + (f", compacted: {context_tokens['compactions']}" if context_tokens["compactions"] else "")
+            )
+        failed_over_from = llm_metadata.get("failed_over_from") or []
+        if failed_over_from:
+            workflow.logger.warning(f"LLM activity failed over from {failed_over_from} to {provider}")
+            self.llm_failovers.append(
+                {
+                    "from": failed_over_from,
+                    "to": provider,
+                    "turn": len(self.conversation_history["messages"]),
+                }
+            )
+        self.llm_provider = provider
+
+    def start_planner(self, prompt: str, validate_in_planner: bool) -> workflow.ActivityHandle:
+        """Generates the context and prompt for the planner and starts the planner activity."""
+        context_instructions = generate_genai_prompt(
+            agent_goal=self.goal, 
+            conversation_history = self.prompt_history(), 
+            multi_goal_mode=self.multi_goal_mode, 
+            raw_json=self.tool_data,
+            validate_user_prompt=validate_in_planner,
+            compact_history=self.compact_prompt_history,
+            # reuse the serialized history of earlier turns in this run
+            history_cache_key=("planner", workflow.info().workflow_id, workflow.info().run_id))
+
+        prompt_input = ToolPromptInput(
+            prompt=prompt,
+            context_instructions=context_instructions,
+            max_output_tokens=PLANNER_MAX_OUTPUT_TOKENS,
+        )
+        return workflow.start_activity_method(
+            ToolActivities.agent_toolPlanner,
+            prompt_input,
+            schedule_to_close_timeout=LLM_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
+            start_to_close_timeout=LLM_ACTIVITY_START_TO_CLOSE_TIMEOUT,
+            retry_policy=RetryPolicy(
+                initial_interval=timedelta(seconds=5), backoff_coefficient=1
+            ),
+        )
+
+    def prompt_history(self) -> ConversationHistory:
+        """The conversation history as sent to the LLM: in rolling summary mode, the summary of the
+        oldest messages followed by the rest verbatim (at least the last rolling_summary_turns turns).
+        With history retrieval on, turns of earlier goals that aren't relevant to the current goal and
+        prompt are left out (see prompts/turn_retrieval.py)."""
+        self.apply_rolling_summary()
+        if self.rolling_summary is None and not self.history_retrieval_top_k:
+            return self.conversation_history
+        messages = self.conversation_history["messages"]
+        if self.history_retrieval_top_k:
+            latest_prompt = next((m["response"] for m in reversed(messages) if m["actor"] == "user"), None)
+            messages = select_relevant_messages(
+                self.turn_index,
+                messages,
+                goal_query(self.goal, latest_prompt if isinstance(latest_prompt, str) else None),
+                top_k=self.history_retrieval_top_k,
+                recent_turns=self.history_retrieval_recent_turns,
+                keep_from=self.goal_started_at,
+                skip_before=self.rolling_summary_covers,
+            )
+        else:
+            messages = messages[self.rolling_summary_covers:]
+        if self.rolling_summary is not None:
+            messages = [self.rolling_summary] + messages
+        return {"messages": messages}
+
+    def recent_window_start(self) -> int:
+        """Index of the first message of the last rolling_summary_turns turns (a turn starts with a user message)."""
+        messages = self.conversation_history["messages"]
+        turns = 0
+        for index in range(len(messages) - 1, -1, -1):
+            if messages[index]["actor"] == "user":
+                turns += 1
+                if turns == self.rolling_summary_turns:
+                    return index
+        return 0
+
+    def refresh_rolling_summary(self) -> None:
+        """Starts folding the messages that left the recent window into the rolling summary. The activity
+        isn't awaited: it runs while the workflow waits for the user, and prompt_history() picks up the
+        new summary once it's done, so refreshing it never delays a turn."""
+        if not self.rolling_summary_turns or self.rolling_summary_refresh is not None:
+            return
+        window_start = self.recent_window_start()
+        if window_start - self.rolling_summary_covers < ROLLING_SUMMARY_MIN_MESSAGES:
+            return
+        summary_context, summary_prompt = helpers.prompt_rolling_summary(
+            self.rolling_summary["response"] if self.rolling_summary else None,
+            self.conversation_history["messages"][self.rolling_summary_covers:window_start],
+        )
+        self.rolling_summary_refresh = workflow.start_activity_method(
+            ToolActivities.agent_summarizeHistory,
+            ToolPromptInput(
+                prompt=summary_prompt,
+                context_instructions=summary_context,
+                max_output_tokens=ROLLING_SUMMARY_MAX_OUTPUT_TOKENS,
+            ),
+            schedule_to_close_timeout=LLM_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
+            start_to_close_timeout=LLM_ACTIVITY_START_TO_CLOSE_TIMEOUT,
+            retry_policy=RetryPolicy(
+                initial_interval=timedelta(seconds=5), backoff_coefficient=1, maximum_attempts=3
+            ),
+        )
+        self.rolling_summary_refresh_covers = window_start
+
+    def apply_rolling_summary(self) -> None:
+        """Takes the refreshed rolling summary if its activity has finished. If it failed, the
+        messages stay verbatim and the next refresh covers them. A result that doesn't cover more
+        messages than the current summary is stale and ignored."""
+        refresh = self.rolling_summary_refresh
+        if refresh is None or not refresh.done():
+            return
+        self.rolling_summary_refresh = None
+        if refresh.cancelled():
+            return
+        if refresh.exception() is not None:
+            workflow.logger.warning(f"Rolling summary refresh failed: {refresh.exception()}")
+            return
+        result = refresh.result()
+        self.record_llm_metadata(result.pop(LLM_METADATA_KEY, None), "summary")
+        summary = result.get("summary")
+        if not isinstance(summary, str) or not summary:
+            workflow.logger.warning(f"Rolling summary refresh returned no summary: {result}")
+            return
+        if self.rolling_summary_refresh_covers <= self.rolling_summary_covers:
+            # built on an older summary than the one in use; taking it would drop what that covered
+            workflow.logger.info("Ignoring a stale rolling summary refresh")
+            return
+        self.rolling_summary = {"actor": "conversation_summary", "response": summary}
+        self.rolling_summary_covers = self.rolling_summary_refresh_covers
+        workflow.logger.info(f"Rolling summary now covers the first {self.rolling_summary_covers} messages")
+
+    def cancel_rolling_summary_refresh(self) -> None:
+        if self.rolling_summary_refresh is not None and not self.rolling_summary_refresh.done():
+            self.rolling_summary_refresh.cancel()
+
+    def reply_to_failed_validation(
+        self, validation_result: ValidationResult, speculative_plan: Optional[workflow.ActivityHandle]
+    ) -> None:
+        """Answers a prompt that failed validation with the reason, dropping any plan made for it."""
+        workflow.logger.warning(f"Prompt validation failed: {validation_result.validationFailedReason}")
+        if speculative_plan:
+            self.discard_speculative_plan(speculative_plan)
+        self.add_message("agent", validation_result.validationFailedReason)
+
+    def discard_speculative_plan(self, speculative_plan: workflow.ActivityHandle) -> None:
+        """Drops the plan made for a prompt that failed validation. If the planner already answered,
+        its usage is recorded as a discarded call; otherwise the activity is cancelled."""
+        if speculative_plan.done() and not speculative_plan.cancelled() and speculative_plan.exception() is None:
+            self.speculation_stats["discarded"] += 1
+            self.record_llm_metadata(speculative_plan.result().get(LLM_METADATA_KEY), "planner (discarded)")
+        else:
+            self.speculation_stats["cancelled"] += 1
+            speculative_plan.cancel()
+
+    def record_speculative_plan_used(self, validation_seconds: float, llm_metadata: Optional[Dict[str, Any]]) -> None:
+        """Counts the time saved by planning during validation: the shorter of the two calls,
+        which would otherwise have run one after the other."""
+        planner_seconds = (llm_metadata or {}).get("latency_seconds", validation_seconds)
+        self.speculation_stats["used"] += 1
+        self.speculation_stats["latency_saved_seconds"] += min(validation_seconds, planner_seconds)
+        workflow.logger.info(
+            f"Speculative plan used; saved about {min(validation_seconds, planner_seconds):.2f}s"
+        )
+
+    def reply_to_rejected_prompt(self, tool_data: Dict[str, Any]) -> bool:
+        """In validate-and-plan mode, answers a prompt the planner rejected (next == INVALID_PROMPT_NEXT)
+        with its explanation, as a question. Returns whether the prompt was rejected."""
+        if tool_data.get("next") != INVALID_PROMPT_NEXT:
+            return False
+        workflow.logger.warning(f"Prompt validation failed: {tool_data.get('response')}")
+        self.add_message("agent", {"next": "question", "response": tool_data.get("response")})
+        return True
+
+    def record_llm_usage(self, llm_metadata: Dict[str, Any], call: str) -> None:
+        """Adds an LLM call's usage to the session, goal and turn totals."""
+        self.llm_usage.add(llm_metadata)
+        self.llm_usage_by_goal.setdefault(self.goal.id, LLMUsageTotals()).add(llm_metadata)
+
+        # a turn is everything done in response to one user message
+        turn = sum(1 for message in self.conversation_history["messages"] if message["actor"] == "user")
+        if not self.llm_usage_by_turn or self.llm_usage_by_turn[-1]["turn"] != turn:
+            self.llm_usage_by_turn.append({"turn": turn, "goal": self.goal.id, "calls": []})
+        self.llm_usage_by_turn[-1]["calls"].append(
+            {
+                "call": call,
+                "provider": llm_metadata.get("provider"),
+                "model": llm_metadata.get("model"),
+                "usage": llm_metadata["usage"],
+                "cost_usd": llm_metadata.get("cost_usd"),
+                "latency_seconds": llm_metadata.get("latency_seconds"),
+                "context_tokens": llm_metadata.get("context_tokens"),
+            }
+        )
+
+    def llm_usage_snapshot(self) -> Dict[str, Any]:
+        """Session and per-goal usage totals as plain dicts."""
+        return {
+            "session": asdict(self.llm_usage),
+            "goals": {goal_id: asdict(totals) for goal_id, totals in self.llm_usage_by_goal.items()},
+        }
+
+    def upsert_llm_usage_search_attributes(self) -> None:
+        """Writes the session's LLM usage to search attributes, so sessions can be found and compared by cost."""
+        if not self.llm_usage_search_attributes:
+            return
+        workflow.upsert_search_attributes(
+            [
+                LLM_CALLS_ATTRIBUTE.value_set(self.llm_usage.calls),
+                LLM_INPUT_TOKENS_ATTRIBUTE.value_set(self.llm_usage.input_tokens),
+                LLM_CACHED_INPUT_TOKENS_ATTRIBUTE.value_set(self.llm_usage.cached_input_tokens),
+                LLM_OUTPUT_TOKENS_ATTRIBUTE.value_set(self.llm_usage.output_tokens),
+                LLM_COST_ATTRIBUTE.value_set(round(self.llm_usage.cost_usd, 6)),
+                LLM_LATENCY_ATTRIBUTE.value_set(round(self.llm_usage.latency_seconds, 3)),
+                AGENT_GOALS_ATTRIBUTE.value_set(list(self.llm_usage_by_goal)),
+            ]
+        )
+
     def change_goal(self, goal: str) -> None:
         """ Change the goal (usually on request of the user).
         
@@ -280,6 +616,8 @@ class AgentGoalWorkflow:
         if goal is not None:
             for listed_goal in goal_list:
                 if listed_goal.id == goal:
+                    if listed_goal.id != self.goal.id:
+                        self.goal_started_at = len(self.conversation_history["messages"])
                     self.goal = listed_goal
                     workflow.logger.info("Changed goal to " + goal)
             if goal is None:
@@ -325,6 +663,14 @@ class AgentGoalWorkflow:
         )
         self.show_tool_args_confirmation = env_output.show_confirm
         self.multi_goal_mode = env_output.multi_goal_mode
+        self.validate_and_plan = env_output.validate_and_plan
+        self.llm_usage_search_attributes = env_output.llm_usage_search_attributes
+        self.speculative_planning = env_output.speculative_planning
+        self.compact_prompt_history = env_output.compact_prompt_history
+        self.rolling_summary_turns = env_output.rolling_summary_turns
+        self.history_retrieval_top_k = env_output.history_retrieval_top_k
+        self.history_retrieval_recent_turns = env_output.history_retrieval_recent_turns
+        self.tool_result_compaction = env_output.tool_result_compaction
     
     # execute the tool - return False if we're not waiting for confirm anymore (always the case if it works successfully)
     # 
@@ -342,7 +688,8 @@ class AgentGoalWorkflow:
             self.tool_data,
             self.tool_results,
             self.add_message,
-            self.prompt_queue
+            self.prompt_queue,
+            self.tool_result_compaction,
         )
 
         # set new goal if we should
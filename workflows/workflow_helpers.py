@@ -1,14 +1,17 @@
 from datetime import timedelta
-from typing import Dict, Any, Deque
+from typing import Dict, Any, Deque, List, Optional
 from temporalio import workflow
 from temporalio.exceptions import ActivityError
 from temporalio.common import RetryPolicy
 
-from models.data_types import ConversationHistory, ToolPromptInput
+from models.data_types import ConversationHistory, LLM_METADATA_KEY, Message, ToolPromptInput
 from prompts.agent_prompt_generators import (
     generate_missing_args_prompt,
     generate_tool_completion_prompt,
+    SUMMARY_MAX_OUTPUT_TOKENS,
 )
+from prompts.history_serializer import encode
+from prompts.tool_result_compaction import compact_tool_result
 from shared.config import TEMPORAL_LEGACY_TASK_QUEUE
 
 # Constants from original file
@@ -24,8 +27,11 @@ async def handle_tool_execution(
     tool_results: list,
     add_message_callback: callable,
     prompt_queue: Deque[str],
+    compact_results: bool = True,
 ) -> None:
-    """Execute a tool after confirmation and handle its result."""
+    """Execute a tool after confirmation and handle its result.
+    The full result is kept in tool_results; the history and the completion prompt get it
+    compacted (see prompts/tool_result_compaction.py), with a reference to the full result."""
     workflow.logger.info(f"Confirmed. Proceeding with tool: {current_tool}")
 
     task_queue = (
@@ -47,9 +53,20 @@ async def handle_tool_execution(
         )
         dynamic_result["tool"] = current_tool
         tool_results.append(dynamic_result)
+        result_ref = len(tool_results) - 1
     except ActivityError as e:
         workflow.logger.error(f"Tool execution failed: {str(e)}")
         dynamic_result = {"error": str(e), "tool": current_tool}
+        result_ref = None
+
+    if compact_results:
+        compacted_result = compact_tool_result(current_tool, dynamic_result, result_ref)
+        if compacted_result is not dynamic_result:
+            workflow.logger.info(
+                f"Compacted {current_tool} result from {len(encode(dynamic_result, compact=True))} "
+                f"to {len(encode(compacted_result, compact=True))} characters"
+            )
+        dynamic_result = compacted_result
 
     add_message_callback("tool_result", dynamic_result)
     prompt_queue.append(generate_tool_completion_prompt(current_tool, dynamic_result))
@@ -100,20 +117,33 @@ async def continue_as_new_if_needed(
     agent_goal: Any,
     max_turns: int,
     add_message_callback: callable,
+    record_llm_metadata_callback: Optional[callable] = None,
+    llm_usage_snapshot_callback: Optional[callable] = None,
+    cancel_background_callback: Optional[callable] = None,
 ) -> None:
-    """Handle workflow continuation if message limit is reached."""
+    """Handle workflow continuation if message limit is reached.
+    Background LLM work (a pending rolling summary refresh) is cancelled first, since the new run
+    starts from a summary of the whole history. The summary call's usage is recorded before the
+    usage totals are carried over to the new run."""
     if len(conversation_history["messages"]) >= max_turns:
+        if cancel_background_callback:
+            cancel_background_callback()
         summary_context, summary_prompt = prompt_summary_with_history(
             conversation_history
         )
         summary_input = ToolPromptInput(
-            prompt=summary_prompt, context_instructions=summary_context
+            prompt=summary_prompt,
+            context_instructions=summary_context,
+            max_output_tokens=SUMMARY_MAX_OUTPUT_TOKENS,
         )
         conversation_summary = await workflow.start_activity_method(
             "ToolActivities.agent_toolPlanner",
             summary_input,
             schedule_to_close_timeout=LLM_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
         )
+        llm_metadata = conversation_summary.pop(LLM_METADATA_KEY, None)
+        if record_llm_metadata_callback:
+            record_llm_metadata_callback(llm_metadata, "summary")
         workflow.logger.info(f"Continuing as new after {max_turns} turns.")
         add_message_callback("conversation_summary", conversation_summary)
         workflow.continue_as_new(
@@ -122,6 +152,7 @@ async def continue_as_new_if_needed(
                     "tool_params": {
                         "conversation_summary": conversation_summary,
                         "prompt_queue": prompt_queue,
+                        "llm_usage": llm_usage_snapshot_callback() if llm_usage_snapshot_callback else None,
                     },
                     "agent_goal": agent_goal,
                 }
@@ -141,3 +172,22 @@ def prompt_summary_with_history(
         'Put the summary in the format { "summary": "<plain text>" }'
     )
     return (context_instructions, actual_prompt)
+
+
+def prompt_rolling_summary(
+    previous_summary: Optional[str], messages: List[Message]
+) -> tuple[str, str]:
+    """Generate a prompt for folding messages that left the recent history window into the
+    rolling summary that replaces them in the planner's context."""
+    context_instructions = (
+        f"Here is the summary of a conversation between a user and a chatbot so far: {previous_summary or '(none yet)'}\n"
+        f"Here are the messages that follow it, as JSON: {encode({'messages': messages}, compact=True)}"
+    )
+    actual_prompt = (
+        "Please update the summary to cover these messages too. The chatbot will only see the summary "
+        "in place of these messages, so keep every detail it needs to carry on: what the user wants, "
+        "the argument values the user gave, the tools that were run and their key results, and anything "
+        "still open. Keep it under 200 words. "
+        'Put the summary in the format { "summary": "<plain text>" }'
+    )
+    return (context_instructions, actual_prompt)